@@ -10,14 +10,25 @@
 
 import json
 import os
+import sys
 import math
-from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import argparse
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from threading import Lock
 
 # 添加OpenAI库导入
 from openai import OpenAI
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_io import JsonlAppender, JsonlFollower
+from stage_profile import StageProfiler, add_profile_arguments, record_llm_call
+from live_metrics import LiveMetrics, add_metrics_arguments, increment
+
+# LLM 调用失败或片段处理出错时写入 summary 的占位标记
+PLACEHOLDER_MARKERS = ("[TRANSITION_ERROR]", "[PROCESSING_ERROR]")
+
 
 def load_concat_plan(plan_file: str) -> List[Dict]:
     """
@@ -201,6 +212,8 @@ def call_llm_api(prompt: str) -> str:
         base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
     )
     
+    start = time.perf_counter()
+    increment("llm_in_flight")
     try:
         completion = client.chat.completions.create(
             model="qwen-plus",  # 模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
@@ -211,11 +224,56 @@ def call_llm_api(prompt: str) -> str:
             temperature=0.7,
             max_tokens=512
         )
+        # 记录调用延迟和 token 用量（兼容接口返回的 usage 字段）
+        usage = getattr(completion, "usage", None)
+        record_llm_usage(time.perf_counter() - start,
+                         getattr(usage, "prompt_tokens", 0) or 0,
+                         getattr(usage, "completion_tokens", 0) or 0)
         return completion.choices[0].message.content
     except Exception as e:
+        record_llm_usage(time.perf_counter() - start, error=True)
         print(f"调用大模型API时出错: {e}")
         # 出错时返回原始描述加上过渡标记
         return f"[TRANSITION_ERROR] {prompt.split('Current:')[1].split('### Output')[0].strip()}"
+    finally:
+        increment("llm_in_flight", -1)
+
+
+def record_llm_usage(latency: float, prompt_tokens: int = 0, completion_tokens: int = 0, error: bool = False):
+    """将一次 LLM 调用同时记入剖析结果和实时指标"""
+    record_llm_call(latency, prompt_tokens, completion_tokens, error)
+    increment("llm_requests_total")
+    increment("llm_latency_seconds_total", latency)
+    increment("llm_prompt_tokens_total", prompt_tokens)
+    increment("llm_completion_tokens_total", completion_tokens)
+    if error:
+        increment("llm_errors_total")
+
+
+def register_annotation_metrics(metrics: LiveMetrics):
+    """
+    定义标注步骤的实时指标
+
+    拼接视频在线程池中排队等待的数量为已读入的总数减去已开始处理的数量。
+    """
+    metrics.counter("concats_started_total", "Concat videos picked up by a worker thread")
+    metrics.counter("concats_failed_total", "Concat videos whose processing raised and were written with empty data")
+    metrics.gauge("queue_depth", "Concat videos waiting for a worker thread",
+                  lambda: (metrics.total or 0) - metrics.value("concats_started_total"))
+    metrics.gauge("concats_in_progress", "Concat videos currently being annotated",
+                  lambda: metrics.value("concats_started_total") - metrics.completed)
+    metrics.gauge("llm_in_flight", "LLM requests currently in flight")
+    metrics.counter("llm_requests_total", "LLM requests finished (including errors)")
+    metrics.counter("llm_errors_total", "LLM requests that raised")
+    metrics.counter("llm_latency_seconds_total", "Total LLM request latency in seconds")
+    metrics.counter("llm_prompt_tokens_total", "Prompt tokens reported by the LLM API")
+    metrics.counter("llm_completion_tokens_total", "Completion tokens reported by the LLM API")
+    metrics.counter("segments_total", "Annotated segments")
+    metrics.counter("placeholder_segments_total", "Segments whose summary is an error placeholder")
+    metrics.gauge("llm_error_ratio", "Share of LLM requests that raised",
+                  lambda: metrics.value("llm_errors_total") / max(metrics.value("llm_requests_total"), 1))
+    metrics.gauge("placeholder_ratio", "Share of segments written with an error placeholder",
+                  lambda: metrics.value("placeholder_segments_total") / max(metrics.value("segments_total"), 1))
 
 
 def process_single_segment(i: int, boundaries: List[Dict], video_descriptions: Dict[str, str]) -> Dict[str, Any]:
@@ -274,6 +332,7 @@ def process_concat_video(concat_item: Dict, video_descriptions: Dict[str, str])
         处理后的标注数据
     """
     concat_video_id = concat_item['concat_video'].replace('.mp4', '')
+    increment("concats_started_total")
     
     result_data = []
     
@@ -305,6 +364,9 @@ def process_concat_video(concat_item: Dict, video_descriptions: Dict[str, str])
         
         result_data = results
     
+    increment("segments_total", len(result_data))
+    increment("placeholder_segments_total",
+              sum(1 for segment in result_data if segment["summary"].startswith(PLACEHOLDER_MARKERS)))
     return {
         "video": concat_video_id,
         "data": result_data
@@ -314,7 +376,8 @@ def process_concat_video(concat_item: Dict, video_descriptions: Dict[str, str])
 def generate_concat_annotations(concat_plan_file: str, 
                               video_descriptions_file: str,
                               output_file: str,
-                              max_workers: int = 30) -> None:
+                              max_workers: int = 30,
+                              metrics: Optional[LiveMetrics] = None) -> int:
     """
     主函数：生成拼接视频标注数据
     
@@ -323,11 +386,17 @@ def generate_concat_annotations(concat_plan_file: str,
         video_descriptions_file: 视频描述文件路径
         output_file: 输出文件路径
         max_workers: 并发处理的最大工作线程数
+        metrics: 可选，实时指标
+        
+    Returns:
+        处理的拼接视频数
     """
     # 加载拼接策略
     print("加载拼接策略...")
     concat_plan = load_concat_plan(concat_plan_file)
     print(f"已加载 {len(concat_plan)} 个拼接视频策略")
+    if metrics:
+        metrics.set_total(len(concat_plan))
     
     # 加载视频描述
     print("加载视频描述...")
@@ -363,6 +432,10 @@ def generate_concat_annotations(concat_plan_file: str,
                     "video": concat_video_id,
                     "data": []
                 }
+                if metrics:
+                    metrics.increment("concats_failed_total")
+            if metrics:
+                metrics.complete()
         
         results = [r for r in processed_results if r is not None]
     
@@ -372,22 +445,123 @@ def generate_concat_annotations(concat_plan_file: str,
         json.dump(results, f, ensure_ascii=False, indent=2)
     
     print("处理完成！")
+    return len(results)
+
+
+def generate_concat_annotations_streaming(concat_plan_stream: str,
+                                          video_descriptions_file: str,
+                                          output_file: str,
+                                          max_workers: int = 30,
+                                          poll_interval: float = 1.0,
+                                          metrics: Optional[LiveMetrics] = None) -> int:
+    """
+    流式生成拼接视频标注：跟随读取拼接规划器逐条追加的拼接策略，边规划边标注
+
+    同时处理的拼接视频不超过 2 * max_workers 个，其余拼接策略留在文件中等待；
+    每个拼接视频完成后立即以 JSONL 追加到输出文件（按完成顺序），全部完成后创建完成标记。
+
+    Args:
+        concat_plan_stream: 拼接规划器 --follow 输出的 concat_metadata.jsonl 路径
+        video_descriptions_file: 视频描述文件路径
+        output_file: 输出的 JSONL 文件路径
+        max_workers: 并发处理的最大工作线程数
+        poll_interval: 没有新拼接策略时的等待间隔（秒）
+        metrics: 可选，实时指标；总数为目前已读到的拼接策略数
+
+    Returns:
+        处理的拼接视频数
+    """
+    print("加载视频描述...")
+    video_descriptions = load_video_descriptions(video_descriptions_file)
+    print(f"已加载 {len(video_descriptions)} 个视频描述")
+
+    print(f"跟随读取拼接策略: {concat_plan_stream}")
+    follower = JsonlFollower(concat_plan_stream)
+    backlog: List[Dict] = []
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, JsonlAppender(output_file) as writer:
+        while True:
+            if len(backlog) < max_workers:
+                backlog.extend(json.loads(line) for line in follower.poll())
+                if metrics:
+                    metrics.set_total(follower.count)
+            # 限制同时处理的拼接视频数，未提交的策略留在待处理队列中
+            while backlog and len(in_flight) < 2 * max_workers:
+                concat_item = backlog.pop(0)
+                in_flight[executor.submit(process_concat_video, concat_item, video_descriptions)] = concat_item
+
+            if not in_flight:
+                if follower.finished and not backlog:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                concat_item = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"处理拼接视频 {concat_item['concat_video']} 时出错: {e}")
+                    # 使用默认值填充
+                    result = {
+                        "video": concat_item['concat_video'].replace('.mp4', ''),
+                        "data": []
+                    }
+                    if metrics:
+                        metrics.increment("concats_failed_total")
+                writer.write(result)
+                if metrics:
+                    metrics.complete()
+                print(f"已完成 {writer.count}/{follower.count}: {concat_item['concat_video']}")
+
+    print(f"处理完成！共 {writer.count} 个拼接视频，结果保存到 {output_file}")
+    return writer.count
 
 
 def main():
     """
     主函数
     """
-    # 文件路径配置
-    concat_plan_file = '/data1/whq/annotation_maker/concat_planer/concat_metadata.json'
-    video_descriptions_file = '/data1/whq/sharegpt4o/video_conversations/gpt4o.jsonl'
-    output_file = '/data1/whq/annotation_maker/annotation_concatter/concatenated_video_annotations.json'
+    parser = argparse.ArgumentParser(description="构造拼接视频标注数据")
+    parser.add_argument("--concat_plan",
+                        default='/data1/whq/annotation_maker/concat_planer/concat_metadata.json',
+                        help="拼接策略文件路径")
+    parser.add_argument("--video_descriptions",
+                        default='/data1/whq/sharegpt4o/video_conversations/gpt4o.jsonl',
+                        help="原始视频描述文件路径")
+    parser.add_argument("--output",
+                        default='/data1/whq/annotation_maker/annotation_concatter/concatenated_video_annotations.json',
+                        help="拼接视频标注输出路径")
+    parser.add_argument("--max_workers", type=int, default=30,
+                        help="并发处理拼接视频的线程数（默认：30）")
+    parser.add_argument("--follow", action="store_true",
+                        help="流式模式：--concat_plan 为拼接规划器 --follow 输出的 concat_metadata.jsonl，"
+                             "边规划边标注，结果以 JSONL 逐条追加到 --output")
+    add_profile_arguments(parser)
+    add_metrics_arguments(parser)
+    
+    args = parser.parse_args()
     
-    # 生成拼接标注，使用更高的并发数
-    generate_concat_annotations(os.path.abspath(concat_plan_file), 
-                              os.path.abspath(video_descriptions_file),
-                              os.path.abspath(output_file), 
-                              max_workers=30)
+    with StageProfiler.from_args("annotate", args) as profiler, LiveMetrics.from_args("annotate", args) as metrics:
+        register_annotation_metrics(metrics)
+        if metrics.port is not None:
+            print(f"实时指标: http://localhost:{metrics.port}/metrics")
+        if args.follow:
+            processed = generate_concat_annotations_streaming(os.path.abspath(args.concat_plan),
+                                                              os.path.abspath(args.video_descriptions),
+                                                              os.path.abspath(args.output),
+                                                              max_workers=args.max_workers,
+                                                              metrics=metrics)
+        else:
+            # 生成拼接标注，使用更高的并发数
+            processed = generate_concat_annotations(os.path.abspath(args.concat_plan), 
+                                                    os.path.abspath(args.video_descriptions),
+                                                    os.path.abspath(args.output), 
+                                                    max_workers=args.max_workers,
+                                                    metrics=metrics)
+        profiler.add_items(processed, "concats")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+视频目录内存基准测试
+对比字典式视频列表与数组式 VideoCatalog 在大规模视频数量下的内存占用
+
+两种结构存储相同的字段（视频ID、时长、使用次数）。视频路径在规划中用不到，
+两种结构都不存储，因此结果只反映存储方式本身的差异。
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+from concat_planer import VideoCatalog
+
+
+def synthetic_videos(num_videos: int, seed: int = 42):
+    """
+    生成合成视频记录
+
+    Args:
+        num_videos: 视频数量
+        seed: 随机种子
+
+    Yields:
+        (视频ID, 时长) 元组
+    """
+    rng = random.Random(seed)
+    for i in range(num_videos):
+        yield f"video_{i}", rng.uniform(2.0, 120.0)
+
+
+def build_dict_layout(num_videos: int):
+    """按原字典式结构构建视频列表（videos + video_map + defaultdict使用次数），不含路径"""
+    videos = []
+    video_map = {}
+    video_usage_count = defaultdict(int)
+    for video_id, duration in synthetic_videos(num_videos):
+        video_info = {"video_id": video_id, "duration": duration}
+        videos.append(video_info)
+        video_map[video_id] = video_info
+        video_usage_count[video_id] += 0
+    return videos, video_map, video_usage_count
+
+
+def build_catalog_layout(num_videos: int):
+    """构建数组式视频目录"""
+    catalog = VideoCatalog()
+    for video_id, duration in synthetic_videos(num_videos):
+        catalog.add(video_id, duration)
+    return catalog
+
+
+def measure(builder, num_videos: int):
+    """
+    测量构建过程的峰值内存和耗时
+
+    Returns:
+        (峰值内存字节数, 耗时秒数)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = builder(num_videos)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频目录内存基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000],
+                        help="测试的视频数量（默认：1000000 10000000）")
+    parser.add_argument("--skip_dict", action="store_true",
+                        help="跳过字典式结构的测试（10M 视频时约需数 GB 内存）")
+
+    args = parser.parse_args()
+
+    print(f"{'视频数':>12} {'结构':>8} {'峰值内存(MB)':>14} {'每视频(B)':>10} {'耗时(s)':>8}")
+    for num_videos in args.sizes:
+        layouts = [("catalog", build_catalog_layout)]
+        if not args.skip_dict:
+            layouts.insert(0, ("dict", build_dict_layout))
+        for name, builder in layouts:
+            peak, elapsed = measure(builder, num_videos)
+            print(f"{num_videos:>12} {name:>8} {peak / 1024 / 1024:>14.1f} "
+                  f"{peak / num_videos:>10.1f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
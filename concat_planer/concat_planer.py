@@ -5,25 +5,407 @@
 """
 
 import os
+import sys
+import math
+import heapq
 import json
+import time
 import random
 import argparse
-from typing import List, Dict, Any
-from collections import defaultdict
+from array import array
+from typing import List, Dict, Any, Optional
 import logging
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_io import JsonlAppender, JsonlFollower
+from stage_profile import StageProfiler, add_profile_arguments
+
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+class VideoCatalog:
+    """
+    以数组存储的视频目录
+    
+    视频ID经 sys.intern 驻留后映射为整数下标，时长存为 float64 数组（写出的时间戳与
+    元数据中的时长完全一致），使用次数存为 int32 数组，避免为每个视频创建字典。
+    视频路径在规划中用不到，不做存储。
+    
+    加载重复簇后，co_limit 模式下同一簇的视频共享一个使用次数（记在代表视频所在的
+    分组上），exclude 模式下只保留每个簇的代表视频。
+    """
+    
+    def __init__(self):
+        self.video_ids: List[str] = []
+        self.index_of: Dict[str, int] = {}
+        self.durations = array('d')
+        self.usage = array('i')
+        self.group_of = array('i')
+        self.group_usage = array('i')
+        self.excluded = bytearray()
+        self.group_members: Dict[int, List[int]] = {}
+    
+    def __len__(self) -> int:
+        return len(self.video_ids)
+    
+    def add(self, video_id: str, duration: float) -> int:
+        """
+        添加一个视频
+        
+        Args:
+            video_id: 视频ID
+            duration: 视频时长（秒）
+            
+        Returns:
+            视频的整数下标
+        """
+        video_id = sys.intern(video_id)
+        index = len(self.video_ids)
+        self.video_ids.append(video_id)
+        self.index_of[video_id] = index
+        self.durations.append(duration)
+        self.usage.append(0)
+        self.group_of.append(index)
+        self.group_usage.append(0)
+        self.excluded.append(0)
+        return index
+    
+    def record_use(self, index: int, delta: int = 1):
+        """
+        记录视频的使用次数变化（同时更新所在重复簇的使用次数）
+        
+        Args:
+            index: 视频下标
+            delta: 使用次数变化量
+        """
+        self.usage[index] += delta
+        self.group_usage[self.group_of[index]] += delta
+    
+    def is_available(self, index: int, usage_cap: float) -> bool:
+        """
+        视频是否未被排除且所在重复簇未达到使用上限
+        
+        Args:
+            index: 视频下标
+            usage_cap: 单个视频（或重复簇）的最大使用次数
+        """
+        return not self.excluded[index] and self.group_usage[self.group_of[index]] < usage_cap
+    
+    def apply_duplicate_clusters(self, clusters: List[Dict[str, Any]], mode: str = "exclude") -> int:
+        """
+        应用 find_duplicate_videos.py 输出的重复簇
+        
+        Args:
+            clusters: 重复簇列表，每项包含 representative 和 videos
+            mode: "exclude" 只保留代表视频；"co_limit" 同一簇共享使用次数
+            
+        Returns:
+            受影响的非代表视频数量
+        """
+        affected = 0
+        for cluster in clusters:
+            members = [self.index_of[video_id] for video_id in cluster["videos"] if video_id in self.index_of]
+            if len(members) < 2:
+                continue
+            representative = self.index_of.get(cluster["representative"], members[0])
+            for index in members:
+                if index == representative:
+                    continue
+                affected += 1
+                if mode == "exclude":
+                    self.excluded[index] = 1
+                else:
+                    self.group_of[index] = representative
+            if mode == "co_limit":
+                self.group_members[representative] = members
+        
+        # 按新的分组重新汇总使用次数
+        for index in range(len(self.group_usage)):
+            self.group_usage[index] = 0
+        for index in range(len(self.usage)):
+            self.group_usage[self.group_of[index]] += self.usage[index]
+        return affected
+    
+    @classmethod
+    def load(cls, metadata_path: str) -> "VideoCatalog":
+        """
+        从视频元数据 JSON 文件构建目录
+        
+        Args:
+            metadata_path: 视频元数据 JSON 文件路径
+            
+        Returns:
+            视频目录
+        """
+        catalog = cls()
+        with open(metadata_path, 'r') as f:
+            raw_videos = json.load(f)
+        for video in raw_videos:
+            catalog.add(video["video_name"], video["duration_sec"])
+        return catalog
+    
+    def extend(self, metadata_path: str) -> int:
+        """
+        从另一个视频元数据 JSON 文件追加新视频，已存在的视频ID会被跳过
+        
+        Args:
+            metadata_path: 新增视频的元数据 JSON 文件路径
+            
+        Returns:
+            新增的视频数量
+        """
+        with open(metadata_path, 'r') as f:
+            raw_videos = json.load(f)
+        added = 0
+        for video in raw_videos:
+            if video["video_name"] in self.index_of:
+                continue
+            self.add(video["video_name"], video["duration_sec"])
+            added += 1
+        return added
+
+
+class DurationBucketIndex:
+    """
+    按时长分桶的可用视频索引，用于构造式拼接规划
+    
+    每个桶内的可用视频存放在最小堆中（balanced 模式按使用次数排序，random 模式按
+    随机键排序）。对各桶可用数量做有界子集和动态规划（以 Python 整数作位集），
+    即可在选择视频之前确定可行的视频数量和总时长，并回溯出满足时长约束的组合。
+    
+    同一重复簇的视频共享使用上限且不会进入同一条拼接；簇达到上限时其成员从桶中
+    移除（堆中的条目延迟删除，桶的可用数量单独维护）。
+    """
+    
+    # 同一重复簇的视频在桶内冲突导致组合无法取齐时，重新抽样的次数上限
+    max_tries = 20
+    
+    def __init__(self,
+                 catalog: VideoCatalog,
+                 usage: array,
+                 usage_cap: float,
+                 target_duration_min: float,
+                 target_duration_max: float,
+                 max_videos_per_concat: int,
+                 reuse_mode: str = "balanced"):
+        """
+        Args:
+            catalog: 视频目录
+            usage: 按下标记录的使用次数数组（会被原地更新）
+            usage_cap: 单个视频的最大使用次数（float('inf') 表示不限）
+            target_duration_min: 拼接结果的最短时长（秒）
+            target_duration_max: 拼接结果的最长时长（秒）
+            max_videos_per_concat: 每条拼接最多视频数
+            reuse_mode: 视频复用策略："balanced" 或 "random"
+        """
+        self.catalog = catalog
+        self.usage = usage
+        self.usage_cap = usage_cap
+        self.target_duration_min = target_duration_min
+        self.target_duration_max = target_duration_max
+        self.max_count = max_videos_per_concat
+        self.reuse_mode = reuse_mode
+        
+        # 桶宽需保证 k 个视频向下取整带来的误差（< k 个桶宽）不会超出时长范围
+        duration_range = max(target_duration_max - target_duration_min, 1e-3)
+        self.bucket_width = min(1.0, duration_range / (2 * (max_videos_per_concat + 1)))
+        self.num_buckets = int(target_duration_max / self.bucket_width) + 1
+        self.sum_mask = (1 << self.num_buckets) - 1
+        
+        self.heaps: List[List] = [[] for _ in range(self.num_buckets)]
+        self.live = [0] * self.num_buckets
+        self.in_heap = bytearray(len(catalog))
+        for index in range(len(catalog)):
+            duration = catalog.durations[index]
+            if duration > target_duration_max or not catalog.is_available(index, usage_cap):
+                continue
+            bucket = self._bucket_of(duration)
+            self.heaps[bucket].append(self._heap_entry(index))
+            self.live[bucket] += 1
+            self.in_heap[index] = 1
+        for heap in self.heaps:
+            heapq.heapify(heap)
+        
+        self._prefix: Optional[List[List[int]]] = None
+    
+    def _bucket_of(self, duration: float) -> int:
+        """时长所在的桶，保证 bucket * bucket_width <= duration"""
+        bucket = int(duration / self.bucket_width)
+        while bucket > 0 and bucket * self.bucket_width > duration:
+            bucket -= 1
+        return bucket
+    
+    def _heap_entry(self, index: int):
+        if self.reuse_mode == "balanced":
+            return (self.usage[index], random.random(), index)
+        return (random.random(), 0, index)
+    
+    def _capped_count(self, bucket: int) -> int:
+        return min(self.live[bucket], self.max_count)
+    
+    def _build_prefix(self) -> List[List[int]]:
+        """
+        有界子集和动态规划
+        
+        prefix[b][j] 的第 s 位为 1 表示仅用前 b 个桶、选 j 个视频时，桶下标之和可以为 s。
+        """
+        prefix = [[1] + [0] * self.max_count]
+        for bucket in range(self.num_buckets):
+            previous = prefix[-1]
+            count = self._capped_count(bucket)
+            current = list(previous)
+            for j in range(1, self.max_count + 1):
+                for m in range(1, min(count, j) + 1):
+                    current[j] |= (previous[j - m] << (m * bucket)) & self.sum_mask
+            prefix.append(current)
+        return prefix
+    
+    def _sum_window(self, count: int) -> int:
+        """k 个视频的桶下标之和允许的位集范围"""
+        low = math.ceil(self.target_duration_min / self.bucket_width)
+        while low * self.bucket_width < self.target_duration_min:
+            low += 1
+        high = self.num_buckets - 1
+        while (high + count) * self.bucket_width > self.target_duration_max:
+            high -= 1
+        if high < low:
+            return 0
+        return ((1 << (high - low + 1)) - 1) << low
+    
+    def feasible_counts(self, min_count: int, max_count: int) -> List[int]:
+        """
+        返回能满足时长约束的视频数量列表
+        """
+        if self._prefix is None:
+            self._prefix = self._build_prefix()
+        final = self._prefix[-1]
+        return [k for k in range(min_count, min(max_count, self.max_count) + 1)
+                if final[k] & self._sum_window(k)]
+    
+    def construct(self, min_count: int, max_count: int) -> List[int]:
+        """
+        构造一条满足数量和时长约束的拼接，并更新使用次数
+        
+        Args:
+            min_count: 最少视频数
+            max_count: 最多视频数
+            
+        Returns:
+            选中视频的下标列表；可用视频已无法满足约束时返回空列表
+        """
+        for _ in range(self.max_tries):
+            counts = self.feasible_counts(min_count, max_count)
+            if not counts:
+                return []
+            
+            taken = self._take(self._sample_picks(counts))
+            if taken is not None:
+                break
+        else:
+            return []
+        
+        selected = [entry[2] for _, entry in taken]
+        self._commit(taken)
+        random.shuffle(selected)
+        return selected
+    
+    def _sample_picks(self, counts: List[int]) -> Dict[int, int]:
+        """
+        随机选择可行的视频数量和总时长，并回溯出每个桶选取的视频数
+        
+        Returns:
+            桶下标 -> 选取数量
+        """
+        # 随机选择视频数量和（桶下标意义上的）总时长
+        count = random.choice(counts)
+        candidates = self._prefix[-1][count] & self._sum_window(count)
+        target_sum = random.choice([bit for bit in range(candidates.bit_length()) if candidates >> bit & 1])
+        
+        # 从最后一个桶开始回溯每个桶选取的视频数
+        picks = {}
+        remaining_count, remaining_sum = count, target_sum
+        for bucket in range(self.num_buckets - 1, -1, -1):
+            previous = self._prefix[bucket]
+            options = [
+                m for m in range(0, min(self._capped_count(bucket), remaining_count) + 1)
+                if remaining_sum - m * bucket >= 0
+                and previous[remaining_count - m] >> (remaining_sum - m * bucket) & 1
+            ]
+            m = random.choice(options)
+            if m:
+                picks[bucket] = m
+                remaining_count -= m
+                remaining_sum -= m * bucket
+        
+        return picks
+    
+    def _take(self, picks: Dict[int, int]) -> Optional[List]:
+        """
+        在选中的桶内取使用次数最少（或随机）的视频，同一重复簇最多取一个
+        
+        Returns:
+            (桶下标, 堆条目) 列表；因重复簇冲突无法取齐时放回已取的条目并返回 None
+        """
+        taken = []
+        groups = set()
+        for bucket, m in picks.items():
+            heap = self.heaps[bucket]
+            held = []
+            got = 0
+            while got < m and heap:
+                entry = heapq.heappop(heap)
+                index = entry[2]
+                if not self.in_heap[index]:
+                    # 已移除的条目（所在重复簇达到使用上限）
+                    continue
+                group = self.catalog.group_of[index]
+                if group in groups:
+                    held.append(entry)
+                    continue
+                groups.add(group)
+                taken.append((bucket, entry))
+                got += 1
+            for entry in held:
+                heapq.heappush(heap, entry)
+            if got < m:
+                for taken_bucket, entry in taken:
+                    heapq.heappush(self.heaps[taken_bucket], entry)
+                return None
+        return taken
+    
+    def _commit(self, taken: List):
+        """更新选中视频的使用次数，仍未达上限的视频放回桶中"""
+        for bucket, entry in taken:
+            index = entry[2]
+            self.catalog.record_use(index)
+            if self.catalog.is_available(index, self.usage_cap):
+                heapq.heappush(self.heaps[bucket], self._heap_entry(index))
+            else:
+                self._remove(index)
+                group = self.catalog.group_of[index]
+                for member in self.catalog.group_members.get(group, ()):
+                    if self.in_heap[member]:
+                        self._remove(member)
+    
+    def _remove(self, index: int):
+        """将视频从所在桶中移除（堆条目延迟删除）"""
+        bucket = self._bucket_of(self.catalog.durations[index])
+        capped_before = self._capped_count(bucket)
+        self.in_heap[index] = 0
+        self.live[bucket] -= 1
+        if self._capped_count(bucket) != capped_before:
+            self._prefix = None
+
+
 class VideoConcatenator:
     """
     视频拼接器类，用于根据指定策略拼接多个视频
     """
     
     def __init__(self, 
-                 video_metadata: str,
+                 video_metadata: Optional[str],
                  output_dir: str,
                  total_concats: int = 500,
                  min_videos_per_concat: int = 2,
@@ -33,12 +415,18 @@ class VideoConcatenator:
                  allow_reuse: bool = True,
                  reuse_mode: str = "balanced",
                  max_usage_ratio: float = 2.0,
-                 seed: int = 42):
+                 seed: int = 42,
+                 planner: str = "constructive",
+                 existing_plan: Optional[str] = None,
+                 new_video_metadata: Optional[str] = None,
+                 duplicate_clusters: Optional[str] = None,
+                 duplicate_mode: str = "exclude"):
         """
         初始化视频拼接器
         
         Args:
-            video_metadata: 包含所有视频元数据的 JSON 文件路径
+            video_metadata: 包含所有视频元数据的 JSON 文件路径；为 None 时从空目录开始，
+                视频在 run_streaming 中随采样结果逐个加入
             output_dir: 拼接后的视频及 metadata 输出路径
             total_concats: 目标拼接视频数量
             min_videos_per_concat: 每条拼接最少视频数
@@ -49,6 +437,12 @@ class VideoConcatenator:
             reuse_mode: 视频复用策略："balanced" 或 "random"
             max_usage_ratio: 单个视频最多使用次数与拼接视频总数的比例上限
             seed: 随机种子（控制可复现性）
+            planner: 规划算法："constructive"（按时长分桶构造，每条拼接一次成功）或 "greedy"（贪心重试）
+            existing_plan: 已有的 concat_metadata.json 路径；指定后进入追加模式，根据已有拼接
+                重建使用次数，并在其后追加 total_concats 条新拼接
+            new_video_metadata: 新增视频的元数据 JSON 文件路径（可选），其中的视频会加入候选
+            duplicate_clusters: find_duplicate_videos.py 输出的重复簇 JSON 文件路径（可选）
+            duplicate_mode: 重复簇处理方式："exclude"（只保留代表视频）或 "co_limit"（同一簇共享使用上限）
         """
         self.video_metadata = video_metadata
         self.output_dir = output_dir
@@ -61,22 +455,40 @@ class VideoConcatenator:
         self.reuse_mode = reuse_mode
         self.max_usage_ratio = max_usage_ratio
         self.seed = seed
+        self.planner = planner
+        self.existing_plan = existing_plan
+        self.new_video_metadata = new_video_metadata
+        self.duplicate_clusters = duplicate_clusters
+        self.duplicate_mode = duplicate_mode
         
         # 设置随机种子
         random.seed(seed)
         
-        # 存储视频信息和使用次数
-        self.videos = []
-        self.video_usage_count = defaultdict(int)
+        # 视频目录（整数下标、时长数组）和按下标记录的使用次数
+        self.catalog: Optional[VideoCatalog] = None
+        self.video_usage_count = array('i')
         
-        # 创建视频ID到视频信息的映射，便于快速查找
-        self.video_map = {}
+        # 追加模式下已有的拼接记录及新拼接的起始编号
+        self.existing_concats: List[Dict[str, Any]] = []
+        self.next_concat_number = 0
         
         # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
         
         # 加载视频信息
-        self._load_videos()
+        if self.video_metadata:
+            self._load_videos()
+        else:
+            self.catalog = VideoCatalog()
+            self.video_usage_count = self.catalog.usage
+        
+        # 加载重复簇
+        if self.duplicate_clusters:
+            self._load_duplicate_clusters()
+        
+        # 加载已有拼接计划
+        if self.existing_plan:
+            self._load_existing_plan()
         
     def _load_videos(self):
         """
@@ -85,75 +497,134 @@ class VideoConcatenator:
         logger.info("Loading video information...")
         
         try:
-            with open(self.video_metadata, 'r') as f:
-                raw_videos = json.load(f)
-                
-            # 转换现有格式到程序需要的格式
-            for video in raw_videos:
-                video_info = {
-                    "video_id": video["video_name"],
-                    "duration": video["duration_sec"],
-                    "path": video["video_path"]
-                }
-                self.videos.append(video_info)
-                self.video_map[video_info["video_id"]] = video_info
+            self.catalog = VideoCatalog.load(self.video_metadata)
+            if self.new_video_metadata:
+                added = self.catalog.extend(self.new_video_metadata)
+                logger.info(f"Added {added} new videos from {self.new_video_metadata}")
+            self.video_usage_count = self.catalog.usage
                 
         except Exception as e:
             logger.error(f"Failed to load video metadata from {self.video_metadata}: {e}")
             raise
             
-        logger.info(f"Loaded {len(self.videos)} videos")
+        logger.info(f"Loaded {len(self.catalog)} videos")
         
-        if len(self.videos) == 0:
+        if len(self.catalog) == 0:
             raise ValueError("No valid videos found in the specified metadata file")
             
-    def _get_available_videos(self, current_duration: float = 0) -> List[Dict[str, Any]]:
+    def _load_duplicate_clusters(self):
+        """
+        加载重复簇并按 duplicate_mode 应用到视频目录
+        """
+        with open(self.duplicate_clusters, 'r', encoding='utf-8') as f:
+            clusters = json.load(f)
+        
+        affected = self.catalog.apply_duplicate_clusters(clusters, self.duplicate_mode)
+        action = "excluded" if self.duplicate_mode == "exclude" else "co-limited with their representative"
+        logger.info(f"Loaded {len(clusters)} duplicate clusters, {affected} videos {action}")
+    
+    def _load_existing_plan(self):
+        """
+        加载已有拼接计划，根据其中的 videos 列表重建使用次数，并确定新拼接的起始编号
+        """
+        logger.info(f"Loading existing plan from {self.existing_plan}...")
+        
+        with open(self.existing_plan, 'r', encoding='utf-8') as f:
+            self.existing_concats = json.load(f)
+        
+        unknown_videos = set()
+        for concat in self.existing_concats:
+            for video_id in concat["videos"]:
+                index = self.catalog.index_of.get(video_id)
+                if index is None:
+                    unknown_videos.add(video_id)
+                    continue
+                self.catalog.record_use(index)
+            
+            # 新拼接从已有的最大编号之后开始
+            name = os.path.splitext(concat["concat_video"])[0]
+            if name.startswith("concat_") and name[len("concat_"):].isdigit():
+                self.next_concat_number = max(self.next_concat_number, int(name[len("concat_"):]) + 1)
+        
+        if unknown_videos:
+            logger.warning(f"{len(unknown_videos)} videos in the existing plan are not in the video metadata, "
+                           f"their usage is ignored")
+        logger.info(f"Loaded {len(self.existing_concats)} existing concatenations, "
+                    f"new concatenations start at concat_{self.next_concat_number:05d}")
+    
+    def _planned_concats(self) -> int:
+        """整个计划（已有 + 新生成）的拼接总数，用于计算全局使用上限"""
+        return len(self.existing_concats) + self.total_concats
+    
+    def _get_available_videos(self, current_duration: float = 0) -> List[int]:
         """
-        根据当前已选视频的总时长，获取可用的视频列表
+        根据当前已选视频的总时长，获取可用的视频下标列表
         
         Args:
             current_duration: 当前已选视频的总时长
             
         Returns:
-            可用视频列表
+            可用视频的下标列表
         """
         # 计算剩余时长范围
         remaining_min = self.target_duration_min - current_duration
         remaining_max = self.target_duration_max - current_duration
         
+        return self._filter_videos(remaining_min, remaining_max)
+    
+    def _filter_videos(self, remaining_min: float, remaining_max: float) -> List[int]:
+        """
+        按时长范围和使用次数上限筛选视频下标
+        
+        Args:
+            remaining_min: 视频时长下限
+            remaining_max: 视频时长上限
+            
+        Returns:
+            可用视频的下标列表
+        """
         available_videos = []
+        durations = self.catalog.durations
+        excluded = self.catalog.excluded
+        group_of = self.catalog.group_of
+        # 使用次数按重复簇统计（未加载重复簇时每个视频自成一组）
+        usage = self.catalog.group_usage
         
         # 计算最大使用次数
-        max_usage = self.total_concats * self.max_usage_ratio
+        max_usage = self._planned_concats() * self.max_usage_ratio
         
-        for video in self.videos:
-            video_id = video['video_id']
-            duration = video['duration']
+        for index in range(len(durations)):
+            duration = durations[index]
             
             # 检查时长是否符合剩余时间要求
             # 视频时长必须大于等于剩余最小时间，且小于等于剩余最大时间
             if duration < remaining_min or duration > remaining_max:
                 continue
+            
+            # 跳过被排除的重复视频
+            if excluded[index]:
+                continue
                 
             # 如果不允许复用，检查是否已使用
-            if not self.allow_reuse and self.video_usage_count[video_id] > 0:
+            if not self.allow_reuse and usage[group_of[index]] > 0:
                 continue
                 
             # 如果允许复用，检查是否超过最大使用次数
-            if self.allow_reuse and self.video_usage_count[video_id] >= max_usage and max_usage > 0:
+            if self.allow_reuse and usage[group_of[index]] >= max_usage and max_usage > 0:
                 continue
                 
-            available_videos.append(video)
+            available_videos.append(index)
             
         return available_videos
     
-    def _select_videos_for_concat(self) -> List[Dict[str, Any]]:
+    def _select_videos_for_concat(self) -> List[int]:
         """
         为一次拼接选择视频列表
         
         Returns:
-            选中的视频列表
+            选中视频的下标列表
         """
+        durations = self.catalog.durations
         selected_videos = []
         current_duration = 0.0
         max_attempts = 100  # 防止无限循环
@@ -176,11 +647,17 @@ class VideoConcatenator:
                 
                 if not available_videos:
                     break
+            
+            # 同一视频或同一重复簇的视频不在一条拼接中重复出现
+            selected_groups = {self.catalog.group_of[v] for v in selected_videos}
+            available_videos = [v for v in available_videos if self.catalog.group_of[v] not in selected_groups]
+            if not available_videos:
+                break
                 
             # 根据复用模式选择视频
             if self.reuse_mode == "balanced":
                 # 优先选择使用次数最少的视频
-                available_videos.sort(key=lambda v: self.video_usage_count[v['video_id']])
+                available_videos.sort(key=lambda v: self.video_usage_count[v])
             elif self.reuse_mode == "random":
                 # 随机打乱
                 random.shuffle(available_videos)
@@ -189,10 +666,10 @@ class VideoConcatenator:
             selected_video = available_videos[0]
             
             # 检查添加该视频后是否会超出最大时长
-            if current_duration + selected_video['duration'] > self.target_duration_max:
+            if current_duration + durations[selected_video] > self.target_duration_max:
                 # 如果超出最大时长，则尝试寻找更小的视频
                 smaller_videos = [v for v in available_videos 
-                                if current_duration + v['duration'] <= self.target_duration_max]
+                                if current_duration + durations[v] <= self.target_duration_max]
                 if smaller_videos:
                     selected_video = smaller_videos[0]
                 else:
@@ -200,69 +677,79 @@ class VideoConcatenator:
                     break
             
             selected_videos.append(selected_video)
-            current_duration += selected_video['duration']
+            current_duration += durations[selected_video]
             
             # 更新使用次数
-            self.video_usage_count[selected_video['video_id']] += 1
+            self.catalog.record_use(selected_video)
             
-        # 如果最终时长不满足最小要求，放弃该拼接
+        # 如果最终时长不满足最小要求，放弃该拼接并回滚使用次数
         if current_duration < self.target_duration_min:
+            for index in selected_videos:
+                self.catalog.record_use(index, -1)
             return []
             
         return selected_videos
     
-    def _get_available_videos_relaxed(self, current_duration: float = 0) -> List[Dict[str, Any]]:
+    def _get_available_videos_relaxed(self, current_duration: float = 0) -> List[int]:
         """
-        放宽条件获取可用视频列表（仅用于当前时长较小时）
+        放宽条件获取可用视频下标列表（仅用于当前时长较小时）
         
         Args:
             current_duration: 当前已选视频的总时长
             
         Returns:
-            可用视频列表
+            可用视频的下标列表
         """
-        # 计算剩余时长范围
-        remaining_min = self.target_duration_min - current_duration
+        # 放宽条件：只检查是否小于剩余最大时间
         remaining_max = self.target_duration_max - current_duration
         
-        available_videos = []
-        
-        # 计算最大使用次数
-        max_usage = self.total_concats * self.max_usage_ratio
-        
-        for video in self.videos:
-            video_id = video['video_id']
-            duration = video['duration']
-            
-            # 放宽条件：只检查是否小于剩余最大时间
-            if duration > remaining_max:
-                continue
-                
-            # 如果不允许复用，检查是否已使用
-            if not self.allow_reuse and self.video_usage_count[video_id] > 0:
-                continue
-                
-            # 如果允许复用，检查是否超过最大使用次数
-            if self.allow_reuse and self.video_usage_count[video_id] >= max_usage and max_usage > 0:
-                continue
-                
-            available_videos.append(video)
-            
-        return available_videos
+        return self._filter_videos(float('-inf'), remaining_max)
+    
+    def _usage_cap(self) -> float:
+        """单个视频的最大使用次数"""
+        if not self.allow_reuse:
+            return 1
+        max_usage = self._planned_concats() * self.max_usage_ratio
+        return max_usage if max_usage > 0 else float('inf')
     
-    def generate_concatenations(self) -> List[Dict[str, Any]]:
+    def _build_bucket_index(self) -> DurationBucketIndex:
+        """构建构造式规划使用的时长分桶索引"""
+        return DurationBucketIndex(
+            self.catalog,
+            self.video_usage_count,
+            self._usage_cap(),
+            self.target_duration_min,
+            self.target_duration_max,
+            self.max_videos_per_concat,
+            self.reuse_mode
+        )
+    
+    def generate_concatenations(self, count: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        生成所有拼接视频
+        生成拼接视频
+        
+        Args:
+            count: 本次生成的拼接数量，默认 total_concats；使用上限始终按整个计划的拼接总数计算
         
         Returns:
             拼接视频的元信息列表
         """
-        logger.info("Generating video concatenations...")
+        count = self.total_concats if count is None else count
+        logger.info(f"Generating video concatenations ({self.planner} planner)...")
         concatenations = []
+        bucket_index = self._build_bucket_index() if self.planner == "constructive" else None
         
-        for i in range(self.total_concats):
+        for i in range(count):
             # 为每次拼接选择视频
-            selected_videos = self._select_videos_for_concat()
+            if bucket_index is not None:
+                selected_videos = bucket_index.construct(self.min_videos_per_concat,
+                                                         self.max_videos_per_concat)
+                if not selected_videos:
+                    logger.warning(f"Remaining videos cannot satisfy the duration constraints, "
+                                   f"stopping after {len(concatenations)} concatenations")
+                    break
+            else:
+                selected_videos = self._select_videos_for_concat()
             
             if not selected_videos:
                 logger.warning(f"No videos selected for concat {i}, skipping...")
@@ -273,28 +760,29 @@ class VideoConcatenator:
             boundaries = []
             current_time = 0.0
             
-            for video in selected_videos:
+            for index in selected_videos:
+                duration = self.catalog.durations[index]
                 boundaries.append({
-                    "video_id": video["video_id"],
+                    "video_id": self.catalog.video_ids[index],
                     "start_time": current_time,
-                    "end_time": current_time + video["duration"]
+                    "end_time": current_time + duration
                 })
-                total_duration += video["duration"]
-                current_time += video["duration"]
+                total_duration += duration
+                current_time += duration
             
             # 创建拼接记录
             concat_record = {
-                "concat_video": f"concat_{i:05d}.mp4",
+                "concat_video": f"concat_{self.next_concat_number + len(concatenations):05d}.mp4",
                 "total_duration": total_duration,
                 "boundaries": boundaries,
-                "videos": [video['video_id'] for video in selected_videos]
+                "videos": [self.catalog.video_ids[index] for index in selected_videos]
             }
             
             concatenations.append(concat_record)
             
             # 每100条记录输出一次进度
             if (i + 1) % 100 == 0:
-                logger.info(f"Generated {i + 1}/{self.total_concats} concatenations")
+                logger.info(f"Generated {i + 1}/{count} concatenations")
                 
         logger.info(f"Generated {len(concatenations)} concatenations")
         return concatenations
@@ -313,19 +801,87 @@ class VideoConcatenator:
             
         logger.info(f"Metadata saved to {metadata_path}")
         
-    def run(self):
+    def run(self) -> List[Dict[str, Any]]:
         """
         运行视频拼接主流程
+        
+        Returns:
+            本次新生成的拼接
         """
         logger.info("Starting video concatenation process...")
         
         # 生成拼接视频
         concatenations = self.generate_concatenations()
         
-        # 保存元信息
-        self.save_metadata(concatenations)
+        # 保存元信息（追加模式下保留已有拼接）
+        self.save_metadata(self.existing_concats + concatenations)
         
         logger.info("Video concatenation process completed")
+        return concatenations
+    
+    def run_streaming(self,
+                      metadata_stream: str,
+                      expected_videos: int,
+                      window: int = 64,
+                      poll_interval: float = 1.0) -> List[Dict[str, Any]]:
+        """
+        边采样边规划：跟随读取采样器逐个追加的视频元数据，分轮生成拼接
+        
+        每当新到达 window 个视频，就按已到达视频数占预期视频总数的比例确定截至本轮的
+        拼接目标数，生成差额部分；采样结束后补齐到 total_concats。每轮都在全部已到达的
+        视频上重建分桶索引，balanced 模式下新视频优先被选中，使用次数仍保持均衡。
+        每轮的拼接立即追加到 output_dir/concat_metadata.jsonl，结束时再写出完整的
+        concat_metadata.json。
+        
+        Args:
+            metadata_stream: 采样器 --metadata_stream 输出的 JSONL 文件路径
+            expected_videos: 预期的视频总数（输入目录中的视频文件数），0 表示采样结束后一次性规划
+            window: 每到达多少个新视频规划一轮
+            poll_interval: 没有新视频时的等待间隔（秒）
+            
+        Returns:
+            生成的全部拼接
+        """
+        logger.info(f"Starting streaming concatenation from {metadata_stream}...")
+        follower = JsonlFollower(metadata_stream)
+        concatenations = []
+        pending = 0
+        
+        with JsonlAppender(os.path.join(self.output_dir, "concat_metadata.jsonl")) as writer:
+            while True:
+                lines = follower.poll()
+                for line in lines:
+                    video = json.loads(line)
+                    if video["video_name"] not in self.catalog.index_of:
+                        self.catalog.add(video["video_name"], video["duration_sec"])
+                        pending += 1
+                
+                if pending >= window or follower.finished:
+                    arrived = len(self.catalog)
+                    if follower.finished or expected_videos <= 0:
+                        target = self.total_concats if follower.finished else 0
+                    else:
+                        target = min(self.total_concats, self.total_concats * arrived // expected_videos)
+                    if target > len(concatenations) and arrived >= self.min_videos_per_concat:
+                        batch = self.generate_concatenations(target - len(concatenations))
+                        self.next_concat_number += len(batch)
+                        concatenations.extend(batch)
+                        writer.write_lines([json.dumps(concat, ensure_ascii=False) for concat in batch])
+                        logger.info(f"Planned {len(concatenations)}/{self.total_concats} concatenations "
+                                    f"from {arrived} videos")
+                    pending = 0
+                
+                if follower.finished:
+                    break
+                if not lines:
+                    time.sleep(poll_interval)
+        
+        if len(concatenations) < self.total_concats:
+            logger.warning(f"Only {len(concatenations)} concatenations could be planned "
+                           f"from {len(self.catalog)} videos")
+        self.save_metadata(concatenations)
+        logger.info("Streaming concatenation process completed")
+        return concatenations
 
 
 def main():
@@ -357,26 +913,60 @@ def main():
                         help="单个视频最多可被使用的次数与拼接视频总数的比例上限")
     parser.add_argument("--seed", type=int, default=42, 
                         help="随机种子（控制可复现性）")
+    parser.add_argument("--extend_plan", type=str, default=None, 
+                        help="已有的 concat_metadata.json 路径，指定后在其后追加 --total_concats 条新拼接")
+    parser.add_argument("--new_video_metadata", type=str, default=None, 
+                        help="追加模式下新增视频的元数据 JSON 文件路径（可选）")
+    parser.add_argument("--duplicate_clusters", type=str, default=None, 
+                        help="video_sampler/find_duplicate_videos.py 输出的重复簇 JSON 文件路径（可选）")
+    parser.add_argument("--duplicate_mode", type=str, choices=["exclude", "co_limit"], default="exclude", 
+                        help="重复簇处理方式，exclude 只保留每簇的代表视频，co_limit 同一簇共享使用上限且不进入同一拼接（默认：exclude）")
+    parser.add_argument("--planner", type=str, choices=["constructive", "greedy"], default="constructive", 
+                        help="规划算法，constructive 按时长分桶预先确定可行组合，greedy 为逐个贪心选择（默认：constructive）")
+    parser.add_argument("--follow", action="store_true", 
+                        help="流式模式：--video_metadata 为采样器 --metadata_stream 输出的 JSONL 文件，"
+                             "边采样边规划，拼接同时追加到 concat_metadata.jsonl")
+    parser.add_argument("--expected_videos", type=int, default=0, 
+                        help="流式模式：预期的视频总数，用于按比例分轮规划（默认：0，采样结束后一次性规划）")
+    parser.add_argument("--plan_window", type=int, default=64, 
+                        help="流式模式：每到达多少个新视频规划一轮（默认：64）")
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
+    if args.follow and (args.extend_plan or args.new_video_metadata or args.duplicate_clusters):
+        parser.error("--follow 不支持 --extend_plan、--new_video_metadata 和 --duplicate_clusters")
+    
     # 创建并运行视频拼接器
-    concatenator = VideoConcatenator(
-        video_metadata=os.path.abspath(args.video_metadata),
-        output_dir=os.path.abspath(args.output_dir),
-        total_concats=args.total_concats,
-        min_videos_per_concat=args.min_videos_per_concat,
-        max_videos_per_concat=args.max_videos_per_concat,
-        target_duration_min=args.target_duration_min,
-        target_duration_max=args.target_duration_max,
-        allow_reuse=args.allow_reuse,
-        reuse_mode=args.reuse_mode,
-        max_usage_ratio=args.max_usage_ratio,
-        seed=args.seed
-    )
-    
-    concatenator.run()
-
+    with StageProfiler.from_args("plan", args) as profiler:
+        with profiler.phase("load"):
+            concatenator = VideoConcatenator(
+                video_metadata=None if args.follow else os.path.abspath(args.video_metadata),
+                output_dir=os.path.abspath(args.output_dir),
+                total_concats=args.total_concats,
+                min_videos_per_concat=args.min_videos_per_concat,
+                max_videos_per_concat=args.max_videos_per_concat,
+                target_duration_min=args.target_duration_min,
+                target_duration_max=args.target_duration_max,
+                allow_reuse=args.allow_reuse,
+                reuse_mode=args.reuse_mode,
+                max_usage_ratio=args.max_usage_ratio,
+                seed=args.seed,
+                planner=args.planner,
+                existing_plan=os.path.abspath(args.extend_plan) if args.extend_plan else None,
+                new_video_metadata=os.path.abspath(args.new_video_metadata) if args.new_video_metadata else None,
+                duplicate_clusters=os.path.abspath(args.duplicate_clusters) if args.duplicate_clusters else None,
+                duplicate_mode=args.duplicate_mode
+            )
+        
+        with profiler.phase("plan"):
+            if args.follow:
+                concatenations = concatenator.run_streaming(os.path.abspath(args.video_metadata),
+                                                            args.expected_videos, args.plan_window)
+            else:
+                concatenations = concatenator.run()
+        profiler.add_items(len(concatenations), "concats")
+        profiler.set_extra("videos", len(concatenator.catalog))
 
 if __name__ == "__main__":
     main()
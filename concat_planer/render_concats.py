@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+拼接视频渲染程序
+根据 concat_metadata.json 生成 concat_XXXXX.mp4，编码参数一致时直接流复制拼接
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 重新编码时与源编码对应的编码器
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265", "mpeg4": "mpeg4", "vp9": "libvpx-vp9"}
+AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus"}
+
+
+def probe_streams(video_path: str) -> Optional[Tuple]:
+    """
+    用 ffprobe 读取视频和音频流参数
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        编码签名元组 (视频编码, 宽, 高, 像素格式, 帧率, 时间基, 音频编码, 采样率, 声道数)；
+        没有音频时音频部分为 None，无法读取或没有视频流时返回 None
+    """
+    cmd = ["ffprobe", "-v", "error", "-show_entries",
+           "stream=codec_type,codec_name,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels",
+           "-of", "json", video_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        streams = json.loads(result.stdout or "{}").get("streams", [])
+    except (subprocess.TimeoutExpired, json.JSONDecodeError):
+        return None
+
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if video is None:
+        return None
+
+    signature = (video.get("codec_name"), video.get("width"), video.get("height"), video.get("pix_fmt"),
+                 video.get("r_frame_rate"), video.get("time_base"))
+    if audio is None:
+        return signature + (None, None, None)
+    return signature + (audio.get("codec_name"), audio.get("sample_rate"), audio.get("channels"))
+
+
+def probe_worker(item: Tuple[str, str]) -> Tuple[str, Optional[Tuple]]:
+    """进程池任务：探测单个视频的编码签名"""
+    video_id, video_path = item
+    return video_id, probe_streams(video_path)
+
+
+def reference_signature(signatures: List[Tuple]) -> Tuple:
+    """
+    选择一条拼接的目标编码参数
+
+    取输入中最常见的签名，与之一致的输入直接流复制；编码器不在支持列表中时改为 h264/aac。
+    """
+    reference = Counter(signatures).most_common(1)[0][0]
+    if reference[0] not in VIDEO_ENCODERS:
+        reference = ("h264",) + reference[1:5] + ("1/90000",) + reference[6:]
+    if reference[6] is not None and reference[6] not in AUDIO_ENCODERS:
+        reference = reference[:6] + ("aac",) + reference[7:]
+    return reference
+
+
+def normalize_input(video_path: str, source: Tuple, reference: Tuple, output_path: str):
+    """
+    将编码参数不一致的输入重新编码为目标参数，以便与其他输入流复制拼接
+
+    Args:
+        video_path: 源视频路径
+        source: 源视频的编码签名
+        reference: 目标编码签名
+        output_path: 重新编码后的文件路径
+    """
+    codec, width, height, pix_fmt, frame_rate, time_base, audio_codec, sample_rate, channels = reference
+    video_filter = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={frame_rate},format={pix_fmt}")
+
+    inputs = ["-i", video_path]
+    options = ["-map", "0:v:0", "-vf", video_filter, "-c:v", VIDEO_ENCODERS[codec],
+               "-video_track_timescale", time_base.split("/")[1]]
+    if audio_codec is None:
+        options += ["-an"]
+    else:
+        if source[6] is None:
+            # 源视频没有音频时补一条静音音轨，保证与其他输入的流布局一致
+            layout = "mono" if channels == 1 else "stereo"
+            inputs += ["-f", "lavfi", "-i", f"anullsrc=r={sample_rate}:cl={layout}"]
+            options += ["-map", "1:a:0", "-shortest"]
+        else:
+            options += ["-map", "0:a:0"]
+        options += ["-c:a", AUDIO_ENCODERS[audio_codec], "-ar", str(sample_rate), "-ac", str(channels)]
+
+    temp_path = f"{output_path}.{os.getpid()}.part"
+    cmd = ["ffmpeg", "-y", "-v", "error"] + inputs + options + ["-f", "mp4", temp_path]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=3600)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def render_concat(task: Tuple[Dict[str, Any], List[Tuple[str, str, Optional[Tuple]]], str, bool]) -> Dict[str, Any]:
+    """
+    进程池任务：渲染一条拼接视频
+
+    Args:
+        task: (拼接记录, [(视频ID, 视频路径, 编码签名)], 输出目录, 是否覆盖已有文件)
+
+    Returns:
+        渲染清单中的一条记录
+    """
+    concat, inputs, output_dir, overwrite = task
+    output_path = os.path.join(output_dir, concat["concat_video"])
+    entry = {"concat_video": concat["concat_video"], "num_inputs": len(inputs)}
+
+    if os.path.exists(output_path) and not overwrite:
+        entry.update({"status": "skipped", "output_size_bytes": os.path.getsize(output_path)})
+        return entry
+
+    missing = [video_id for video_id, video_path, signature in inputs if not video_path or signature is None]
+    if missing:
+        entry.update({"status": "failed", "error": f"Unreadable or unknown source videos: {missing}"})
+        return entry
+
+    start = time.perf_counter()
+    reference = reference_signature([signature for _, _, signature in inputs])
+    reference_key = hashlib.sha1(repr(reference).encode()).hexdigest()[:10]
+    normalized_dir = os.path.join(output_dir, ".normalized")
+
+    # 与目标参数一致的输入直接使用，其余输入重新编码（同一视频同一参数只编码一次）
+    concat_inputs = []
+    reencoded = []
+    try:
+        for video_id, video_path, signature in inputs:
+            if signature == reference:
+                concat_inputs.append(video_path)
+                continue
+            os.makedirs(normalized_dir, exist_ok=True)
+            normalized_path = os.path.join(normalized_dir, f"{video_id}_{reference_key}.mp4")
+            if not os.path.exists(normalized_path):
+                normalize_input(video_path, signature, reference, normalized_path)
+            concat_inputs.append(normalized_path)
+            reencoded.append(video_id)
+
+        # ffmpeg concat demuxer 流复制拼接
+        list_path = f"{output_path}.txt"
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in concat_inputs:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        temp_path = f"{output_path}.part"
+        cmd = ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+               "-map", "0", "-c", "copy", "-movflags", "+faststart", "-f", "mp4", temp_path]
+        subprocess.run(cmd, check=True, capture_output=True, timeout=3600)
+        os.replace(temp_path, output_path)
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.decode(errors="replace").strip().splitlines()
+        entry.update({"status": "failed", "error": error[-1] if error else str(e)})
+        return entry
+    except (subprocess.TimeoutExpired, OSError) as e:
+        entry.update({"status": "failed", "error": str(e)})
+        return entry
+    finally:
+        for path in (f"{output_path}.txt", f"{output_path}.part"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    entry.update({
+        "status": "rendered",
+        "mode": "stream_copy" if not reencoded else "partial_reencode",
+        "reencoded_inputs": reencoded,
+        "render_time_sec": round(time.perf_counter() - start, 3),
+        "output_size_bytes": os.path.getsize(output_path)
+    })
+    return entry
+
+
+class ConcatRenderer:
+    """
+    拼接视频渲染器，按拼接计划在进程池中并行生成拼接视频
+    """
+
+    def __init__(self,
+                 concat_metadata: str,
+                 video_metadata: str,
+                 output_dir: str,
+                 num_workers: Optional[int] = None,
+                 overwrite: bool = False):
+        """
+        初始化渲染器
+
+        Args:
+            concat_metadata: concat_planer.py 生成的 concat_metadata.json 路径
+            video_metadata: 视频元数据 JSON 文件路径（提供 video_name 到 video_path 的映射）
+            output_dir: 拼接视频输出目录
+            num_workers: 并行进程数（默认：CPU 核数）
+            overwrite: 是否覆盖已存在的拼接视频
+        """
+        self.concat_metadata = concat_metadata
+        self.video_metadata = video_metadata
+        self.output_dir = output_dir
+        self.num_workers = num_workers or cpu_count()
+        self.overwrite = overwrite
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _load_inputs(self) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """加载拼接计划和视频路径映射"""
+        with open(self.concat_metadata, 'r', encoding='utf-8') as f:
+            concatenations = json.load(f)
+        with open(self.video_metadata, 'r', encoding='utf-8') as f:
+            video_paths = {video["video_name"]: video["video_path"] for video in json.load(f)}
+        return concatenations, video_paths
+
+    def run(self) -> List[Dict[str, Any]]:
+        """
+        渲染所有拼接视频并写出渲染清单
+
+        Returns:
+            渲染清单
+        """
+        concatenations, video_paths = self._load_inputs()
+        logger.info(f"Loaded {len(concatenations)} concatenations")
+
+        # 每个源视频只探测一次
+        used_videos = sorted({video_id for concat in concatenations for video_id in concat["videos"]})
+        probe_items = [(video_id, video_paths[video_id]) for video_id in used_videos if video_id in video_paths]
+        signatures = {}
+        with Pool(processes=self.num_workers) as pool:
+            for video_id, signature in pool.imap_unordered(probe_worker, probe_items, chunksize=16):
+                signatures[video_id] = signature
+        logger.info(f"Probed {len(probe_items)} source videos "
+                    f"({len(set(s for s in signatures.values() if s is not None))} distinct encodings)")
+
+        tasks = [
+            (concat,
+             [(video_id, video_paths.get(video_id), signatures.get(video_id)) for video_id in concat["videos"]],
+             self.output_dir, self.overwrite)
+            for concat in concatenations
+        ]
+
+        start = time.perf_counter()
+        manifest = []
+        with Pool(processes=self.num_workers) as pool:
+            for entry in pool.imap_unordered(render_concat, tasks):
+                manifest.append(entry)
+                if entry["status"] == "failed":
+                    logger.warning(f"Failed to render {entry['concat_video']}: {entry['error']}")
+                if len(manifest) % 100 == 0:
+                    logger.info(f"Rendered {len(manifest)}/{len(tasks)} concatenations")
+        elapsed = time.perf_counter() - start
+
+        manifest.sort(key=lambda entry: entry["concat_video"])
+        self.save_manifest(manifest)
+
+        status = Counter(entry["status"] for entry in manifest)
+        stream_copied = sum(1 for entry in manifest if entry.get("mode") == "stream_copy")
+        total_size = sum(entry.get("output_size_bytes", 0) for entry in manifest if entry["status"] == "rendered")
+        logger.info(f"Rendered {status['rendered']} ({stream_copied} pure stream copy), "
+                    f"skipped {status['skipped']}, failed {status['failed']} in {elapsed:.1f}s, "
+                    f"{total_size / 1024 / 1024:.1f} MB written")
+        return manifest
+
+    def save_manifest(self, manifest: List[Dict[str, Any]]):
+        """
+        保存渲染清单到JSON文件
+
+        Args:
+            manifest: 每条拼接的渲染结果
+        """
+        manifest_path = os.path.join(self.output_dir, "render_manifest.json")
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        logger.info(f"Manifest saved to {manifest_path}")
+
+
+def main():
+    """
+    主函数，处理命令行参数并运行拼接视频渲染器
+    """
+    parser = argparse.ArgumentParser(description="按拼接计划生成拼接视频")
+    parser.add_argument("--concat_metadata", type=str, required=True,
+                        help="concat_planer.py 生成的 concat_metadata.json 路径")
+    parser.add_argument("--video_metadata", type=str, required=True,
+                        help="视频元数据 JSON 文件路径（提供视频路径）")
+    parser.add_argument("--output_dir", type=str, required=True,
+                        help="拼接视频的保存路径")
+    parser.add_argument("--num_workers", type=int, default=None,
+                        help="并行进程数（默认：CPU 核数）")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="覆盖已存在的拼接视频（默认跳过）")
+
+    args = parser.parse_args()
+
+    renderer = ConcatRenderer(
+        concat_metadata=os.path.abspath(args.concat_metadata),
+        video_metadata=os.path.abspath(args.video_metadata),
+        output_dir=os.path.abspath(args.output_dir),
+        num_workers=args.num_workers,
+        overwrite=args.overwrite
+    )
+    renderer.run()
+
+
+if __name__ == "__main__":
+    main()
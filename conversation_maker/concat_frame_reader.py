@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+拼接视频虚拟帧读取器
+
+训练只需要每个拼接视频的帧序列，而这些帧已经存在于 sample_frames/<video_id>/ 下。
+本模块按拼接计划中的一条记录，按顺序惰性地读出拼接视频的帧，帧的顺序和相对路径与
+generate_train_conversations 生成的 images 列表完全一致（各片段的帧，加上最后一个
+片段末帧的重复帧），因此无需渲染或重新采样拼接视频。
+
+帧可以从散落的 JPEG 文件读取，也可以从打包存储（一个数据文件加一个索引文件）读取，
+并可用线程预取。
+
+用法示例:
+    reader = ConcatFrameReader("/data1/whq/sample_frames", prefetch=8)
+    for plan in load_concat_plan("concat_metadata.json"):
+        for image_path, jpeg_bytes in reader.iter_frames(plan):
+            ...
+"""
+
+import os
+import json
+import mmap
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+
+from generate_train_conversations import load_concat_plan, load_frame_timestamps, select_segment_frames
+
+
+def concat_image_paths(plan: Dict[str, Any],
+                       frame_timestamps: Optional[Dict[str, List[Tuple[int, float]]]] = None,
+                       max_frames: Optional[int] = None,
+                       frame_stride: int = 1,
+                       subsample: str = "boundary") -> List[str]:
+    """
+    计算一条拼接记录的帧相对路径序列
+
+    Args:
+        plan: concat_metadata.json 中的一条记录
+        frame_timestamps: load_frame_timestamps 的结果，None 表示全部按1秒间隔采样
+        max_frames: 每个样本的最大帧数，与 generate_train_conversations 的 --max_frames 相同
+        frame_stride: 帧步长，与 --frame_stride 相同
+        subsample: 降采样方式，与 --subsample 相同
+
+    Returns:
+        "<video_id>/frame_XXXXX.jpg" 形式的相对路径列表，与训练对话中的 images 一致
+    """
+    image_paths = []
+    last_frame = None
+    segment_frames = select_segment_frames(plan['boundaries'], frame_timestamps, max_frames, frame_stride, subsample)
+    for boundary, frame_indices in zip(plan['boundaries'], segment_frames):
+        video_id = boundary['video_id']
+        image_paths.extend(f"{video_id}/frame_{frame_idx:05d}.jpg" for frame_idx in frame_indices)
+        last_frame = f"{video_id}/frame_{(frame_indices[-1] if frame_indices else 0):05d}.jpg"
+
+    # 最后一个片段的末帧在结束信号前重复一次
+    if last_frame is not None:
+        image_paths.append(last_frame)
+    return image_paths
+
+
+class PackedFrameStore:
+    """
+    打包的帧存储：所有帧的 JPEG 数据依次写入一个数据文件，索引文件记录每帧的偏移和长度
+
+    读取时对数据文件做内存映射，避免海量小文件的打开开销。
+    """
+
+    def __init__(self, store_path: str):
+        """
+        Args:
+            store_path: 数据文件路径，索引文件为 <store_path>.index.json
+        """
+        with open(f"{store_path}.index.json", 'r', encoding='utf-8') as f:
+            self.index: Dict[str, List[int]] = json.load(f)
+        self._file = open(store_path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.index else b""
+
+    def __contains__(self, image_path: str) -> bool:
+        return image_path in self.index
+
+    def read(self, image_path: str) -> bytes:
+        """读取一帧的 JPEG 数据"""
+        if image_path not in self.index:
+            raise FileNotFoundError(f"Frame not in packed store: {image_path}")
+        offset, length = self.index[image_path]
+        return self._data[offset:offset + length]
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    @staticmethod
+    def build(sample_frames_dir: str, image_paths: List[str], store_path: str) -> Tuple[int, int]:
+        """
+        将指定帧打包为一个数据文件和索引文件
+
+        Args:
+            sample_frames_dir: 图像帧根目录路径
+            image_paths: 需要打包的帧相对路径（重复项只写一次）
+            store_path: 输出数据文件路径
+
+        Returns:
+            (打包的帧数, 缺失的帧数)
+        """
+        index = {}
+        missing = 0
+        offset = 0
+        with open(store_path, 'wb') as f:
+            for image_path in image_paths:
+                if image_path in index:
+                    continue
+                try:
+                    with open(os.path.join(sample_frames_dir, image_path), 'rb') as frame_file:
+                        data = frame_file.read()
+                except FileNotFoundError:
+                    missing += 1
+                    continue
+                f.write(data)
+                index[image_path] = [offset, len(data)]
+                offset += len(data)
+        with open(f"{store_path}.index.json", 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        return len(index), missing
+
+
+class ConcatFrameReader:
+    """
+    按拼接计划惰性读取拼接视频帧的读取器
+    """
+
+    def __init__(self,
+                 sample_frames_dir: str,
+                 frame_store: Optional[str] = None,
+                 video_metadata_file: Optional[str] = None,
+                 prefetch: int = 0,
+                 max_frames: Optional[int] = None,
+                 frame_stride: int = 1,
+                 subsample: str = "boundary"):
+        """
+        Args:
+            sample_frames_dir: 图像帧根目录路径（sample_frames/）
+            frame_store: 可选的打包帧存储路径，指定后从中读取帧
+            video_metadata_file: 可选的采样元数据文件路径，用于非固定间隔采样的视频
+            prefetch: 预取线程数，0 表示在调用线程中顺序读取
+            max_frames: 每个样本的最大帧数，与 generate_train_conversations 的 --max_frames 相同
+            frame_stride: 帧步长，与 --frame_stride 相同
+            subsample: 降采样方式，与 --subsample 相同
+        """
+        self.sample_frames_dir = sample_frames_dir
+        self.store = PackedFrameStore(frame_store) if frame_store else None
+        self.frame_timestamps = load_frame_timestamps(video_metadata_file) if video_metadata_file else None
+        self.prefetch = prefetch
+        self.max_frames = max_frames
+        self.frame_stride = frame_stride
+        self.subsample = subsample
+        self._executor = ThreadPoolExecutor(max_workers=prefetch) if prefetch > 0 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def frame_paths(self, plan: Dict[str, Any]) -> List[str]:
+        """一条拼接记录的帧相对路径序列"""
+        return concat_image_paths(plan, self.frame_timestamps, self.max_frames, self.frame_stride, self.subsample)
+
+    def read(self, image_path: str) -> bytes:
+        """
+        读取一帧的 JPEG 数据
+
+        Args:
+            image_path: 帧相对路径
+
+        Returns:
+            JPEG 字节串；帧不存在时抛出 FileNotFoundError
+        """
+        if self.store is not None:
+            return self.store.read(image_path)
+        with open(os.path.join(self.sample_frames_dir, image_path), 'rb') as f:
+            return f.read()
+
+    def iter_frames(self, plan: Dict[str, Any]) -> Iterator[Tuple[str, bytes]]:
+        """
+        按顺序惰性读取一条拼接记录的帧
+
+        开启预取时，最多提前 2 * prefetch 帧在后台线程中读取，输出顺序不变。
+
+        Yields:
+            (帧相对路径, JPEG 字节串)
+        """
+        image_paths = self.frame_paths(plan)
+        if self._executor is None:
+            for image_path in image_paths:
+                yield image_path, self.read(image_path)
+            return
+
+        pending = deque()
+        remaining = iter(image_paths)
+        for image_path in remaining:
+            pending.append((image_path, self._executor.submit(self.read, image_path)))
+            if len(pending) >= 2 * self.prefetch:
+                break
+        while pending:
+            image_path, future = pending.popleft()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                pending.append((next_path, self._executor.submit(self.read, next_path)))
+            yield image_path, future.result()
+
+    def missing_frames(self, plan: Dict[str, Any]) -> List[str]:
+        """一条拼接记录中缺失的帧相对路径"""
+        if self.store is not None:
+            return [path for path in self.frame_paths(plan) if path not in self.store]
+        return [path for path in self.frame_paths(plan)
+                if not os.path.isfile(os.path.join(self.sample_frames_dir, path))]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.store is not None:
+            self.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按拼接计划读取拼接视频帧，或将其打包为单个帧存储")
+    parser.add_argument("--concat_plan", required=True, help="拼接计划文件路径")
+    parser.add_argument("--sample_frames_dir", required=True, help="图像帧根目录路径")
+    parser.add_argument("--video_metadata", default=None,
+                        help="可选：video_sampler 生成的采样元数据文件路径")
+    parser.add_argument("--frame_store", default=None,
+                        help="可选：打包帧存储路径，指定后从中读取帧")
+    parser.add_argument("--pack", default=None,
+                        help="将拼接计划用到的帧打包到该路径（生成数据文件和 .index.json 索引）")
+    parser.add_argument("--prefetch", type=int, default=8,
+                        help="预取线程数，0 表示不预取（默认：8）")
+    parser.add_argument("--max_frames", type=int, default=None,
+                        help="可选：每个样本的最大帧数，与 generate_train_conversations 的参数相同")
+    parser.add_argument("--frame_stride", type=int, default=1, help="帧步长（默认：1）")
+    parser.add_argument("--subsample", choices=["uniform", "boundary"], default="boundary",
+                        help="超出帧预算时的降采样方式（默认：boundary）")
+
+    args = parser.parse_args()
+
+    concat_plans = load_concat_plan(args.concat_plan)
+
+    if args.pack:
+        frame_timestamps = load_frame_timestamps(args.video_metadata) if args.video_metadata else None
+        image_paths = [path for plan in concat_plans
+                       for path in concat_image_paths(plan, frame_timestamps, args.max_frames, args.frame_stride,
+                                                      args.subsample)]
+        packed, missing = PackedFrameStore.build(os.path.abspath(args.sample_frames_dir), image_paths,
+                                                 os.path.abspath(args.pack))
+        print(f"打包完成，共 {packed} 帧，缺失 {missing} 帧")
+        print(f"结果保存至: {os.path.abspath(args.pack)}")
+        return
+
+    # 顺序读取全部拼接视频的帧，统计缺失帧和读取吞吐
+    frame_count = 0
+    total_bytes = 0
+    incomplete = 0
+    start = time.perf_counter()
+    with ConcatFrameReader(os.path.abspath(args.sample_frames_dir),
+                           os.path.abspath(args.frame_store) if args.frame_store else None,
+                           os.path.abspath(args.video_metadata) if args.video_metadata else None,
+                           args.prefetch, args.max_frames, args.frame_stride, args.subsample) as reader:
+        for plan in concat_plans:
+            if reader.missing_frames(plan):
+                incomplete += 1
+                continue
+            for _, data in reader.iter_frames(plan):
+                frame_count += 1
+                total_bytes += len(data)
+    elapsed = time.perf_counter() - start
+
+    print(f"读取完成，共 {len(concat_plans)} 个拼接视频，{frame_count} 帧，{total_bytes / 1024 / 1024:.1f} MB，"
+          f"耗时 {elapsed:.2f}s（{frame_count / max(elapsed, 1e-9):.0f} 帧/秒）")
+    if incomplete:
+        print(f"其中 {incomplete} 个拼接视频存在缺失帧，已跳过")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,18 +6,25 @@
 1. 拼接策略文件 (concat_metadata.json)
 2. 原始视频标注文件 (concatenated_video_annotations.json 或 cleaned版本)
 3. 图像帧路径 (sample_frames/ 目录下各视频子目录)
+4. 可选：采样元数据文件 (video_metadata.json)，用于非固定间隔采样的视频
 
 输出:
 训练用对话格式JSON文件 (train_conversations.json)
 """
 
 import os
+import sys
 import json
 import math
+import time
 import argparse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_io import JsonlFollower
+from stage_profile import StageProfiler, add_profile_arguments
+
 
 def load_concat_plan(plan_file: str) -> List[Dict]:
     """加载拼接计划文件"""
@@ -39,135 +46,436 @@ def load_video_annotations(annotation_file: str) -> Dict[str, List[Dict]]:
     return annotations
 
 
-def generate_train_conversations(concat_plan_file: str, 
-                                annotation_file: str, 
-                                sample_frames_dir: str,
-                                output_file: str):
+def load_frame_timestamps(video_metadata_file: str) -> Dict[str, List[Tuple[int, float]]]:
     """
-    生成训练用对话格式JSON文件
+    加载非固定间隔采样视频的帧时间戳
+    
+    固定间隔（1秒）采样的视频帧号即秒数，无需记录；自适应采样等模式的视频
+    按元数据中记录的真实时间戳对齐片段边界。
     
     Args:
-        concat_plan_file: 拼接计划文件路径
-        annotation_file: 原始视频标注文件路径
-        sample_frames_dir: 图像帧根目录路径
-        output_file: 输出文件路径
+        video_metadata_file: video_sampler 生成的采样元数据文件路径
+        
+    Returns:
+        视频名称到 (帧号, 时间戳) 列表的映射
     """
+    with open(os.path.abspath(video_metadata_file), 'r', encoding='utf-8') as f:
+        video_metadata = json.load(f)
     
-    # 加载输入文件
-    concat_plans = load_concat_plan(os.path.abspath(concat_plan_file))
-    video_annotations = load_video_annotations(os.path.abspath(annotation_file))
+    frame_timestamps = {}
+    for video in video_metadata:
+        timestamps = video_frame_timestamps(video)
+        if timestamps is not None:
+            frame_timestamps[video['video_name']] = timestamps
     
-    # 结果存储
-    train_conversations = []
+    return frame_timestamps
+
+
+def video_frame_timestamps(video: Dict[str, Any]) -> Optional[List[Tuple[int, float]]]:
+    """
+    单个视频元数据条目的 (帧号, 时间戳) 列表，固定 1 秒间隔采样的视频返回 None
+    """
+    if video.get('sampling_mode', 'fixed') == 'fixed' and video.get('sampling_interval', 1.0) == 1.0:
+        return None
+    if 'frames' in video:
+        return [(frame['frame_index'], frame['timestamp_sec']) for frame in video['frames']]
+    # 紧凑格式：仅记录偏离采样网格的时间戳
+    overrides = video.get('timestamp_overrides', {})
+    return [
+        (index, overrides.get(str(index), index * video['sampling_interval']))
+        for index in range(video['sampled_frames'])
+    ]
+
+
+def segment_frame_indices(video_id: str, segment_duration: float,
+                          frame_timestamps: Optional[Dict[str, List[Tuple[int, float]]]] = None) -> List[int]:
+    """
+    计算一个视频片段使用的帧号列表
     
-    # 处理每个拼接视频
-    for plan in concat_plans:
-        concat_video_name = plan['concat_video']
-        # 从拼接视频名称获取ID（去掉.mp4扩展名）
-        concat_video_id = concat_video_name.replace('.mp4', '')
-        boundaries = plan['boundaries']
+    Args:
+        video_id: 视频ID
+        segment_duration: 片段时长（秒）
+        frame_timestamps: load_frame_timestamps 的结果，None 表示全部按1秒间隔采样
         
-        images = []
-        conversations = []
+    Returns:
+        帧号列表，最后一个元素为该片段的最后一帧
+    """
+    if frame_timestamps and video_id in frame_timestamps:
+        timestamps = frame_timestamps[video_id]
+        indices = [index for index, timestamp in timestamps if timestamp <= segment_duration]
+        # 至少保留第一帧
+        if not indices and timestamps:
+            indices = [timestamps[0][0]]
+        return indices
+    
+    # 1秒间隔采样：帧号即秒数，使用floor(t)
+    return list(range(0, math.floor(segment_duration) + 1))
+
+
+def allocate_frame_quotas(lengths: List[int], budget: int, minimum: List[int]) -> List[int]:
+    """
+    按片段帧数比例分配帧预算（最大余数法），每个片段至少保留 minimum 帧
+    
+    Args:
+        lengths: 各片段的帧数
+        budget: 可分配的总帧数
+        minimum: 各片段至少保留的帧数
         
-        # 添加固定的首句
-        conversations.append({
-            "from": "human",
-            "value": "请适当地描述一下视频中发生的内容"
-        })
+    Returns:
+        各片段保留的帧数；最少帧数之和已超出预算时返回 minimum
+    """
+    spare = budget - sum(minimum)
+    capacity = [length - low for length, low in zip(lengths, minimum)]
+    if spare <= 0 or sum(capacity) == 0:
+        return list(minimum)
+    
+    shares = [spare * room / sum(capacity) for room in capacity]
+    quotas = [low + math.floor(share) for low, share in zip(minimum, shares)]
+    remainder = budget - sum(quotas)
+    for index in sorted(range(len(shares)), key=lambda i: math.floor(shares[i]) - shares[i])[:remainder]:
+        quotas[index] += 1
+    return quotas
+
+
+def subsample_frames(frame_indices: List[int], quota: int, strategy: str) -> List[int]:
+    """
+    从一个片段的帧中均匀选取 quota 帧
+    
+    Args:
+        frame_indices: 片段的帧号列表
+        quota: 保留的帧数
+        strategy: "uniform" 在片段内等间隔取每个区间的中点；
+                  "boundary" 始终保留片段的首帧和末帧，中间等间隔选取
+                  
+    Returns:
+        保留的帧号列表（保持原顺序）
+    """
+    count = len(frame_indices)
+    if quota >= count:
+        return list(frame_indices)
+    if quota <= 0:
+        return []
+    if strategy == "boundary":
+        if quota == 1:
+            return [frame_indices[-1]]
+        return [frame_indices[round(k * (count - 1) / (quota - 1))] for k in range(quota)]
+    return [frame_indices[int((k + 0.5) * count / quota)] for k in range(quota)]
+
+
+def select_segment_frames(boundaries: List[Dict[str, Any]],
+                          frame_timestamps: Optional[Dict[str, List[Tuple[int, float]]]] = None,
+                          max_frames: Optional[int] = None,
+                          frame_stride: int = 1,
+                          strategy: str = "boundary") -> List[List[int]]:
+    """
+    计算一条拼接记录中每个片段保留的帧号
+    
+    先按 frame_stride 每隔若干帧取一帧（始终保留片段末帧），总帧数（含最后重复的一帧）
+    超出 max_frames 时再按片段帧数比例分配预算并在片段内均匀降采样。
+    
+    Args:
+        boundaries: 拼接计划中的片段边界列表
+        frame_timestamps: load_frame_timestamps 的结果，None 表示全部按1秒间隔采样
+        max_frames: 每个样本的最大帧数，None 或 0 表示不限制
+        frame_stride: 帧步长，1 表示保留全部帧
+        strategy: 降采样方式，"uniform" 或 "boundary"（保留每个片段的首末帧）
         
-        # 获取该拼接视频的标注信息
-        annotations = video_annotations.get(concat_video_id, [])
+    Returns:
+        每个片段保留的帧号列表
+    """
+    segments = []
+    for boundary in boundaries:
+        frame_indices = segment_frame_indices(boundary['video_id'], boundary['end_time'] - boundary['start_time'],
+                                              frame_timestamps)
+        if frame_stride > 1 and frame_indices:
+            strided = frame_indices[::frame_stride]
+            if strided[-1] != frame_indices[-1]:
+                strided.append(frame_indices[-1])
+            frame_indices = strided
+        segments.append(frame_indices)
+    
+    # 最后一个片段的末帧会在结束信号前重复一次，占用一帧预算
+    if not max_frames or sum(len(frames) for frames in segments) + 1 <= max_frames:
+        return segments
+    
+    lengths = [len(frames) for frames in segments]
+    minimum = [min(length, 2 if strategy == "boundary" else 1) for length in lengths]
+    quotas = allocate_frame_quotas(lengths, max_frames - 1, minimum)
+    return [subsample_frames(frames, quota, strategy) for frames, quota in zip(segments, quotas)]
+
+
+def build_conversation(plan: Dict[str, Any],
+                       annotations: List[Dict[str, Any]],
+                       frame_timestamps: Optional[Dict[str, List[Tuple[int, float]]]] = None,
+                       max_frames: Optional[int] = None,
+                       frame_stride: int = 1,
+                       subsample: str = "boundary") -> Dict[str, Any]:
+    """
+    为一个拼接视频构造训练样本
+    
+    Args:
+        plan: 拼接计划中的一条记录
+        annotations: 该拼接视频各片段的标注（video_id、summary）
+        frame_timestamps: load_frame_timestamps 返回的帧时间戳
+        max_frames: 每个样本的最大帧数，None 表示不限制
+        frame_stride: 帧步长，1 表示保留全部帧
+        subsample: 超出帧预算时的降采样方式（"uniform" 或 "boundary"）
         
-        # 创建一个字典，用于快速查找每个视频片段的summary
-        video_summaries = {}
-        for annotation in annotations:
-            video_id = annotation['video_id']
-            video_summaries[video_id] = annotation['summary']
+    Returns:
+        训练样本（video、images、conversations）
+    """
+    concat_video_name = plan['concat_video']
+    boundaries = plan['boundaries']
+    segment_frames = select_segment_frames(boundaries, frame_timestamps, max_frames, frame_stride, subsample)
+    
+    images = []
+    conversations = []
+    
+    # 添加固定的首句
+    conversations.append({
+        "from": "human",
+        "value": "请适当地描述一下视频中发生的内容"
+    })
+    
+    # 创建一个字典，用于快速查找每个视频片段的summary
+    video_summaries = {}
+    for annotation in annotations:
+        video_id = annotation['video_id']
+        video_summaries[video_id] = annotation['summary']
+    
+    # 遍历每个边界片段
+    for i, boundary in enumerate(boundaries):
+        video_id = boundary['video_id']
         
-        # 遍历每个边界片段
-        for i, boundary in enumerate(boundaries):
-            video_id = boundary['video_id']
-            start_time = boundary['start_time']
-            end_time = boundary['end_time']
-            
-            # 获取当前视频片段的summary
-            current_summary = video_summaries.get(video_id)
-            
-            # 计算该片段的帧范围（相对于各自视频的帧索引）
-            start_frame = 0  # 每个原始视频都从帧0开始
-            end_frame = math.floor(end_time - start_time)  # 相对于该视频片段的帧数
-            
-            # 为每一秒添加帧和对话
-            for frame_idx in range(start_frame, end_frame + 1):  # 包含end_frame
-                # 构造图像路径（每个原始视频的帧都从0开始）
-                image_path = f"{video_id}/frame_{frame_idx:05d}.jpg"
-                images.append(image_path)
-                
-                # 添加图像对话
-                conversations.append({
-                    "from": "human",
-                    "value": "<image>"
-                })
-                
-                # 只有在当前视频片段的最后一帧才输出该视频的summary
-                # 但最后一个视频片段的summary需要特殊处理
-                if frame_idx == end_frame and current_summary and i < len(boundaries) - 1:
-                    conversations.append({
-                        "from": "gpt",
-                        "value": f"<|response|> {current_summary}"
-                    })
-                else:
-                    # 其他情况输出silent
-                    conversations.append({
-                        "from": "gpt",
-                        "value": "<|silent|>"
-                    })
+        # 获取当前视频片段的summary
+        current_summary = video_summaries.get(video_id)
         
-        # 特殊处理最后一个视频片段
-        if boundaries:
-            # 添加最后一个图像帧
-            last_boundary = boundaries[-1]
-            last_video_id = last_boundary['video_id']
-            last_start_time = last_boundary['start_time']
-            last_end_time = last_boundary['end_time']
-            last_frame_idx = math.floor(last_end_time - last_start_time)  # 相对于该视频片段的帧数
-            last_image_path = f"{last_video_id}/frame_{last_frame_idx:05d}.jpg"
-            images.append(last_image_path)
+        # 该片段保留的帧列表（相对于各自视频的帧索引，每个原始视频都从帧0开始）
+        frame_indices = segment_frames[i]
+        
+        # 为每一帧添加帧和对话
+        for position, frame_idx in enumerate(frame_indices):
+            # 构造图像路径（每个原始视频的帧都从0开始）
+            image_path = f"{video_id}/frame_{frame_idx:05d}.jpg"
+            images.append(image_path)
             
-            # 添加最后一个图像对话
+            # 添加图像对话
             conversations.append({
                 "from": "human",
                 "value": "<image>"
             })
             
-            # 添加结束信号
-            conversations.append({
-                "from": "human",
-                "value": "<|END_OF_STREAMING|>"
-            })
-            
-            # 获取最后一个视频片段的summary并输出
-            last_summary = video_summaries.get(last_video_id)
-            if last_summary:
+            # 只有在当前视频片段保留的最后一帧才输出该视频的summary
+            # 但最后一个视频片段的summary需要特殊处理
+            if position == len(frame_indices) - 1 and current_summary and i < len(boundaries) - 1:
                 conversations.append({
                     "from": "gpt",
-                    "value": f"<|response|> {last_summary}"
+                    "value": f"<|response|> {current_summary}"
                 })
+            else:
+                # 其他情况输出silent
+                conversations.append({
+                    "from": "gpt",
+                    "value": "<|silent|>"
+                })
+    
+    # 特殊处理最后一个视频片段
+    if boundaries:
+        # 添加最后一个图像帧
+        last_video_id = boundaries[-1]['video_id']
+        last_frame_indices = segment_frames[-1]
+        last_frame_idx = last_frame_indices[-1] if last_frame_indices else 0  # 该视频片段保留的最后一帧
+        last_image_path = f"{last_video_id}/frame_{last_frame_idx:05d}.jpg"
+        images.append(last_image_path)
         
-        # 添加到结果中
-        train_conversations.append({
-            "video": concat_video_name,
-            "images": images,
-            "conversations": conversations
+        # 添加最后一个图像对话
+        conversations.append({
+            "from": "human",
+            "value": "<image>"
+        })
+        
+        # 添加结束信号
+        conversations.append({
+            "from": "human",
+            "value": "<|END_OF_STREAMING|>"
         })
+        
+        # 获取最后一个视频片段的summary并输出
+        last_summary = video_summaries.get(last_video_id)
+        if last_summary:
+            conversations.append({
+                "from": "gpt",
+                "value": f"<|response|> {last_summary}"
+            })
+    
+    return {
+        "video": concat_video_name,
+        "images": images,
+        "conversations": conversations
+    }
+
+
+def generate_train_conversations(concat_plan_file: str, 
+                                annotation_file: str, 
+                                sample_frames_dir: str,
+                                output_file: str,
+                                video_metadata_file: Optional[str] = None,
+                                max_frames: Optional[int] = None,
+                                frame_stride: int = 1,
+                                subsample: str = "boundary") -> int:
+    """
+    生成训练用对话格式JSON文件
+    
+    Args:
+        concat_plan_file: 拼接计划文件路径
+        annotation_file: 原始视频标注文件路径
+        sample_frames_dir: 图像帧根目录路径
+        output_file: 输出文件路径
+        video_metadata_file: 可选的采样元数据文件路径，用于按真实时间戳对齐非固定间隔采样的帧
+        max_frames: 每个样本的最大帧数，None 表示不限制
+        frame_stride: 帧步长，1 表示保留全部帧
+        subsample: 超出帧预算时的降采样方式（"uniform" 或 "boundary"）
+        
+    Returns:
+        生成的样本数
+    """
+    
+    # 加载输入文件
+    concat_plans = load_concat_plan(os.path.abspath(concat_plan_file))
+    video_annotations = load_video_annotations(os.path.abspath(annotation_file))
+    frame_timestamps = load_frame_timestamps(video_metadata_file) if video_metadata_file else None
+    
+    # 结果存储
+    train_conversations = []
+    # 片段过多、每个片段保留最少帧后仍超出帧预算的样本数
+    over_budget = 0
+    
+    # 处理每个拼接视频
+    for plan in concat_plans:
+        # 从拼接视频名称获取ID（去掉.mp4扩展名）
+        concat_video_id = plan['concat_video'].replace('.mp4', '')
+        sample = build_conversation(plan, video_annotations.get(concat_video_id, []), frame_timestamps,
+                                    max_frames, frame_stride, subsample)
+        if max_frames and len(sample["images"]) > max_frames:
+            over_budget += 1
+        train_conversations.append(sample)
     
     # 保存结果
     with open(os.path.abspath(output_file), 'w', encoding='utf-8') as f:
         json.dump(train_conversations, f, ensure_ascii=False, indent=2)
     
     print(f"生成完成，共处理 {len(train_conversations)} 个拼接视频")
+    if over_budget:
+        print(f"其中 {over_budget} 个拼接视频的片段数过多，保留每个片段的最少帧后仍超出 {max_frames} 帧")
+    print(f"结果保存至: {output_file}")
+    return len(train_conversations)
+
+
+def write_shard(samples: List[Dict[str, Any]], output_file: str, shard_index: int) -> str:
+    """把一批样本写为独立的训练分片 <输出文件名>_shard_<序号>.json，先写临时文件再改名"""
+    root, ext = os.path.splitext(output_file)
+    shard_file = f"{root}_shard_{shard_index:05d}{ext or '.json'}"
+    with open(shard_file + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(samples, f, ensure_ascii=False, indent=2)
+    os.replace(shard_file + ".tmp", shard_file)
+    return shard_file
+
+
+def generate_train_conversations_streaming(concat_plan_stream: str,
+                                           annotation_stream: str,
+                                           output_file: str,
+                                           video_metadata_stream: Optional[str] = None,
+                                           max_frames: Optional[int] = None,
+                                           frame_stride: int = 1,
+                                           subsample: str = "boundary",
+                                           shard_size: int = 1000,
+                                           poll_interval: float = 1.0) -> int:
+    """
+    流式生成训练对话：每个拼接视频的清理后标注一到达就生成样本，每满 shard_size 个样本
+    写出一个可直接用于训练的分片，上游全部写完后再写出完整的输出文件
+    
+    与批量模式不同，只为出现在标注流中的拼接视频（即通过过滤的拼接视频）生成样本，
+    样本按标注到达的顺序排列。
+    
+    Args:
+        concat_plan_stream: 拼接规划器 --follow 输出的 concat_metadata.jsonl 路径
+        annotation_stream: 过滤后的标注 JSONL 路径（filter_annotations.py --follow 的输出）
+        output_file: 完整输出文件路径，分片写在同一目录下
+        video_metadata_stream: 可选，采样器 --metadata_stream 输出的 JSONL 路径
+        max_frames: 每个样本的最大帧数，None 表示不限制
+        frame_stride: 帧步长，1 表示保留全部帧
+        subsample: 超出帧预算时的降采样方式（"uniform" 或 "boundary"）
+        shard_size: 每个分片的样本数
+        poll_interval: 没有新数据时的等待间隔（秒）
+        
+    Returns:
+        生成的样本数
+    """
+    annotation_follower = JsonlFollower(annotation_stream)
+    plan_follower = JsonlFollower(concat_plan_stream)
+    metadata_follower = JsonlFollower(video_metadata_stream) if video_metadata_stream else None
+    
+    plans: Dict[str, Dict[str, Any]] = {}
+    frame_timestamps: Dict[str, List[Tuple[int, float]]] = {}
+    waiting: List[Dict[str, Any]] = []
+    train_conversations = []
+    shard: List[Dict[str, Any]] = []
+    shard_count = 0
+    over_budget = 0
+    start = time.perf_counter()
+    
+    while True:
+        # 按与生产顺序相反的次序读取：读到的标注对应的拼接策略和采样元数据在此之前都已写入
+        annotation_lines = annotation_follower.poll()
+        waiting.extend(json.loads(line) for line in annotation_lines)
+        for line in plan_follower.poll():
+            plan = json.loads(line)
+            plans[plan['concat_video'].replace('.mp4', '')] = plan
+        if metadata_follower is not None:
+            for line in metadata_follower.poll():
+                video = json.loads(line)
+                timestamps = video_frame_timestamps(video)
+                if timestamps is not None:
+                    frame_timestamps[video['video_name']] = timestamps
+        
+        still_waiting = []
+        for item in waiting:
+            plan = plans.get(item['video'])
+            if plan is None:
+                still_waiting.append(item)
+                continue
+            sample = build_conversation(plan, item['data'], frame_timestamps, max_frames, frame_stride, subsample)
+            if max_frames and len(sample["images"]) > max_frames:
+                over_budget += 1
+            train_conversations.append(sample)
+            shard.append(sample)
+            if len(shard) >= shard_size:
+                shard_file = write_shard(shard, output_file, shard_count)
+                print(f"[{time.perf_counter() - start:.1f}s] 分片 {shard_count} 已写出 ({len(shard)} 个样本): {shard_file}")
+                shard_count += 1
+                shard = []
+        waiting = still_waiting
+        
+        if annotation_follower.finished and (not waiting or plan_follower.finished):
+            break
+        if not annotation_lines:
+            time.sleep(poll_interval)
+    
+    if waiting:
+        print(f"警告: {len(waiting)} 个拼接视频的标注在拼接策略中找不到，已跳过")
+    if shard:
+        shard_file = write_shard(shard, output_file, shard_count)
+        print(f"[{time.perf_counter() - start:.1f}s] 分片 {shard_count} 已写出 ({len(shard)} 个样本): {shard_file}")
+        shard_count += 1
+    
+    with open(os.path.abspath(output_file), 'w', encoding='utf-8') as f:
+        json.dump(train_conversations, f, ensure_ascii=False, indent=2)
+    
+    print(f"生成完成，共处理 {len(train_conversations)} 个拼接视频，写出 {shard_count} 个分片")
+    if over_budget:
+        print(f"其中 {over_budget} 个拼接视频的片段数过多，保留每个片段的最少帧后仍超出 {max_frames} 帧")
     print(f"结果保存至: {output_file}")
+    return len(train_conversations)
 
 
 def main():
@@ -184,16 +492,66 @@ def main():
     parser.add_argument("--output", 
                         default="/data1/whq/annotation_maker/annotation_concatter/train_conversations.json",
                         help="输出文件路径")
+    parser.add_argument("--video_metadata", 
+                        default=None,
+                        help="可选：video_sampler 生成的采样元数据文件路径，"
+                             "非1秒间隔或自适应采样的视频按其中的真实时间戳对齐片段边界")
+    parser.add_argument("--max_frames", 
+                        type=int,
+                        default=None,
+                        help="可选：每个样本的最大帧数（含结束前重复的最后一帧），超出时按片段比例降采样")
+    parser.add_argument("--frame_stride", 
+                        type=int,
+                        default=1,
+                        help="帧步长，每隔若干帧保留一帧，始终保留片段末帧（默认：1，保留全部帧）")
+    parser.add_argument("--subsample", 
+                        choices=["uniform", "boundary"],
+                        default="boundary",
+                        help="超出帧预算时的降采样方式：uniform 在片段内均匀选取，"
+                             "boundary 始终保留每个片段的首帧和末帧（默认：boundary）")
+    parser.add_argument("--follow", 
+                        action="store_true",
+                        help="流式模式：--concat_plan、--annotations 和 --video_metadata 均为上游仍在追加的 "
+                             "JSONL 文件，标注一到达就生成样本并按 --shard_size 写出训练分片")
+    parser.add_argument("--shard_size", 
+                        type=int,
+                        default=1000,
+                        help="流式模式：每个训练分片的样本数（默认：1000）")
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
-    generate_train_conversations(
-        os.path.abspath(args.concat_plan),
-        os.path.abspath(args.annotations),
-        os.path.abspath(args.sample_frames_dir),
-        os.path.abspath(args.output)
-    )
-
+    if args.frame_stride < 1:
+        parser.error("--frame_stride 必须大于等于 1")
+    if args.max_frames is not None and args.max_frames < 2:
+        parser.error("--max_frames 必须大于等于 2")
+    if args.shard_size < 1:
+        parser.error("--shard_size 必须大于等于 1")
+    
+    with StageProfiler.from_args("conversations", args) as profiler:
+        if args.follow:
+            samples = generate_train_conversations_streaming(
+                os.path.abspath(args.concat_plan),
+                os.path.abspath(args.annotations),
+                os.path.abspath(args.output),
+                os.path.abspath(args.video_metadata) if args.video_metadata else None,
+                max_frames=args.max_frames,
+                frame_stride=args.frame_stride,
+                subsample=args.subsample,
+                shard_size=args.shard_size
+            )
+        else:
+            samples = generate_train_conversations(
+                os.path.abspath(args.concat_plan),
+                os.path.abspath(args.annotations),
+                os.path.abspath(args.sample_frames_dir),
+                os.path.abspath(args.output),
+                os.path.abspath(args.video_metadata) if args.video_metadata else None,
+                max_frames=args.max_frames,
+                frame_stride=args.frame_stride,
+                subsample=args.subsample
+            )
+        profiler.add_items(samples, "samples")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
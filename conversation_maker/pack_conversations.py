@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+训练对话序列打包程序
+
+generate_train_conversations 生成的样本长度取决于拼接视频时长，相差可达一个数量级，
+按最长样本补齐会浪费大量训练算力。本程序估计每个样本的 token 开销（每帧图像的 token
+数 + 各轮文本的 token 数 + 每轮的角色标记开销），再把样本装箱到固定 token 预算的训练
+序列中：
+- ffd：首次适应递减（First-Fit Decreasing），用线段树在 O(log n) 内找到第一个放得下的序列
+- bfd：最佳适应递减（Best-Fit Decreasing），用有序剩余容量表二分查找剩余空间最小的序列
+
+输出打包清单（每个序列包含的样本序号和视频名）和打包效率报告。
+"""
+
+import os
+import re
+import json
+import math
+import time
+import bisect
+import argparse
+from typing import List, Dict, Any, Tuple
+
+_CJK = re.compile(r'[一-鿿　-〿＀-￯]')
+
+
+def estimate_text_tokens(text: str) -> int:
+    """粗略估计文本的 token 数：中日韩字符每字一个 token，其余字符约 4 个一个 token"""
+    cjk = len(_CJK.findall(text)) if not text.isascii() else 0
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def estimate_sample_tokens(sample: Dict[str, Any], tokens_per_image: int, tokens_per_turn: int) -> int:
+    """
+    估计一个训练样本的 token 开销
+
+    Args:
+        sample: train_conversations.json 中的一个样本
+        tokens_per_image: 每帧图像的 token 数
+        tokens_per_turn: 每轮对话的角色标记等额外 token 数
+
+    Returns:
+        估计的 token 数
+    """
+    tokens = 0
+    for turn in sample["conversations"]:
+        value = turn["value"]
+        tokens += tokens_per_image if value == "<image>" else estimate_text_tokens(value)
+        tokens += tokens_per_turn
+    return tokens
+
+
+def first_fit_decreasing(costs: List[int], budget: int) -> List[List[int]]:
+    """
+    首次适应递减装箱
+
+    线段树的叶子是各序列的剩余容量（未启用的序列容量为 budget），内部节点保存子树最大值，
+    每个样本从根向下找到最左侧容量足够的叶子。
+
+    Args:
+        costs: 每个样本的 token 开销（均不超过 budget）
+        budget: 每个序列的 token 预算
+
+    Returns:
+        每个序列包含的样本序号列表
+    """
+    order = sorted(range(len(costs)), key=lambda index: -costs[index])
+    size = 1
+    while size < max(len(costs), 1):
+        size *= 2
+    tree = [budget] * (2 * size)
+    packs: List[List[int]] = []
+
+    for index in order:
+        cost = costs[index]
+        node = 1
+        while node < size:
+            node = 2 * node if tree[2 * node] >= cost else 2 * node + 1
+        slot = node - size
+        if slot == len(packs):
+            packs.append([])
+        packs[slot].append(index)
+
+        tree[node] -= cost
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+    return packs
+
+
+def best_fit_decreasing(costs: List[int], budget: int) -> List[List[int]]:
+    """
+    最佳适应递减装箱：放入剩余容量最小且放得下的序列
+
+    Args:
+        costs: 每个样本的 token 开销（均不超过 budget）
+        budget: 每个序列的 token 预算
+
+    Returns:
+        每个序列包含的样本序号列表
+    """
+    order = sorted(range(len(costs)), key=lambda index: -costs[index])
+    # 按剩余容量升序排列的 (剩余容量, 序列号)
+    remaining: List[Tuple[int, int]] = []
+    packs: List[List[int]] = []
+
+    for index in order:
+        cost = costs[index]
+        position = bisect.bisect_left(remaining, (cost, -1))
+        if position < len(remaining):
+            capacity, slot = remaining.pop(position)
+        else:
+            capacity, slot = budget, len(packs)
+            packs.append([])
+        packs[slot].append(index)
+        if capacity - cost > 0:
+            bisect.insort(remaining, (capacity - cost, slot))
+    return packs
+
+
+PACKERS = {"ffd": first_fit_decreasing, "bfd": best_fit_decreasing}
+
+
+def pack_conversations(conversations: List[Dict[str, Any]],
+                       budget: int,
+                       algorithm: str = "ffd",
+                       tokens_per_image: int = 256,
+                       tokens_per_turn: int = 4) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    把训练样本打包到固定 token 预算的序列中
+
+    Args:
+        conversations: train_conversations.json 的样本列表
+        budget: 每个序列的 token 预算
+        algorithm: 装箱算法（ffd / bfd）
+        tokens_per_image: 每帧图像的 token 数
+        tokens_per_turn: 每轮对话的额外 token 数
+
+    Returns:
+        (打包清单, 打包效率报告)
+    """
+    start = time.perf_counter()
+    costs = [estimate_sample_tokens(sample, tokens_per_image, tokens_per_turn) for sample in conversations]
+
+    # 超出预算的样本无法装入任何序列，单独列出
+    packable = [index for index, cost in enumerate(costs) if cost <= budget]
+    oversize = [index for index, cost in enumerate(costs) if cost > budget]
+    packs = PACKERS[algorithm]([costs[index] for index in packable], budget)
+
+    manifest = []
+    for pack_id, members in enumerate(packs):
+        indices = sorted(packable[member] for member in members)
+        tokens = sum(costs[index] for index in indices)
+        manifest.append({
+            "pack_id": pack_id,
+            "tokens": tokens,
+            "fill_ratio": tokens / budget,
+            "samples": indices,
+            "videos": [conversations[index].get("video") for index in indices]
+        })
+    elapsed = time.perf_counter() - start
+
+    packed_tokens = sum(costs[index] for index in packable)
+    longest = max((costs[index] for index in packable), default=0)
+    fill_ratios = sorted(pack["fill_ratio"] for pack in manifest)
+    report = {
+        "algorithm": algorithm,
+        "budget": budget,
+        "tokens_per_image": tokens_per_image,
+        "tokens_per_turn": tokens_per_turn,
+        "samples": len(conversations),
+        "packed_samples": len(packable),
+        "oversize_samples": len(oversize),
+        "oversize_videos": [conversations[index].get("video") for index in oversize],
+        "packs": len(manifest),
+        "packed_tokens": packed_tokens,
+        # 打包后的有效 token 占比
+        "packing_efficiency": packed_tokens / (len(manifest) * budget) if manifest else 0.0,
+        # 对比：每个样本单独一条序列并补齐到最长样本时的有效 token 占比
+        "padding_efficiency": packed_tokens / (len(packable) * longest) if packable else 0.0,
+        "mean_samples_per_pack": len(packable) / len(manifest) if manifest else 0.0,
+        "min_fill_ratio": fill_ratios[0] if fill_ratios else 0.0,
+        "median_fill_ratio": fill_ratios[len(fill_ratios) // 2] if fill_ratios else 0.0,
+        "lower_bound_packs": math.ceil(packed_tokens / budget),
+        "elapsed_sec": round(elapsed, 3)
+    }
+    return manifest, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把训练对话打包到固定 token 预算的序列中")
+    parser.add_argument("--train_conversations", required=True, help="训练对话文件路径")
+    parser.add_argument("--output", required=True, help="打包清单输出路径")
+    parser.add_argument("--report", default=None, help="打包效率报告输出路径（默认：<output>.report.json）")
+    parser.add_argument("--budget", type=int, default=32768, help="每个序列的 token 预算（默认：32768）")
+    parser.add_argument("--algorithm", choices=sorted(PACKERS), default="ffd",
+                        help="装箱算法：ffd 首次适应递减，bfd 最佳适应递减（默认：ffd）")
+    parser.add_argument("--tokens_per_image", type=int, default=256, help="每帧图像的 token 数（默认：256）")
+    parser.add_argument("--tokens_per_turn", type=int, default=4, help="每轮对话的额外 token 数（默认：4）")
+
+    args = parser.parse_args()
+
+    with open(os.path.abspath(args.train_conversations), 'r', encoding='utf-8') as f:
+        conversations = json.load(f)
+    manifest, report = pack_conversations(conversations, args.budget, args.algorithm,
+                                          args.tokens_per_image, args.tokens_per_turn)
+
+    with open(os.path.abspath(args.output), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    report_file = args.report or os.path.splitext(os.path.abspath(args.output))[0] + ".report.json"
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"打包完成，{report['packed_samples']} 个样本装入 {report['packs']} 个序列"
+          f"（下界 {report['lower_bound_packs']}），打包效率 {report['packing_efficiency']:.2%}，"
+          f"补齐方式效率 {report['padding_efficiency']:.2%}，耗时 {report['elapsed_sec']:.2f}s")
+    if report["oversize_samples"]:
+        print(f"其中 {report['oversize_samples']} 个样本超出预算，未打包")
+    print(f"打包清单保存至: {args.output}")
+    print(f"打包报告保存至: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
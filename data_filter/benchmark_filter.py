@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+标注过滤吞吐基准测试
+
+以仓库中的示例标注为模板生成指定大小的合成标注文件（按比例注入空 summary 和错误
+标记），然后用 filter_annotations.py 的流式引擎过滤，报告吞吐量和剔除统计。
+"""
+
+import os
+import json
+import random
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+from filter_annotations import build_predicates, filter_annotations
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "concatenated_video_annotations_cleaned.json")
+
+
+def write_synthetic_annotations(output_file: str, size_bytes: int, seed: int = 42) -> int:
+    """
+    生成合成标注文件
+
+    Args:
+        output_file: 输出路径，.jsonl 写为 JSONL，否则写为带缩进的 JSON 数组
+        size_bytes: 目标文件大小（字节）
+        seed: 随机种子
+
+    Returns:
+        生成的记录数
+    """
+    rng = random.Random(seed)
+    with open(TEMPLATE_FILE, 'r', encoding='utf-8') as f:
+        templates = json.load(f)
+
+    jsonl = output_file.endswith(".jsonl")
+    count = 0
+    written = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        if not jsonl:
+            written += f.write("[\n")
+        while written < size_bytes:
+            record = json.loads(json.dumps(templates[count % len(templates)]))
+            record["video"] = f"concat_{count:08d}"
+            roll = rng.random()
+            segment = rng.choice(record["data"])
+            if roll < 0.05:
+                segment["summary"] = ""
+            elif roll < 0.08:
+                segment["summary"] = rng.choice(["[TRANSITION_ERROR] ", "[PROCESSING_ERROR]"]) + segment["summary"]
+
+            if jsonl:
+                written += f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                text = json.dumps(record, ensure_ascii=False, indent=2)
+                written += f.write(("" if count == 0 else ",\n") + text)
+            count += 1
+        if not jsonl:
+            f.write("\n]\n")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="标注过滤吞吐基准测试")
+    parser.add_argument("--size_gb", type=float, default=2.0, help="合成文件大小（GB，默认：2）")
+    parser.add_argument("--formats", nargs="+", choices=["json", "jsonl"], default=["json", "jsonl"],
+                        help="测试的输入格式（默认：json jsonl）")
+    parser.add_argument("--num_workers", type=int, nargs="+", default=[1, os.cpu_count()],
+                        help="测试的工作进程数（默认：1 和 CPU 核数）")
+    parser.add_argument("--work_dir", default=None, help="合成文件的存放目录（默认：系统临时目录）")
+
+    args = parser.parse_args()
+
+    predicate_args = SimpleNamespace(error_markers=["[TRANSITION_ERROR]", "[PROCESSING_ERROR]"],
+                                     min_summary_chars=1, max_summary_chars=0,
+                                     language="en", min_language_ratio=0.8, sample_frames_dir=None)
+    predicates = build_predicates(["empty_summary", "error_marker", "summary_length", "language"], predicate_args)
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        print(f"{'格式':>6} {'进程数':>6} {'记录数':>10} {'剔除':>8} {'条/秒':>10} {'MB/秒':>8}")
+        for input_format in args.formats:
+            input_file = os.path.join(work_dir, f"annotations.{input_format}")
+            write_synthetic_annotations(input_file, int(args.size_gb * 1024 ** 3))
+            for num_workers in args.num_workers:
+                stats = filter_annotations(input_file, os.path.join(work_dir, "kept.jsonl"),
+                                           os.path.join(work_dir, "rejected.jsonl"), predicates, num_workers)
+                print(f"{input_format:>6} {num_workers:>6} {stats['total']:>10} {stats['rejected']:>8} "
+                      f"{stats['records_per_sec']:>10.0f} {stats['mb_per_sec']:>8.1f}")
+            os.remove(input_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+帧完整性检查程序
+
+generate_train_conversations 假定拼接计划中每个片段引用的 video_id/frame_{idx:05d}.jpg
+都存在且可读。采样提前结束或写入中断时，训练会在读到缺失或截断的帧时才崩溃。
+
+本程序在生成训练对话前检查拼接计划引用的全部帧：
+- 帧号与 generate_train_conversations 的选帧一致（非 1 秒间隔采样的视频按 --video_metadata
+  中的时间戳选帧，并应用相同的 --max_frames、--frame_stride、--subsample）
+- 每个视频目录只做一次 scandir，判断所需帧是否存在
+- 在进程池中并行读取每帧的 JPEG 头部（SOI 标记）和尾部（EOI 标记），找出截断或损坏的文件
+- 有问题的拼接视频可以剔除（drop），或把片段截短到最后一个连续可用帧的时间戳（repair）
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from filter_annotations import RecordWriter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 与训练对话生成共用选帧逻辑
+sys.path.insert(0, os.path.join(sys.path[0], "conversation_maker"))
+from stream_io import iter_raw_records
+from generate_train_conversations import load_frame_timestamps, segment_frame_indices, select_segment_frames
+
+FrameTimestamps = Dict[str, List[Tuple[int, float]]]
+
+JPEG_SOI = b"\xff\xd8\xff"
+JPEG_EOI = b"\xff\xd9"
+
+
+def check_jpeg(frame_path: str) -> Optional[str]:
+    """
+    只读取文件头尾检查一帧 JPEG
+
+    Args:
+        frame_path: 帧文件路径
+
+    Returns:
+        问题类型（"empty"、"bad_header"、"truncated"、"unreadable"），没有问题时为 None
+    """
+    try:
+        fd = os.open(frame_path, os.O_RDONLY)
+    except OSError:
+        return "unreadable"
+    try:
+        header = os.pread(fd, len(JPEG_SOI), 0)
+        if not header:
+            return "empty"
+        if header != JPEG_SOI:
+            return "bad_header"
+        # 部分编码器会在 EOI 之后补齐几个字节，因此检查末尾的一小段
+        size = os.fstat(fd).st_size
+        if JPEG_EOI not in os.pread(fd, 16, max(size - 16, 0)):
+            return "truncated"
+    except OSError:
+        return "unreadable"
+    finally:
+        os.close(fd)
+    return None
+
+
+def scan_video_frames(task: Tuple[str, str, List[int], bool]) -> Tuple[str, Dict[str, List[int]]]:
+    """
+    工作进程：检查一个视频目录中的指定帧
+
+    Args:
+        task: (视频ID, 视频帧目录, 需要检查的帧号列表, 是否检查 JPEG 头尾)
+
+    Returns:
+        (视频ID, 各问题类型对应的帧号列表)
+    """
+    video_id, frame_dir, frame_indices, check_headers = task
+    try:
+        with os.scandir(frame_dir) as entries:
+            names = {entry.name for entry in entries}
+    except OSError:
+        names = set()
+
+    problems: Dict[str, List[int]] = {}
+    for index in frame_indices:
+        name = f"frame_{index:05d}.jpg"
+        if name not in names:
+            problem = "missing"
+        elif check_headers:
+            problem = check_jpeg(os.path.join(frame_dir, name))
+        else:
+            problem = None
+        if problem:
+            problems.setdefault(problem, []).append(index)
+    return video_id, problems
+
+
+def plan_frames(plan: Dict[str, Any], frame_timestamps: Optional[FrameTimestamps],
+                selection: Dict[str, Any]) -> List[List[int]]:
+    """
+    训练对话会引用的每个片段的帧号，与 generate_train_conversations 的选帧相同
+
+    Args:
+        plan: 拼接计划中的一条记录
+        frame_timestamps: load_frame_timestamps 的结果，None 表示全部按1秒间隔采样
+        selection: select_segment_frames 的 max_frames、frame_stride、strategy 参数
+
+    Returns:
+        每个片段的帧号列表（没有可用帧的片段在训练对话中引用帧 0）
+    """
+    return [frame_indices or [0]
+            for frame_indices in select_segment_frames(plan["boundaries"], frame_timestamps, **selection)]
+
+
+def segment_candidates(boundary: Dict[str, Any], frame_timestamps: Optional[FrameTimestamps]) -> List[int]:
+    """片段时长内的全部帧号（步长和帧预算降采样之前），按时间顺序排列"""
+    return segment_frame_indices(boundary["video_id"], boundary["end_time"] - boundary["start_time"],
+                                 frame_timestamps) or [0]
+
+
+def required_frames(plan_file: str, frame_timestamps: Optional[FrameTimestamps], selection: Dict[str, Any],
+                    include_candidates: bool = False) -> Dict[str, Set[int]]:
+    """
+    第一遍：流式读取拼接计划，统计每个视频需要检查的帧号
+
+    Args:
+        plan_file: 拼接计划文件路径
+        frame_timestamps: load_frame_timestamps 的结果，None 表示全部按1秒间隔采样
+        selection: select_segment_frames 的 max_frames、frame_stride、strategy 参数
+        include_candidates: 是否同时检查片段时长内未被选中的帧（repair 需要据此找到可截短的位置）
+
+    Returns:
+        视频ID到帧号集合的映射
+    """
+    frames: Dict[str, Set[int]] = {}
+    for raw in iter_raw_records(plan_file):
+        plan = json.loads(raw)
+        for boundary, frame_indices in zip(plan["boundaries"], plan_frames(plan, frame_timestamps, selection)):
+            video_frames = frames.setdefault(boundary["video_id"], set())
+            video_frames.update(frame_indices)
+            if include_candidates:
+                video_frames.update(segment_candidates(boundary, frame_timestamps))
+    return frames
+
+
+def broken_segments(plan: Dict[str, Any], bad_frames: Dict[str, Set[int]],
+                    frame_timestamps: Optional[FrameTimestamps], selection: Dict[str, Any]) -> List[int]:
+    """返回引用了问题帧的片段序号"""
+    return [position
+            for position, (boundary, frame_indices)
+            in enumerate(zip(plan["boundaries"], plan_frames(plan, frame_timestamps, selection)))
+            if not bad_frames.get(boundary["video_id"], set()).isdisjoint(frame_indices)]
+
+
+def frame_time(video_id: str, frame_index: int, frame_timestamps: Optional[FrameTimestamps]) -> float:
+    """帧在视频中的时间戳；1秒间隔采样的视频帧号即秒数"""
+    if frame_timestamps and video_id in frame_timestamps:
+        return dict(frame_timestamps[video_id])[frame_index]
+    return float(frame_index)
+
+
+def repair_plan(plan: Dict[str, Any], bad_frames: Dict[str, Set[int]],
+                frame_timestamps: Optional[FrameTimestamps], selection: Dict[str, Any],
+                min_segment_sec: float) -> Optional[Dict[str, Any]]:
+    """
+    将引用了问题帧的片段截短到第一个问题帧之前最后一个可用帧的时间戳，并顺移后续片段的分界点
+
+    截短会改变帧预算在片段间的分配，因此按新的分界点重新选帧，直到不再引用任何问题帧。
+
+    Args:
+        plan: 拼接计划中的一条记录
+        bad_frames: 视频ID到问题帧号集合的映射
+        frame_timestamps: load_frame_timestamps 的结果，None 表示全部按1秒间隔采样
+        selection: select_segment_frames 的 max_frames、frame_stride、strategy 参数
+        min_segment_sec: 截短后片段的最短时长（秒）
+
+    Returns:
+        修复后的记录；有片段无法保留到最短时长时为 None
+    """
+    durations = [boundary["end_time"] - boundary["start_time"] for boundary in plan["boundaries"]]
+    original_durations = list(durations)
+    repaired = plan
+    while True:
+        broken = broken_segments(repaired, bad_frames, frame_timestamps, selection)
+        if not broken:
+            break
+        for position in broken:
+            boundary = repaired["boundaries"][position]
+            video_id = boundary["video_id"]
+            candidates = segment_candidates(boundary, frame_timestamps)
+            first_bad = next(i for i, index in enumerate(candidates) if index in bad_frames[video_id])
+            if first_bad == 0:
+                return None
+            durations[position] = frame_time(video_id, candidates[first_bad - 1], frame_timestamps)
+            if durations[position] <= 0 or durations[position] < min_segment_sec:
+                return None
+
+        boundaries = []
+        current_time = 0.0
+        for boundary, duration in zip(plan["boundaries"], durations):
+            boundaries.append({"video_id": boundary["video_id"], "start_time": current_time,
+                               "end_time": current_time + duration})
+            current_time += duration
+        repaired = dict(plan, total_duration=current_time, boundaries=boundaries)
+
+    repaired["frame_repairs"] = [{"video_id": boundary["video_id"], "original_duration": original,
+                                  "duration": duration}
+                                 for boundary, original, duration
+                                 in zip(plan["boundaries"], original_durations, durations)
+                                 if duration != original]
+    return repaired
+
+
+def check_frames(plan_file: str,
+                 sample_frames_dir: str,
+                 output_file: str,
+                 rejected_file: str,
+                 action: str = "drop",
+                 check_headers: bool = True,
+                 min_segment_sec: float = 1.0,
+                 video_metadata: Optional[str] = None,
+                 max_frames: Optional[int] = None,
+                 frame_stride: int = 1,
+                 subsample: str = "boundary",
+                 annotation_file: Optional[str] = None,
+                 output_annotations: Optional[str] = None,
+                 num_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    检查拼接计划引用的全部帧，并剔除或修复有问题的拼接视频
+
+    Args:
+        plan_file: 拼接计划文件路径
+        sample_frames_dir: 图像帧根目录路径
+        output_file: 保留（含修复）的拼接计划输出路径
+        rejected_file: 剔除的拼接计划输出路径（每条记录附带 filter_reasons）
+        action: drop 剔除有问题的拼接视频，repair 尽量截短修复
+        check_headers: 是否读取 JPEG 头尾检查截断，False 时只检查文件是否存在
+        min_segment_sec: repair 模式下截短后片段的最短时长（秒）
+        video_metadata: 可选的采样元数据 JSON，非 1 秒间隔采样的视频按其中的帧时间戳选帧
+        max_frames: 与 generate_train_conversations 相同的每样本最大帧数
+        frame_stride: 与 generate_train_conversations 相同的帧步长
+        subsample: 与 generate_train_conversations 相同的降采样方式
+        annotation_file: 可选的标注文件，与拼接计划同步剔除和修复
+        output_annotations: 同步处理后的标注输出路径
+        num_workers: 工作进程数（默认：CPU 核数）
+
+    Returns:
+        统计信息
+    """
+    start = time.perf_counter()
+    frame_timestamps = load_frame_timestamps(video_metadata) if video_metadata else None
+    selection = {"max_frames": max_frames, "frame_stride": frame_stride, "strategy": subsample}
+    frames = required_frames(plan_file, frame_timestamps, selection, include_candidates=action == "repair")
+
+    bad_frames: Dict[str, Set[int]] = {}
+    bad_videos: Dict[str, Dict[str, List[int]]] = {}
+    problem_counts = Counter()
+    tasks = ((video_id, os.path.join(sample_frames_dir, video_id), sorted(frame_indices), check_headers)
+             for video_id, frame_indices in frames.items())
+    with Pool(processes=num_workers or cpu_count()) as pool:
+        for video_id, problems in pool.imap_unordered(scan_video_frames, tasks, chunksize=16):
+            if problems:
+                bad_videos[video_id] = problems
+                bad_frames[video_id] = {index for indices in problems.values() for index in indices}
+                problem_counts.update({problem: len(indices) for problem, indices in problems.items()})
+    scan_elapsed = time.perf_counter() - start
+
+    kept_writer = RecordWriter(output_file)
+    rejected_writer = RecordWriter(rejected_file)
+    repaired_boundaries: Dict[str, Dict[str, Dict[str, float]]] = {}
+    kept_concats = set()
+    repaired_count = 0
+    try:
+        for raw in iter_raw_records(plan_file):
+            plan = json.loads(raw)
+            concat_id = plan["concat_video"].replace(".mp4", "")
+            broken = [plan["boundaries"][position]["video_id"]
+                      for position in broken_segments(plan, bad_frames, frame_timestamps, selection)]
+            if not broken:
+                kept_writer.write([json.dumps(plan, ensure_ascii=False)])
+                kept_concats.add(concat_id)
+                continue
+
+            repaired = repair_plan(plan, bad_frames, frame_timestamps, selection,
+                                   min_segment_sec) if action == "repair" else None
+            if repaired is None:
+                plan["filter_reasons"] = sorted({problem for video_id in broken for problem in bad_videos[video_id]})
+                rejected_writer.write([json.dumps(plan, ensure_ascii=False)])
+                continue
+
+            kept_writer.write([json.dumps(repaired, ensure_ascii=False)])
+            kept_concats.add(concat_id)
+            repaired_boundaries[concat_id] = {boundary["video_id"]: boundary for boundary in repaired["boundaries"]}
+            repaired_count += 1
+    finally:
+        kept_writer.close()
+        rejected_writer.close()
+
+    # 标注与拼接计划同步：剔除对应的拼接视频，修复的片段更新 start/end
+    if annotation_file and output_annotations:
+        annotation_writer = RecordWriter(output_annotations)
+        try:
+            for raw in iter_raw_records(annotation_file):
+                record = json.loads(raw)
+                if record["video"] not in kept_concats:
+                    continue
+                boundaries = repaired_boundaries.get(record["video"])
+                if boundaries:
+                    for video_data in record.get("data", []):
+                        boundary = boundaries.get(video_data["video_id"])
+                        if boundary:
+                            video_data["start"] = boundary["start_time"]
+                            video_data["end"] = boundary["end_time"]
+                annotation_writer.write([json.dumps(record, ensure_ascii=False)])
+        finally:
+            annotation_writer.close()
+
+    frames_checked = sum(len(frame_indices) for frame_indices in frames.values())
+    return {
+        "plan_file": plan_file,
+        "action": action,
+        "check_headers": check_headers,
+        "videos_checked": len(frames),
+        "frames_checked": frames_checked,
+        "bad_videos": len(bad_videos),
+        "bad_frames": dict(problem_counts),
+        "total_concats": kept_writer.count + rejected_writer.count,
+        "kept_concats": kept_writer.count,
+        "repaired_concats": repaired_count,
+        "rejected_concats": rejected_writer.count,
+        "scan_elapsed_sec": round(scan_elapsed, 3),
+        "frames_per_sec": round(frames_checked / max(scan_elapsed, 1e-9), 1),
+        "elapsed_sec": round(time.perf_counter() - start, 3),
+        "bad_video_details": {video_id: {"checked_frames": len(frames[video_id]),
+                                         **{problem: indices[:20] for problem, indices in problems.items()}}
+                              for video_id, problems in sorted(bad_videos.items())}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查拼接计划引用的帧是否完整，剔除或修复有问题的拼接视频")
+    parser.add_argument("--concat_plan", required=True, help="拼接计划文件路径")
+    parser.add_argument("--sample_frames_dir", required=True, help="图像帧根目录路径")
+    parser.add_argument("--output", required=True,
+                        help="保留的拼接计划输出路径（.jsonl 写为 JSONL，否则写为 JSON 数组）")
+    parser.add_argument("--rejected", required=True, help="剔除的拼接计划输出路径")
+    parser.add_argument("--action", choices=["drop", "repair"], default="drop",
+                        help="drop 剔除有问题的拼接视频，repair 将片段截短到第一个问题帧之前最后一个可用帧的时间戳"
+                             "（默认：drop）")
+    parser.add_argument("--min_segment_sec", type=float, default=1.0,
+                        help="repair 模式下截短后片段的最短时长，不足时仍剔除（默认：1.0）")
+    parser.add_argument("--skip_header_check", action="store_true",
+                        help="只检查帧文件是否存在，不读取 JPEG 头尾")
+    parser.add_argument("--video_metadata", default=None,
+                        help="采样元数据 JSON，非 1 秒间隔采样的视频按其中的帧时间戳选帧")
+    parser.add_argument("--max_frames", type=int, default=None,
+                        help="与 generate_train_conversations 相同的每样本最大帧数")
+    parser.add_argument("--frame_stride", type=int, default=1,
+                        help="与 generate_train_conversations 相同的帧步长（默认：1）")
+    parser.add_argument("--subsample", choices=["uniform", "boundary"], default="boundary",
+                        help="与 generate_train_conversations 相同的降采样方式（默认：boundary）")
+    parser.add_argument("--annotations", default=None, help="可选：与拼接计划同步处理的标注文件路径")
+    parser.add_argument("--output_annotations", default=None, help="同步处理后的标注输出路径")
+    parser.add_argument("--report", default=None, help="可选：将检查统计和有问题的视频保存为 JSON")
+    parser.add_argument("--num_workers", type=int, default=None,
+                        help="工作进程数，网络存储上可设为 CPU 核数的数倍（默认：CPU 核数）")
+
+    args = parser.parse_args()
+
+    if bool(args.annotations) != bool(args.output_annotations):
+        parser.error("--annotations 与 --output_annotations 需要同时指定")
+
+    stats = check_frames(os.path.abspath(args.concat_plan), os.path.abspath(args.sample_frames_dir),
+                         os.path.abspath(args.output), os.path.abspath(args.rejected),
+                         action=args.action,
+                         check_headers=not args.skip_header_check,
+                         min_segment_sec=args.min_segment_sec,
+                         video_metadata=os.path.abspath(args.video_metadata) if args.video_metadata else None,
+                         max_frames=args.max_frames,
+                         frame_stride=args.frame_stride,
+                         subsample=args.subsample,
+                         annotation_file=os.path.abspath(args.annotations) if args.annotations else None,
+                         output_annotations=os.path.abspath(args.output_annotations) if args.output_annotations else None,
+                         num_workers=args.num_workers)
+
+    if args.report:
+        with open(os.path.abspath(args.report), 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+
+    print(f"共检查 {stats['videos_checked']} 个视频、{stats['frames_checked']} 帧"
+          f"（{stats['frames_per_sec']:.0f} 帧/秒），{stats['bad_videos']} 个视频存在问题帧: {stats['bad_frames']}")
+    print(f"共处理 {stats['total_concats']} 个拼接视频，保留 {stats['kept_concats']} 个"
+          f"（其中修复 {stats['repaired_concats']} 个），剔除 {stats['rejected_concats']} 个")
+    print(f"结果保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
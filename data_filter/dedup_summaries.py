@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+近重复 summary 检测程序（MinHash + LSH）
+
+annotation_concatter 生成的衔接描述容易收敛到少数模板化的措辞。本程序对每个片段的
+summary 做 n-gram 切片并按批向量化计算 MinHash 签名，再用 LSH 分桶找出近重复簇，
+整体耗时与 summary 数量近似线性，无需两两比较。
+
+每个簇最多保留 --max_cluster_size 个成员（按出现顺序），超出部分视为过度重复：
+- flag 模式：保留全部拼接视频，在过度重复的片段上标注 duplicate_cluster 和 duplicate_cluster_size
+- drop 模式：剔除含有过度重复片段的整个拼接视频
+
+同时输出簇统计（簇数量、簇大小分布、最大的若干个簇及示例文本）。
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import argparse
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from filter_annotations import iter_batches, RecordWriter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_io import iter_raw_records
+
+_TOKEN = re.compile(r'[一-鿿]|[a-z0-9]+')
+_SHINGLE_BASE = np.uint64(1000003)
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    """
+    将文本切分为词级 n-gram（中文按字），返回每个 n-gram 的 32 位哈希
+
+    Args:
+        text: summary 文本
+        shingle_size: 每个 n-gram 的词数
+
+    Returns:
+        uint64 数组（取值在 32 位范围内）；没有可用词时为空数组
+    """
+    tokens = _TOKEN.findall(text.lower())
+    if not tokens:
+        return np.zeros(0, dtype=np.uint64)
+    token_hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens),
+                               dtype=np.uint64, count=len(tokens))
+
+    # 词数不足一个 n-gram 时整体作为一个切片
+    width = min(shingle_size, len(token_hashes))
+    count = len(token_hashes) - width + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(width):
+        combined = combined * _SHINGLE_BASE + token_hashes[offset:offset + count]
+    return (combined ^ (combined >> np.uint64(32))) & _MASK32
+
+
+def minhash_batch(texts: List[str], shingle_size: int, coefficients: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    向量化计算一批文本的 MinHash 签名
+
+    使用 multiply-shift 哈希族 h(x) = (a * x + b) >> 32，一次性对整批切片计算全部
+    哈希函数，再按文本分段取最小值。
+
+    Args:
+        texts: 非空文本列表（每条至少有一个词）
+        shingle_size: 每个 n-gram 的词数
+        coefficients: 哈希函数系数 (a, b)，形状均为 (num_perm,)
+
+    Returns:
+        uint32 签名矩阵，形状 (len(texts), num_perm)
+    """
+    shingles = [shingle_hashes(text, shingle_size) for text in texts]
+    starts = np.cumsum([0] + [len(s) for s in shingles[:-1]])
+    values = np.concatenate(shingles)
+    a, b = coefficients
+    hashed = (a[:, None] * values[None, :] + b[:, None]) >> np.uint64(32)
+    return np.minimum.reduceat(hashed, starts, axis=1).T.astype(np.uint32)
+
+
+_shingle_size = 3
+_coefficients = None
+
+
+def init_worker(shingle_size: int, coefficients: Tuple[np.ndarray, np.ndarray]):
+    """工作进程初始化：保存切片长度和哈希函数系数"""
+    global _shingle_size, _coefficients
+    _shingle_size = shingle_size
+    _coefficients = coefficients
+
+
+def signature_batch(task: Tuple[int, List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    工作进程：解析一批记录并计算其中每个片段 summary 的签名
+
+    Args:
+        task: (批内第一条记录的序号, 记录 JSON 文本列表)
+
+    Returns:
+        (记录序号数组, 片段序号数组, 签名矩阵)
+    """
+    first_index, batch = task
+    record_indices, segment_indices, texts = [], [], []
+    for offset, raw in enumerate(batch):
+        for segment_index, video_data in enumerate(json.loads(raw).get("data", [])):
+            summary = video_data.get("summary", "") or ""
+            if _TOKEN.search(summary.lower()):
+                record_indices.append(first_index + offset)
+                segment_indices.append(segment_index)
+                texts.append(summary)
+
+    if not texts:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros((0, len(_coefficients[0])), dtype=np.uint32)
+    return (np.array(record_indices, dtype=np.int64), np.array(segment_indices, dtype=np.int64),
+            minhash_batch(texts, _shingle_size, _coefficients))
+
+
+def lsh_clusters(signatures: np.ndarray, bands: int, threshold: float, chunk_size: int = 1 << 20) -> np.ndarray:
+    """
+    用 LSH 分桶把签名聚成近重复簇
+
+    签名被切成 bands 段，每段哈希为一个桶键；同一桶内的成员与桶内第一个成员比较，
+    估计的 Jaccard 相似度（签名相同位置的比例）不低于 threshold 时合并，因此只需
+    线性数量的比较。
+
+    Args:
+        signatures: 签名矩阵，形状 (num_summaries, num_perm)
+        bands: LSH 分段数（num_perm 需能被整除）
+        threshold: 合并所需的最低估计 Jaccard 相似度
+        chunk_size: 每次比较的成员对数量
+
+    Returns:
+        每个 summary 所在簇的根序号
+    """
+    num_summaries, num_perm = signatures.shape
+    if num_summaries == 0:
+        return np.arange(0)
+    rows = num_perm // bands
+    multipliers = np.uint64(0x9E3779B97F4A7C15) ** np.arange(rows, dtype=np.uint64)
+
+    pairs = []
+    for band in range(bands):
+        keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        is_first = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        first_of_run = order[np.maximum.accumulate(np.where(is_first, np.arange(num_summaries), 0))]
+        members = order[~is_first]
+        heads = first_of_run[~is_first]
+
+        for start in range(0, len(members), chunk_size):
+            member_chunk, head_chunk = members[start:start + chunk_size], heads[start:start + chunk_size]
+            similarity = (signatures[member_chunk] == signatures[head_chunk]).mean(axis=1)
+            keep = similarity >= threshold
+            pairs.append(np.stack([member_chunk[keep], head_chunk[keep]], axis=1))
+
+    parent = np.arange(num_summaries)
+    if not pairs:
+        return parent
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in pairs.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return np.array([find(node) for node in range(num_summaries)])
+
+
+def compute_signatures(input_file: str, shingle_size: int, num_perm: int, num_workers: int,
+                       batch_size: int, seed: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    第一遍：流式读取标注并在进程池中计算全部 summary 的签名
+
+    Returns:
+        (记录序号数组, 片段序号数组, 签名矩阵)
+    """
+    rng = np.random.default_rng(seed)
+    coefficients = (rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1),
+                    rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64))
+
+    def tasks():
+        first_index = 0
+        for batch in iter_batches(iter_raw_records(input_file), batch_size):
+            yield first_index, batch
+            first_index += len(batch)
+
+    record_parts = [np.zeros(0, dtype=np.int64)]
+    segment_parts = [np.zeros(0, dtype=np.int64)]
+    signature_parts = [np.zeros((0, num_perm), dtype=np.uint32)]
+    with Pool(processes=num_workers, initializer=init_worker, initargs=(shingle_size, coefficients)) as pool:
+        for record_indices, segment_indices, signatures in pool.imap(signature_batch, tasks()):
+            record_parts.append(record_indices)
+            segment_parts.append(segment_indices)
+            signature_parts.append(signatures)
+    return np.concatenate(record_parts), np.concatenate(segment_parts), np.concatenate(signature_parts)
+
+
+def dedup_summaries(input_file: str, output_file: str, rejected_file: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    检测近重复 summary 并按 action 标注或剔除过度重复的拼接视频
+
+    Returns:
+        簇统计
+    """
+    start = time.perf_counter()
+    record_indices, segment_indices, signatures = compute_signatures(
+        input_file, args.shingle_size, args.num_perm, args.num_workers or cpu_count(), args.batch_size, args.seed)
+    print(f"已计算 {len(signatures)} 个 summary 的签名，耗时 {time.perf_counter() - start:.1f}s")
+
+    roots = lsh_clusters(signatures, args.bands, args.threshold)
+    root_ids, inverse, sizes = np.unique(roots, return_inverse=True, return_counts=True)
+    cluster_sizes = sizes[inverse]
+
+    # 各簇成员按出现顺序编号，超过上限的成员视为过度重复
+    order = np.lexsort((segment_indices, record_indices, inverse))
+    rank = np.empty(len(order), dtype=np.int64)
+    run_start = np.flatnonzero(np.diff(inverse[order], prepend=-1))
+    rank[order] = np.arange(len(order)) - np.repeat(run_start, np.diff(np.r_[run_start, len(order)]))
+    excess = (cluster_sizes > 1) & (rank >= args.max_cluster_size)
+
+    flagged: Dict[int, List[Tuple[int, int, int]]] = {}
+    for position in np.flatnonzero(excess).tolist():
+        flagged.setdefault(int(record_indices[position]), []).append(
+            (int(segment_indices[position]), int(inverse[position]), int(cluster_sizes[position])))
+
+    # 最大的若干个簇及其第一个成员，用于输出示例文本
+    multi = np.flatnonzero(sizes > 1)
+    top_clusters = multi[np.argsort(-sizes[multi], kind="stable")][:args.top_clusters]
+    first_member = {int(inverse[position]): (int(record_indices[position]), int(segment_indices[position]))
+                    for position in order[run_start] if sizes[inverse[position]] > 1}
+    wanted_examples: Dict[int, List[Tuple[int, int]]] = {}
+    for cluster in top_clusters.tolist():
+        record_index, segment_index = first_member[cluster]
+        wanted_examples.setdefault(record_index, []).append((segment_index, cluster))
+    examples: Dict[int, Dict[str, Any]] = {}
+
+    # 第二遍：写出保留和剔除的拼接视频
+    kept_writer = RecordWriter(output_file)
+    rejected_writer = RecordWriter(rejected_file)
+    try:
+        record_index = 0
+        for raw in iter_raw_records(input_file):
+            text = raw.strip()
+            if record_index not in flagged and record_index not in wanted_examples:
+                if kept_writer.jsonl and "\n" in text:
+                    text = json.dumps(json.loads(text), ensure_ascii=False)
+                kept_writer.write([text])
+                record_index += 1
+                continue
+
+            record = json.loads(text)
+            for segment_index, cluster in wanted_examples.pop(record_index, []):
+                video_data = record["data"][segment_index]
+                examples[cluster] = {"video": record.get("video"), "video_id": video_data.get("video_id"),
+                                     "summary": video_data.get("summary", "")}
+
+            duplicates = flagged.get(record_index, [])
+            for segment_index, cluster, size in duplicates:
+                record["data"][segment_index]["duplicate_cluster"] = cluster
+                record["data"][segment_index]["duplicate_cluster_size"] = size
+            if duplicates and args.action == "drop":
+                record["filter_reasons"] = ["duplicate_summary"]
+                rejected_writer.write([json.dumps(record, ensure_ascii=False)])
+            else:
+                kept_writer.write([json.dumps(record, ensure_ascii=False)])
+            record_index += 1
+    finally:
+        kept_writer.close()
+        rejected_writer.close()
+
+    size_histogram = Counter()
+    for size in sizes[multi].tolist():
+        bucket = "2" if size == 2 else "3-10" if size <= 10 else "11-100" if size <= 100 else "101-1000" \
+            if size <= 1000 else ">1000"
+        size_histogram[bucket] += 1
+
+    return {
+        "input_file": input_file,
+        "action": args.action,
+        "total_concats": kept_writer.count + rejected_writer.count,
+        "kept_concats": kept_writer.count,
+        "rejected_concats": rejected_writer.count,
+        "total_summaries": int(len(signatures)),
+        "duplicate_clusters": int(len(multi)),
+        "summaries_in_clusters": int(sizes[multi].sum()),
+        "over_represented_summaries": int(excess.sum()),
+        "affected_concats": len(flagged),
+        "cluster_size_histogram": {bucket: size_histogram.get(bucket, 0)
+                                   for bucket in ["2", "3-10", "11-100", "101-1000", ">1000"]},
+        "top_clusters": [dict({"cluster_id": int(cluster), "size": int(sizes[cluster])}, **examples.get(cluster, {}))
+                         for cluster in top_clusters.tolist()],
+        "elapsed_sec": round(time.perf_counter() - start, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用 MinHash LSH 检测近重复 summary")
+    parser.add_argument("--input", required=True, help="输入的视频标注文件路径（JSONL 或 JSON 数组）")
+    parser.add_argument("--output", required=True,
+                        help="保留记录的输出路径（.jsonl 写为 JSONL，否则写为 JSON 数组）")
+    parser.add_argument("--rejected", required=True, help="drop 模式下剔除记录的输出路径")
+    parser.add_argument("--clusters", required=True, help="簇统计的 JSON 输出路径")
+    parser.add_argument("--action", choices=["flag", "drop"], default="flag",
+                        help="flag 标注过度重复的片段，drop 剔除含有过度重复片段的拼接视频（默认：flag）")
+    parser.add_argument("--max_cluster_size", type=int, default=20,
+                        help="每个近重复簇最多保留的 summary 数（默认：20）")
+    parser.add_argument("--threshold", type=float, default=0.8,
+                        help="判定为近重复的最低估计 Jaccard 相似度（默认：0.8）")
+    parser.add_argument("--shingle_size", type=int, default=3, help="n-gram 的词数（默认：3）")
+    parser.add_argument("--num_perm", type=int, default=64, help="MinHash 哈希函数个数（默认：64）")
+    parser.add_argument("--bands", type=int, default=16, help="LSH 分段数（默认：16）")
+    parser.add_argument("--top_clusters", type=int, default=20, help="统计中列出的最大簇个数（默认：20）")
+    parser.add_argument("--num_workers", type=int, default=None, help="工作进程数（默认：CPU 核数）")
+    parser.add_argument("--batch_size", type=int, default=256, help="每批处理的记录数（默认：256）")
+    parser.add_argument("--seed", type=int, default=42, help="哈希函数的随机种子（默认：42）")
+
+    args = parser.parse_args()
+
+    if args.num_perm % args.bands:
+        parser.error("--num_perm 必须能被 --bands 整除")
+
+    stats = dedup_summaries(os.path.abspath(args.input), os.path.abspath(args.output),
+                            os.path.abspath(args.rejected), args)
+
+    with open(os.path.abspath(args.clusters), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+    print(f"共 {stats['total_summaries']} 个 summary，{stats['duplicate_clusters']} 个近重复簇，"
+          f"{stats['over_represented_summaries']} 个 summary 超出每簇上限")
+    print(f"共处理 {stats['total_concats']} 个拼接视频，保留 {stats['kept_concats']} 个，"
+          f"剔除 {stats['rejected_concats']} 个")
+    print(f"簇统计已保存至: {args.clusters}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+流式并行标注过滤程序
+
+逐条读取拼接视频标注（JSONL 或大型 JSON 数组，不会一次性载入内存），在进程池中
+对每条记录应用一组可组合的过滤条件，将保留和剔除的记录分别写入两个输出文件，
+并汇总每个过滤条件的剔除数量，不再逐条打印。
+
+可用的过滤条件:
+- empty_summary: 任一片段的 summary 为空
+- error_marker: summary 中含有 [TRANSITION_ERROR]、[PROCESSING_ERROR] 等错误标记
+- summary_length: 任一片段的 summary 长度超出 [min_summary_chars, max_summary_chars]
+- language: summary 的主要语言不是指定语言
+- missing_frames: 训练对话会引用的帧在 sample_frames/<video_id>/ 下缺失（帧号与
+  generate_train_conversations 的选帧一致，考虑非 1 秒间隔采样的时间戳、帧预算和帧步长）
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import functools
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+
+from clean_empty_summaries import has_empty_summary
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 与训练对话生成共用选帧逻辑
+sys.path.insert(0, os.path.join(sys.path[0], "conversation_maker"))
+from stream_io import JsonlFollower, iter_raw_records, mark_done, mark_failed, reset_stream
+from generate_train_conversations import load_frame_timestamps, video_frame_timestamps, select_segment_frames
+from stage_profile import StageProfiler, add_profile_arguments
+
+DEFAULT_ERROR_MARKERS = ["[TRANSITION_ERROR]", "[PROCESSING_ERROR]"]
+
+_CJK = re.compile(r'[一-鿿]')
+# 删除拉丁字母以外的全部字节，剩余长度即拉丁字母数
+_NON_LATIN_BYTES = bytes(c for c in range(256) if not (65 <= c <= 90 or 97 <= c <= 122))
+
+
+def summaries(record: Dict[str, Any]) -> List[str]:
+    """一条拼接视频标注中各片段的 summary"""
+    return [video_data.get("summary", "") or "" for video_data in record.get("data", [])]
+
+
+def keep_non_empty_summary(record: Dict[str, Any]) -> bool:
+    return not has_empty_summary(record)
+
+
+def keep_without_error_marker(record: Dict[str, Any], markers: List[str]) -> bool:
+    return not any(marker in summary for summary in summaries(record) for marker in markers)
+
+
+def keep_summary_length(record: Dict[str, Any], min_chars: int, max_chars: int) -> bool:
+    for summary in summaries(record):
+        length = len(summary.strip())
+        if length < min_chars or (max_chars > 0 and length > max_chars):
+            return False
+    return True
+
+
+def keep_language(record: Dict[str, Any], language: str, min_ratio: float) -> bool:
+    """按中文字符或拉丁字母在全部文字字符中的占比判断 summary 的语言"""
+    for summary in summaries(record):
+        cjk = 0 if summary.isascii() else len(_CJK.findall(summary))
+        latin = len(summary.encode("utf-8").translate(None, _NON_LATIN_BYTES))
+        if cjk + latin == 0:
+            continue
+        ratio = (cjk if language == "zh" else latin) / (cjk + latin)
+        if ratio < min_ratio:
+            return False
+    return True
+
+
+@functools.lru_cache(maxsize=65536)
+def list_frames(frame_dir: str) -> frozenset:
+    """视频帧目录中的文件名集合（每个工作进程内缓存）"""
+    try:
+        return frozenset(os.listdir(frame_dir))
+    except OSError:
+        return frozenset()
+
+
+class FrameTimestamps:
+    """
+    missing_frames 条件使用的帧时间戳
+
+    批量模式从采样元数据 JSON 一次性加载；采样元数据为采样器 --metadata_stream 输出的
+    JSONL 时（跟随模式），每个工作进程在遇到尚未读到的视频时才继续读取流中新追加的条目。
+    标注到达时其视频的元数据已经写入流中，因此不需要等待。
+    """
+
+    def __init__(self, video_metadata: Optional[str] = None):
+        """
+        Args:
+            video_metadata: 采样元数据 JSON 或 JSONL 路径，None 表示全部按1秒间隔采样
+        """
+        self.stream = video_metadata if video_metadata and video_metadata.endswith(".jsonl") else None
+        self.timestamps: Dict[str, List[Tuple[int, float]]] = {}
+        self.seen = set()
+        self._follower: Optional[JsonlFollower] = None
+        if video_metadata and not self.stream:
+            self.timestamps = load_frame_timestamps(video_metadata)
+
+    def lookup(self, video_ids: List[str]) -> Dict[str, List[Tuple[int, float]]]:
+        """返回时间戳映射，跟随模式下先读入 video_ids 中尚未读到的视频"""
+        if self.stream and not self.seen.issuperset(video_ids):
+            if self._follower is None:
+                self._follower = JsonlFollower(self.stream)
+            for line in self._follower.poll():
+                video = json.loads(line)
+                self.seen.add(video["video_name"])
+                timestamps = video_frame_timestamps(video)
+                if timestamps is not None:
+                    self.timestamps[video["video_name"]] = timestamps
+        return self.timestamps
+
+
+def keep_complete_frames(record: Dict[str, Any], sample_frames_dir: str,
+                         frame_timestamps: Optional[FrameTimestamps] = None,
+                         max_frames: Optional[int] = None,
+                         frame_stride: int = 1,
+                         subsample: str = "boundary") -> bool:
+    """检查训练对话会引用的帧是否都存在（选帧与 generate_train_conversations 相同）"""
+    boundaries = [{"video_id": video_data["video_id"], "start_time": video_data["start"],
+                   "end_time": video_data["end"]} for video_data in record.get("data", [])]
+    timestamps = frame_timestamps.lookup([boundary["video_id"] for boundary in boundaries]) \
+        if frame_timestamps else None
+    segment_frames = select_segment_frames(boundaries, timestamps, max_frames, frame_stride, subsample)
+    for boundary, frame_indices in zip(boundaries, segment_frames):
+        frames = list_frames(os.path.join(sample_frames_dir, boundary["video_id"]))
+        # 没有可用帧的片段在训练对话中引用帧 0
+        if any(f"frame_{index:05d}.jpg" not in frames for index in frame_indices or [0]):
+            return False
+    return True
+
+
+def build_predicates(names: List[str], args: argparse.Namespace) -> List[Tuple[str, Callable]]:
+    """
+    按名称构造过滤条件
+
+    Args:
+        names: 过滤条件名称列表
+        args: 命令行参数（提供各过滤条件的参数）
+
+    Returns:
+        (名称, 判定函数) 列表，判定函数返回 True 表示保留
+    """
+    factories = {
+        "empty_summary": lambda: keep_non_empty_summary,
+        "error_marker": lambda: functools.partial(keep_without_error_marker, markers=args.error_markers),
+        "summary_length": lambda: functools.partial(keep_summary_length, min_chars=args.min_summary_chars,
+                                                    max_chars=args.max_summary_chars),
+        "language": lambda: functools.partial(keep_language, language=args.language,
+                                              min_ratio=args.min_language_ratio),
+        "missing_frames": lambda: functools.partial(keep_complete_frames,
+                                                    sample_frames_dir=args.sample_frames_dir,
+                                                    frame_timestamps=FrameTimestamps(args.video_metadata),
+                                                    max_frames=args.max_frames,
+                                                    frame_stride=args.frame_stride,
+                                                    subsample=args.subsample),
+    }
+    return [(name, factories[name]()) for name in names]
+
+
+_predicates: List[Tuple[str, Callable]] = []
+_kept_jsonl = False
+
+
+def init_worker(predicates: List[Tuple[str, Callable]], kept_jsonl: bool = False):
+    """
+    工作进程初始化：保存过滤条件，避免随每批数据重复传输
+
+    Args:
+        predicates: build_predicates 构造的过滤条件
+        kept_jsonl: 保留记录是否写为 JSONL（需要单行文本）
+    """
+    global _predicates, _kept_jsonl
+    _predicates = predicates
+    _kept_jsonl = kept_jsonl
+
+
+def filter_batch(batch: List[str]) -> Tuple[List[str], List[str], Counter]:
+    """
+    工作进程：解析一批记录并应用过滤条件
+
+    Args:
+        batch: 记录的 JSON 文本列表
+
+    Returns:
+        (保留记录的 JSON 行, 剔除记录的 JSON 行, 各过滤条件的剔除计数)
+    """
+    kept, rejected = [], []
+    counts = Counter()
+    for raw in batch:
+        record = json.loads(raw)
+        # 对每条记录应用全部条件，使各条件的剔除计数与顺序无关
+        reasons = [name for name, predicate in _predicates if not predicate(record)]
+        if reasons:
+            counts.update(reasons)
+            record["filter_reasons"] = reasons
+            rejected.append(json.dumps(record, ensure_ascii=False))
+        else:
+            # 保留的记录尽量直接沿用原始文本，只有 JSONL 输出遇到多行文本时才重新序列化
+            text = raw.strip()
+            if _kept_jsonl and "\n" in text:
+                text = json.dumps(record, ensure_ascii=False)
+            kept.append(text)
+    return kept, rejected, counts
+
+
+def iter_batches(records: Iterator[str], batch_size: int) -> Iterator[List[str]]:
+    """将记录流按固定数量分批"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class RecordWriter:
+    """
+    逐条写出记录：.jsonl 路径写为每行一条记录，其他路径写为 JSON 数组（每行一个元素）
+    """
+
+    def __init__(self, output_file: str):
+        self.jsonl = output_file.endswith(".jsonl")
+        self.count = 0
+        self._file = open(output_file, 'w', encoding='utf-8')
+        if not self.jsonl:
+            self._file.write("[")
+
+    def write(self, lines: List[str]):
+        for line in lines:
+            if self.jsonl:
+                self._file.write(line + "\n")
+            else:
+                self._file.write(("\n" if self.count == 0 else ",\n") + line)
+            self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self.jsonl:
+            self._file.write("\n]\n" if self.count else "]\n")
+        self._file.close()
+
+
+def filter_annotations(input_file: str,
+                       output_file: str,
+                       rejected_file: str,
+                       predicates: List[Tuple[str, Callable]],
+                       num_workers: Optional[int] = None,
+                       batch_size: int = 256,
+                       follow: bool = False) -> Dict[str, Any]:
+    """
+    流式过滤标注文件
+
+    Args:
+        input_file: 输入文件路径（JSONL 或 JSON 数组）
+        output_file: 保留记录的输出路径
+        rejected_file: 剔除记录的输出路径（每条记录附带 filter_reasons）
+        predicates: build_predicates 构造的过滤条件
+        num_workers: 工作进程数（默认：CPU 核数）
+        batch_size: 每批发送给工作进程的记录数
+        follow: 跟随读取上游仍在追加的 JSONL 文件，每批结果立即刷新到输出，
+            上游写完后为两个输出文件创建完成标记
+
+    Returns:
+        汇总统计
+    """
+    start = time.perf_counter()
+    rejected_by = Counter()
+    if follow:
+        # 清除上一次运行留下的完成标记，避免下游把新文件当作已写完
+        reset_stream(output_file)
+        reset_stream(rejected_file)
+    kept_writer = RecordWriter(output_file)
+    rejected_writer = RecordWriter(rejected_file)
+
+    try:
+        with Pool(processes=num_workers or cpu_count(), initializer=init_worker,
+                  initargs=(predicates, kept_writer.jsonl)) as pool:
+            if follow:
+                batches = JsonlFollower(input_file).batches(max_batch=batch_size)
+            else:
+                batches = iter_batches(iter_raw_records(input_file), batch_size)
+            for kept, rejected, counts in pool.imap(filter_batch, batches):
+                kept_writer.write(kept)
+                rejected_writer.write(rejected)
+                rejected_by.update(counts)
+                if follow:
+                    kept_writer.flush()
+                    rejected_writer.flush()
+    except BaseException as e:
+        if follow:
+            # 让跟随读取输出的下游结束等待
+            mark_failed(output_file, f"{type(e).__name__}: {e}")
+            mark_failed(rejected_file, f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        kept_writer.close()
+        rejected_writer.close()
+    if follow:
+        mark_done(output_file)
+        mark_done(rejected_file)
+
+    elapsed = time.perf_counter() - start
+    total = kept_writer.count + rejected_writer.count
+    input_bytes = os.path.getsize(input_file)
+    return {
+        "input_file": input_file,
+        "predicates": [name for name, _ in predicates],
+        "total": total,
+        "kept": kept_writer.count,
+        "rejected": rejected_writer.count,
+        "rejected_by": {name: rejected_by.get(name, 0) for name, _ in predicates},
+        "elapsed_sec": round(elapsed, 3),
+        "records_per_sec": round(total / max(elapsed, 1e-9), 1),
+        "mb_per_sec": round(input_bytes / 1024 / 1024 / max(elapsed, 1e-9), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式并行过滤拼接视频标注")
+    parser.add_argument("--input", required=True, help="输入的视频标注文件路径（JSONL 或 JSON 数组）")
+    parser.add_argument("--output", required=True,
+                        help="保留记录的输出路径（.jsonl 写为 JSONL，否则写为 JSON 数组）")
+    parser.add_argument("--rejected", required=True, help="剔除记录的输出路径，每条记录附带 filter_reasons")
+    parser.add_argument("--stats", default=None, help="可选：汇总统计的 JSON 输出路径")
+    parser.add_argument("--predicates", nargs="+", default=["empty_summary", "error_marker"],
+                        choices=["empty_summary", "error_marker", "summary_length", "language", "missing_frames"],
+                        help="依次应用的过滤条件（默认：empty_summary error_marker）")
+    parser.add_argument("--error_markers", nargs="+", default=DEFAULT_ERROR_MARKERS,
+                        help="error_marker 条件识别的错误标记")
+    parser.add_argument("--min_summary_chars", type=int, default=1,
+                        help="summary_length 条件：summary 最少字符数（默认：1）")
+    parser.add_argument("--max_summary_chars", type=int, default=0,
+                        help="summary_length 条件：summary 最多字符数，0 表示不限（默认：0）")
+    parser.add_argument("--language", choices=["en", "zh"], default="en",
+                        help="language 条件：summary 应使用的语言（默认：en）")
+    parser.add_argument("--min_language_ratio", type=float, default=0.8,
+                        help="language 条件：该语言字符在文字字符中的最低占比（默认：0.8）")
+    parser.add_argument("--sample_frames_dir", default=None,
+                        help="missing_frames 条件：图像帧根目录路径")
+    parser.add_argument("--video_metadata", default=None,
+                        help="missing_frames 条件：采样元数据（JSON，或 --follow 时采样器 --metadata_stream 输出的 "
+                             "JSONL），非 1 秒间隔采样的视频按其中的帧时间戳选帧")
+    parser.add_argument("--max_frames", type=int, default=None,
+                        help="missing_frames 条件：与 generate_train_conversations 相同的每样本最大帧数")
+    parser.add_argument("--frame_stride", type=int, default=1,
+                        help="missing_frames 条件：与 generate_train_conversations 相同的帧步长（默认：1）")
+    parser.add_argument("--subsample", choices=["uniform", "boundary"], default="boundary",
+                        help="missing_frames 条件：与 generate_train_conversations 相同的降采样方式（默认：boundary）")
+    parser.add_argument("--num_workers", type=int, default=None, help="工作进程数（默认：CPU 核数）")
+    parser.add_argument("--batch_size", type=int, default=256, help="每批处理的记录数（默认：256）")
+    parser.add_argument("--follow", action="store_true",
+                        help="流式模式：跟随读取上游仍在追加的 JSONL 输入，过滤结果立即追加到输出（输出须为 .jsonl）")
+    add_profile_arguments(parser)
+
+    args = parser.parse_args()
+
+    if "missing_frames" in args.predicates and not args.sample_frames_dir:
+        parser.error("missing_frames 条件需要指定 --sample_frames_dir")
+    if args.sample_frames_dir:
+        args.sample_frames_dir = os.path.abspath(args.sample_frames_dir)
+    if args.video_metadata:
+        args.video_metadata = os.path.abspath(args.video_metadata)
+    if args.follow and not (args.output.endswith(".jsonl") and args.rejected.endswith(".jsonl")):
+        parser.error("--follow 模式下 --output 和 --rejected 必须为 .jsonl 文件")
+
+    predicates = build_predicates(args.predicates, args)
+    print(f"过滤条件: {', '.join(args.predicates)}")
+    with StageProfiler.from_args("filter", args) as profiler:
+        stats = filter_annotations(os.path.abspath(args.input), os.path.abspath(args.output),
+                                   os.path.abspath(args.rejected), predicates, args.num_workers, args.batch_size,
+                                   follow=args.follow)
+        profiler.add_items(stats["total"], "concats")
+        profiler.set_extra("kept", stats["kept"])
+        profiler.set_extra("rejected_by", stats["rejected_by"])
+
+    print(f"共处理 {stats['total']} 个拼接视频，保留 {stats['kept']} 个，剔除 {stats['rejected']} 个")
+    for name, count in stats["rejected_by"].items():
+        print(f"  - {name}: {count}")
+    print(f"耗时 {stats['elapsed_sec']}s（{stats['records_per_sec']} 条/秒，{stats['mb_per_sec']} MB/秒）")
+
+    if args.stats:
+        with open(os.path.abspath(args.stats), 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        print(f"统计结果已保存至: {args.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,7 @@ echo "开始执行视频标注生成流程..."
 WORKSPACE_ROOT="{os.path.abspath(args.workspace_root)}"
 INPUT_VIDEOS_DIR="{os.path.abspath(args.input_videos_dir)}"
 SAMPLE_FRAMES_DIR="{os.path.abspath(args.sample_frames_dir)}"
+VIDEO_DESCRIPTIONS="{os.path.abspath(args.video_descriptions)}"
 ANNOTATION_MAKER_DIR="{os.path.abspath(os.path.join(args.workspace_root, 'annotation_maker'))}"
 
 # 视频采样参数
@@ -71,19 +72,29 @@ python3 $ANNOTATION_MAKER_DIR/concat_planer/concat_planer.py \\
 echo "步骤3: 构造拼接视频标注"
 ANNOTATION_CONCATTER_DIR="{os.path.abspath(os.path.join(args.workspace_root, 'annotation_maker', 'annotation_concatter'))}"
 mkdir -p "$ANNOTATION_CONCATTER_DIR"
-python3 $ANNOTATION_MAKER_DIR/annotation_concatter/generate_concat_annotations.py
+python3 $ANNOTATION_MAKER_DIR/annotation_concatter/generate_concat_annotations.py \\
+  --concat_plan "$CONCAT_PLAN_DIR/concat_metadata.json" \\
+  --video_descriptions "$VIDEO_DESCRIPTIONS" \\
+  --output "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations.json"
 
 # ========== 步骤4: 清理空summary数据 ==========
 echo "步骤4: 清理空summary数据"
 DATA_FILTER_DIR="{os.path.abspath(os.path.join(args.workspace_root, 'annotation_maker', 'data_filter'))}"
 mkdir -p "$DATA_FILTER_DIR"
-python3 $ANNOTATION_MAKER_DIR/data_filter/clean_empty_summaries.py
+python3 $ANNOTATION_MAKER_DIR/data_filter/clean_empty_summaries.py \\
+  --input "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations.json" \\
+  --output "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations_cleaned.json"
 
 # ========== 步骤5: 生成对话格式训练数据 ==========
 echo "步骤5: 生成对话格式训练数据"
 CONVERSATION_MAKER_DIR="{os.path.abspath(os.path.join(args.workspace_root, 'annotation_maker', 'conversation_maker'))}"
 mkdir -p "$CONVERSATION_MAKER_DIR"
-python3 $ANNOTATION_MAKER_DIR/conversation_maker/generate_train_conversations.py
+python3 $ANNOTATION_MAKER_DIR/conversation_maker/generate_train_conversations.py \\
+  --concat_plan "$CONCAT_PLAN_DIR/concat_metadata.json" \\
+  --annotations "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations_cleaned.json" \\
+  --sample_frames_dir "$SAMPLE_FRAMES_DIR" \\
+  --video_metadata "$SAMPLE_FRAMES_DIR/video_metadata.json" \\
+  --output "$CONVERSATION_MAKER_DIR/train_conversations.json"
 
 # ========== 步骤6: 数据统计分析 ==========
 echo "步骤6: 数据统计分析"
@@ -123,6 +134,8 @@ def main():
                         help="输入视频目录路径")
     parser.add_argument("--sample_frames_dir", default="/data1/whq/sample_frames",
                         help="采样帧输出目录路径")
+    parser.add_argument("--video_descriptions", default="/data1/whq/sharegpt4o/video_conversations/gpt4o.jsonl",
+                        help="原始视频描述文件路径")
     parser.add_argument("--output_script", default="run_annotation_pipeline.sh",
                         help="生成的脚本文件名")
     
@@ -93,6 +93,12 @@ def collect_parameters():
         required=True
     ))
     
+    params['video_descriptions'] = os.path.abspath(ask_question(
+        "原始视频描述文件路径", 
+        default="/data1/whq/sharegpt4o/video_conversations/gpt4o.jsonl",
+        required=True
+    ))
+    
     params['output_script'] = os.path.abspath(ask_question(
         "生成的脚本文件名", 
         default="run_annotation_pipeline.sh",
@@ -185,6 +191,7 @@ echo "开始执行视频标注生成流程..."
 WORKSPACE_ROOT="{params['workspace_root']}"
 INPUT_VIDEOS_DIR="{params['input_videos_dir']}"
 SAMPLE_FRAMES_DIR="{params['sample_frames_dir']}"
+VIDEO_DESCRIPTIONS="{params['video_descriptions']}"
 ANNOTATION_MAKER_DIR="$WORKSPACE_ROOT/annotation_maker"
 
 # 视频采样参数
@@ -231,19 +238,29 @@ python3 $ANNOTATION_MAKER_DIR/concat_planer/concat_planer.py \\
 echo "步骤3: 构造拼接视频标注"
 ANNOTATION_CONCATTER_DIR="$ANNOTATION_MAKER_DIR/annotation_concatter"
 mkdir -p "$ANNOTATION_CONCATTER_DIR"
-python3 $ANNOTATION_MAKER_DIR/annotation_concatter/generate_concat_annotations.py
+python3 $ANNOTATION_MAKER_DIR/annotation_concatter/generate_concat_annotations.py \\
+  --concat_plan "$CONCAT_PLAN_DIR/concat_metadata.json" \\
+  --video_descriptions "$VIDEO_DESCRIPTIONS" \\
+  --output "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations.json"
 
 # ========== 步骤4: 清理空summary数据 ==========
 echo "步骤4: 清理空summary数据"
 DATA_FILTER_DIR="$ANNOTATION_MAKER_DIR/data_filter"
 mkdir -p "$DATA_FILTER_DIR"
-python3 $ANNOTATION_MAKER_DIR/data_filter/clean_empty_summaries.py
+python3 $ANNOTATION_MAKER_DIR/data_filter/clean_empty_summaries.py \\
+  --input "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations.json" \\
+  --output "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations_cleaned.json"
 
 # ========== 步骤5: 生成对话格式训练数据 ==========
 echo "步骤5: 生成对话格式训练数据"
 CONVERSATION_MAKER_DIR="$ANNOTATION_MAKER_DIR/conversation_maker"
 mkdir -p "$CONVERSATION_MAKER_DIR"
-python3 $ANNOTATION_MAKER_DIR/conversation_maker/generate_train_conversations.py
+python3 $ANNOTATION_MAKER_DIR/conversation_maker/generate_train_conversations.py \\
+  --concat_plan "$CONCAT_PLAN_DIR/concat_metadata.json" \\
+  --annotations "$ANNOTATION_CONCATTER_DIR/concatenated_video_annotations_cleaned.json" \\
+  --sample_frames_dir "$SAMPLE_FRAMES_DIR" \\
+  --video_metadata "$SAMPLE_FRAMES_DIR/video_metadata.json" \\
+  --output "$CONVERSATION_MAKER_DIR/train_conversations.json"
 
 # ========== 步骤6: 数据统计分析 ==========
 echo "步骤6: 数据统计分析"
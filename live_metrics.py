@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+长时间运行步骤的实时指标，只依赖标准库
+
+LiveMetrics 在步骤运行期间维护一组计数器和仪表，并以 Prometheus 文本格式对外提供：
+--metrics_port 在后台线程启动 HTTP 端点（GET /metrics），--metrics_file 每隔
+--metrics_interval 秒原子地重写一个指标文件（可直接 cat / watch 查看，也可交给
+node_exporter 的 textfile collector 采集）。两者都不需要任何外部服务，可以同时开启。
+
+每个步骤都带有以下内置指标，步骤再按需定义自己的指标（队列深度、进行中的请求数等）：
+
+    annotation_maker_items_total            需要处理的总条数（未知时不输出）
+    annotation_maker_items_completed_total  已完成的条数
+    annotation_maker_items_per_second       最近 rate_window 秒内的吞吐量
+    annotation_maker_eta_seconds            按当前吞吐量估计的剩余时间
+    annotation_maker_uptime_seconds         步骤已运行的时间
+
+所有指标都带 stage 标签。步骤脚本的用法：
+
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    with LiveMetrics.from_args("annotate", args) as metrics:
+        metrics.set_total(len(plan))
+        metrics.gauge("llm_in_flight", "LLM requests currently in flight")
+        ...
+        metrics.complete()
+"""
+
+import os
+import math
+import time
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Callable, Optional
+
+METRIC_PREFIX = "annotation_maker"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 当前进程中正在运行的指标集合，供 increment 等模块级函数使用
+_active: Optional["LiveMetrics"] = None
+
+
+def format_value(value: float) -> str:
+    """按 Prometheus 文本格式输出数值"""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(round(value, 6))
+    return str(value)
+
+
+class LiveMetrics:
+    """
+    单个步骤的实时指标，作为上下文管理器包住步骤的主体
+
+    计数器和仪表可以在任意线程中更新；导出在后台线程中进行，不阻塞步骤本身。
+    """
+
+    def __init__(self,
+                 stage: str,
+                 port: Optional[int] = None,
+                 textfile: Optional[str] = None,
+                 interval: float = 10.0,
+                 rate_window: float = 60.0):
+        """
+        Args:
+            stage: 步骤名称，作为所有指标的 stage 标签
+            port: HTTP 端点的端口，0 表示由系统分配，None 表示不启动
+            textfile: 定期重写的指标文件路径，None 表示不写
+            interval: 重写指标文件的间隔（秒）
+            rate_window: 计算吞吐量和剩余时间使用的时间窗口（秒）
+        """
+        self.stage = stage
+        self.port = port
+        self.textfile = textfile
+        self.interval = interval
+        self.rate_window = rate_window
+
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._total: Optional[int] = None
+        self._completed = 0
+        self._start = time.monotonic()
+        self._history = deque([(self._start, 0)])
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._previous: Optional[LiveMetrics] = None
+
+    @classmethod
+    def from_args(cls, stage: str, args: argparse.Namespace) -> "LiveMetrics":
+        """根据 add_metrics_arguments 添加的命令行参数创建指标集合"""
+        return cls(stage,
+                   port=args.metrics_port,
+                   textfile=os.path.abspath(args.metrics_file) if args.metrics_file else None,
+                   interval=args.metrics_interval)
+
+    @property
+    def enabled(self) -> bool:
+        """是否开启了任何一种导出方式"""
+        return self.port is not None or self.textfile is not None
+
+    def counter(self, name: str, help_text: str, fn: Optional[Callable[[], float]] = None):
+        """定义只增不减的计数器，名称应以 _total 结尾；fn 的含义同 gauge"""
+        self._define(name, "counter", help_text, fn)
+
+    def gauge(self, name: str, help_text: str, fn: Optional[Callable[[], float]] = None):
+        """
+        定义仪表
+
+        Args:
+            name: 指标名称（不含前缀）
+            help_text: 指标说明
+            fn: 可选，导出时调用以取得当前值，适合队列深度等可以直接读出的量
+        """
+        self._define(name, "gauge", help_text, fn)
+
+    def _define(self, name: str, kind: str, help_text: str, fn: Optional[Callable[[], float]] = None):
+        with self._lock:
+            self._metrics.setdefault(name, {"type": kind, "help": help_text, "value": 0, "fn": fn})
+
+    def increment(self, name: str, amount: float = 1):
+        """计数器或仪表加上 amount（仪表可以为负）"""
+        with self._lock:
+            self._metrics[name]["value"] += amount
+
+    def set(self, name: str, value: float):
+        """设置仪表的值"""
+        with self._lock:
+            self._metrics[name]["value"] = value
+
+    def value(self, name: str) -> float:
+        """计数器或仪表的当前值"""
+        with self._lock:
+            metric = self._metrics[name]
+        return metric["fn"]() if metric["fn"] else metric["value"]
+
+    @property
+    def total(self) -> Optional[int]:
+        """需要处理的总条数，未知时为 None"""
+        return self._total
+
+    @property
+    def completed(self) -> int:
+        """已完成的条数"""
+        return self._completed
+
+    def set_total(self, total: Optional[int]):
+        """设置需要处理的总条数；流式输入时可以随读到的条数不断更新"""
+        with self._lock:
+            self._total = total
+
+    def complete(self, count: int = 1):
+        """记录完成了 count 条"""
+        now = time.monotonic()
+        with self._lock:
+            self._completed += count
+            self._history.append((now, self._completed))
+
+    def throughput(self, now: Optional[float] = None) -> float:
+        """最近 rate_window 秒内每秒完成的条数"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            # 以窗口开始前最后一个样本为基准，窗口内没有新完成的条目时吞吐量逐渐下降
+            while len(self._history) > 1 and now - self._history[1][0] >= self.rate_window:
+                self._history.popleft()
+            since, completed = self._history[0]
+            return (self._completed - completed) / (now - since) if now > since else 0.0
+
+    def eta(self, now: Optional[float] = None) -> float:
+        """按当前吞吐量估计的剩余秒数；总数未知或吞吐量为 0 时为 NaN"""
+        rate = self.throughput(now)
+        if self._total is None or rate <= 0:
+            return float("nan")
+        return max(self._total - self._completed, 0) / rate
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出全部指标"""
+        now = time.monotonic()
+        label = f'{{stage="{self.stage}"}}'
+        builtin = [
+            ("items_completed_total", "counter", "Items completed so far", self._completed),
+            ("items_per_second", "gauge", f"Items completed per second over the last {self.rate_window:g}s",
+             self.throughput(now)),
+            ("eta_seconds", "gauge", "Estimated seconds until all items are completed", self.eta(now)),
+            ("uptime_seconds", "gauge", "Seconds since the stage started", now - self._start),
+        ]
+        if self._total is not None:
+            builtin.insert(0, ("items_total", "gauge", "Items to process", self._total))
+
+        with self._lock:
+            defined = [(name, metric["type"], metric["help"], metric["fn"] or metric["value"])
+                       for name, metric in self._metrics.items()]
+
+        lines = []
+        for name, kind, help_text, value in builtin + defined:
+            if callable(value):
+                value = value()
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            lines.append(f"{full_name}{label} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self):
+        """原子地重写指标文件，读取方不会看到写了一半的内容"""
+        temp_path = f"{self.textfile}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp_path, self.textfile)
+
+    def _textfile_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write_textfile()
+
+    def _make_handler(self):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 不在步骤的标准输出中打印每次抓取
+                pass
+
+        return MetricsHandler
+
+    def __enter__(self) -> "LiveMetrics":
+        global _active
+        self._previous, _active = _active, self
+        if self.port is not None:
+            self._server = ThreadingHTTPServer(("", self.port), self._make_handler())
+            self._server.daemon_threads = True
+            self.port = self._server.server_address[1]
+            self._threads.append(threading.Thread(target=self._server.serve_forever, daemon=True))
+        if self.textfile:
+            os.makedirs(os.path.dirname(self.textfile), exist_ok=True)
+            self.write_textfile()
+            self._threads.append(threading.Thread(target=self._textfile_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = self._previous
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        # 结束时写出最终值，便于事后查看
+        if self.textfile:
+            self.write_textfile()
+
+
+def active_metrics() -> Optional[LiveMetrics]:
+    """当前进程中正在运行的指标集合"""
+    return _active
+
+
+def increment(name: str, amount: float = 1):
+    """为当前指标集合中的指标加上 amount；没有正在运行的指标集合时不做任何事"""
+    if _active is not None:
+        _active.increment(name, amount)
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser):
+    """为步骤脚本添加实时指标相关的命令行参数"""
+    group = parser.add_argument_group("实时指标")
+    group.add_argument("--metrics_port", type=int, default=None,
+                       help="在该端口提供 Prometheus 文本格式的实时指标（GET /metrics），0 表示由系统分配")
+    group.add_argument("--metrics_file", default=None,
+                       help="定期以 Prometheus 文本格式重写该指标文件")
+    group.add_argument("--metrics_interval", type=float, default=10.0,
+                       help="重写指标文件的间隔（秒，默认：10）")
@@ -0,0 +1,769 @@
+#!/usr/bin/env python3
+"""
+流程运行器：以有向无环图（DAG）执行 annotation_maker 的六个步骤
+
+与 generate_pipeline_script.py 生成的 bash 脚本不同，每个步骤显式声明输入、输出和参数，
+路径在各步骤之间一致传递。每个步骤的缓存键由步骤脚本及其导入的仓库内模块的内容、全部参数
+和输入文件的内容哈希组成；缓存键未变且输出文件未被改动的步骤会被跳过。修改某个步骤的参数时，只有该步骤
+及其下游会重新执行；上游重新执行但输出内容不变时，下游仍然跳过。
+
+运行状态保存在 <work_dir>/.pipeline_state.json 中。
+
+--stream 模式下各步骤同时启动，通过只追加的 JSONL 文件相连（见 stream_io.py）：
+采样器每完成一个视频就追加其元数据，规划器边采样边分轮规划，标注、过滤和对话生成
+逐条处理上游已完成的拼接视频，对话生成每满 --shard_size 个样本写出一个训练分片。
+流式运行总是完整执行，不使用缓存。
+
+每次运行的各步骤剖析结果（耗时、CPU、峰值内存、I/O、吞吐量等，见 stage_profile.py）
+写入 <work_dir>/profiles/<时间戳>/，并汇总到其中的 pipeline_profile.json。剖析参数不计入缓存键。
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from stream_io import reset_stream
+from stage_profile import format_profile_table
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = ".pipeline_state.json"
+STAGE_NAMES = ["sample", "plan", "annotate", "filter", "conversations", "statistic"]
+PROFILE_SUMMARY = "pipeline_profile.json"
+
+
+class Stage:
+    """
+    流程中的一个步骤
+    """
+
+    def __init__(self,
+                 name: str,
+                 script: str,
+                 args: List[Tuple[str, Any]],
+                 inputs: List[str],
+                 outputs: List[str],
+                 runtime_args: Optional[List[Tuple[str, Any]]] = None,
+                 description: str = "",
+                 follow: bool = False):
+        """
+        Args:
+            name: 步骤名称
+            script: 步骤脚本相对于仓库根目录的路径
+            args: 命令行参数 (参数名, 值) 列表，参数名为空字符串时作为位置参数；全部计入缓存键
+            inputs: 输入文件或目录，内容哈希计入缓存键
+            outputs: 输出文件，跳过步骤前检查它们未被改动
+            runtime_args: 只影响执行方式、不影响结果的参数（如进程数），不计入缓存键
+            description: 步骤说明
+            follow: 流式模式下是否跟随读取上游仍在追加的输入；否则等上游全部结束后才启动
+        """
+        self.name = name
+        self.script = script
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.runtime_args = runtime_args or []
+        self.description = description
+        self.follow = follow
+
+    def command(self) -> List[str]:
+        """构造步骤的命令行"""
+        command = [sys.executable, os.path.join(REPO_DIR, self.script)]
+        for flag, value in self.args + self.runtime_args:
+            if value is None or value is False:
+                continue
+            if flag:
+                command.append(flag)
+            if value is True:
+                continue
+            if isinstance(value, (list, tuple)):
+                command.extend(str(item) for item in value)
+            else:
+                command.append(str(value))
+        return command
+
+
+def build_stages(config: argparse.Namespace) -> List[Stage]:
+    """
+    按配置构造六个步骤，步骤之间通过输出文件路径相连
+
+    Args:
+        config: 命令行参数
+
+    Returns:
+        步骤列表
+    """
+    work_dir = os.path.abspath(config.work_dir)
+    frames_dir = os.path.abspath(config.sample_frames_dir)
+    video_metadata = os.path.join(frames_dir, "video_metadata.json")
+    plan_dir = os.path.join(work_dir, "concat_planer")
+    concat_plan = os.path.join(plan_dir, "concat_metadata.json")
+    annotation_dir = os.path.join(work_dir, "annotation_concatter")
+    annotations = os.path.join(annotation_dir, "concatenated_video_annotations.json")
+    cleaned = os.path.join(annotation_dir, "concatenated_video_annotations_cleaned.json")
+    rejected = os.path.join(annotation_dir, "rejected_annotations.jsonl")
+    train_conversations = os.path.join(work_dir, "conversation_maker", "train_conversations.json")
+    analysis = os.path.join(work_dir, "statistic", "analysis_result.txt")
+    check_frames = "missing_frames" in config.filter_predicates
+
+    return [
+        Stage("sample", "video_sampler/sample_videos.py",
+              args=[("--input_dir", os.path.abspath(config.input_videos_dir)),
+                    ("--output_dir", frames_dir),
+                    ("--metadata_path", video_metadata),
+                    ("--sampling_interval", config.sampling_interval),
+                    ("--min_duration", config.min_video_duration)],
+              inputs=[os.path.abspath(config.input_videos_dir)],
+              outputs=[video_metadata, frames_dir],
+              runtime_args=[("--num_workers", config.num_workers)],
+              description="视频帧采样"),
+        Stage("plan", "concat_planer/concat_planer.py",
+              args=[("--video_metadata", video_metadata),
+                    ("--output_dir", plan_dir),
+                    ("--total_concats", config.total_concats),
+                    ("--min_videos_per_concat", config.min_videos_per_concat),
+                    ("--max_videos_per_concat", config.max_videos_per_concat),
+                    ("--target_duration_min", config.target_duration_min),
+                    ("--target_duration_max", config.target_duration_max),
+                    ("--reuse_mode", config.reuse_mode),
+                    ("--max_usage_ratio", config.max_usage_ratio),
+                    ("--seed", config.seed)],
+              inputs=[video_metadata],
+              outputs=[concat_plan],
+              description="生成拼接策略"),
+        Stage("annotate", "annotation_concatter/generate_concat_annotations.py",
+              args=[("--concat_plan", concat_plan),
+                    ("--video_descriptions", os.path.abspath(config.video_descriptions)),
+                    ("--output", annotations)],
+              inputs=[concat_plan, os.path.abspath(config.video_descriptions)],
+              outputs=[annotations],
+              runtime_args=[("--max_workers", config.annotation_workers)],
+              description="构造拼接视频标注"),
+        Stage("filter", "data_filter/filter_annotations.py",
+              args=[("--input", annotations),
+                    ("--output", cleaned),
+                    ("--rejected", rejected),
+                    ("--predicates", config.filter_predicates),
+                    ("--min_summary_chars", config.min_summary_chars),
+                    ("--max_summary_chars", config.max_summary_chars),
+                    ("--language", config.language),
+                    ("--min_language_ratio", config.min_language_ratio),
+                    ("--sample_frames_dir", frames_dir if check_frames else None),
+                    # missing_frames 按与对话生成相同的方式选帧
+                    ("--video_metadata", video_metadata if check_frames else None),
+                    ("--max_frames", config.max_frames if check_frames else None),
+                    ("--frame_stride", config.frame_stride if check_frames else None),
+                    ("--subsample", config.subsample if check_frames else None)],
+              # missing_frames 检查帧文件是否存在，帧目录的内容变化时需要重新过滤
+              inputs=[annotations] + ([frames_dir, video_metadata] if check_frames else []),
+              outputs=[cleaned, rejected],
+              runtime_args=[("--num_workers", config.num_workers)],
+              description="过滤标注数据"),
+        Stage("conversations", "conversation_maker/generate_train_conversations.py",
+              args=[("--concat_plan", concat_plan),
+                    ("--annotations", cleaned),
+                    ("--sample_frames_dir", frames_dir),
+                    ("--output", train_conversations),
+                    ("--video_metadata", video_metadata),
+                    ("--max_frames", config.max_frames),
+                    ("--frame_stride", config.frame_stride),
+                    ("--subsample", config.subsample)],
+              inputs=[concat_plan, cleaned, video_metadata],
+              outputs=[train_conversations],
+              description="生成对话格式训练数据"),
+        Stage("statistic", "statistic/analyze_concatenated_videos.py",
+              args=[("", cleaned),
+                    ("-o", analysis)],
+              inputs=[cleaned],
+              outputs=[analysis],
+              description="数据统计分析"),
+    ]
+
+
+def build_stream_stages(config: argparse.Namespace) -> List[Stage]:
+    """
+    按配置构造流式模式的步骤，步骤之间通过只追加的 JSONL 文件相连
+
+    Args:
+        config: 命令行参数
+
+    Returns:
+        步骤列表
+    """
+    work_dir = os.path.abspath(config.work_dir)
+    input_dir = os.path.abspath(config.input_videos_dir)
+    frames_dir = os.path.abspath(config.sample_frames_dir)
+    video_metadata = os.path.join(frames_dir, "video_metadata.json")
+    metadata_stream = os.path.join(frames_dir, "video_metadata.jsonl")
+    plan_dir = os.path.join(work_dir, "concat_planer")
+    plan_stream = os.path.join(plan_dir, "concat_metadata.jsonl")
+    annotation_dir = os.path.join(work_dir, "annotation_concatter")
+    annotations = os.path.join(annotation_dir, "concatenated_video_annotations.jsonl")
+    cleaned = os.path.join(annotation_dir, "concatenated_video_annotations_cleaned.jsonl")
+    rejected = os.path.join(annotation_dir, "rejected_annotations.jsonl")
+    train_conversations = os.path.join(work_dir, "conversation_maker", "train_conversations.json")
+    analysis = os.path.join(work_dir, "statistic", "analysis_result.txt")
+    check_frames = "missing_frames" in config.filter_predicates
+    expected_videos = sum(1 for name in os.listdir(input_dir) if name.lower().endswith(".mp4")) \
+        if os.path.isdir(input_dir) else 0
+
+    return [
+        Stage("sample", "video_sampler/sample_videos.py",
+              args=[("--input_dir", input_dir),
+                    ("--output_dir", frames_dir),
+                    ("--metadata_path", video_metadata),
+                    ("--metadata_stream", metadata_stream),
+                    ("--sampling_interval", config.sampling_interval),
+                    ("--min_duration", config.min_video_duration)],
+              inputs=[input_dir],
+              outputs=[metadata_stream, video_metadata, frames_dir],
+              runtime_args=[("--num_workers", config.num_workers)],
+              description="视频帧采样"),
+        Stage("plan", "concat_planer/concat_planer.py",
+              args=[("--follow", True),
+                    ("--video_metadata", metadata_stream),
+                    ("--output_dir", plan_dir),
+                    ("--expected_videos", expected_videos),
+                    ("--plan_window", config.plan_window),
+                    ("--total_concats", config.total_concats),
+                    ("--min_videos_per_concat", config.min_videos_per_concat),
+                    ("--max_videos_per_concat", config.max_videos_per_concat),
+                    ("--target_duration_min", config.target_duration_min),
+                    ("--target_duration_max", config.target_duration_max),
+                    ("--reuse_mode", config.reuse_mode),
+                    ("--max_usage_ratio", config.max_usage_ratio),
+                    ("--seed", config.seed)],
+              inputs=[metadata_stream],
+              outputs=[plan_stream],
+              description="生成拼接策略",
+              follow=True),
+        Stage("annotate", "annotation_concatter/generate_concat_annotations.py",
+              args=[("--follow", True),
+                    ("--concat_plan", plan_stream),
+                    ("--video_descriptions", os.path.abspath(config.video_descriptions)),
+                    ("--output", annotations)],
+              inputs=[plan_stream],
+              outputs=[annotations],
+              runtime_args=[("--max_workers", config.annotation_workers)],
+              description="构造拼接视频标注",
+              follow=True),
+        Stage("filter", "data_filter/filter_annotations.py",
+              args=[("--follow", True),
+                    ("--input", annotations),
+                    ("--output", cleaned),
+                    ("--rejected", rejected),
+                    ("--predicates", config.filter_predicates),
+                    ("--min_summary_chars", config.min_summary_chars),
+                    ("--max_summary_chars", config.max_summary_chars),
+                    ("--language", config.language),
+                    ("--min_language_ratio", config.min_language_ratio),
+                    ("--sample_frames_dir", frames_dir if check_frames else None),
+                    # missing_frames 按与对话生成相同的方式选帧，帧时间戳跟随采样器的元数据流读取
+                    ("--video_metadata", metadata_stream if check_frames else None),
+                    ("--max_frames", config.max_frames if check_frames else None),
+                    ("--frame_stride", config.frame_stride if check_frames else None),
+                    ("--subsample", config.subsample if check_frames else None),
+                    # 流式输入每次到达的记录很少，小批次可以降低延迟
+                    ("--batch_size", 16)],
+              # missing_frames 检查帧文件是否存在，帧目录的内容变化时需要重新过滤
+              inputs=[annotations] + ([frames_dir, metadata_stream] if check_frames else []),
+              outputs=[cleaned, rejected],
+              runtime_args=[("--num_workers", config.num_workers)],
+              description="过滤标注数据",
+              follow=True),
+        Stage("conversations", "conversation_maker/generate_train_conversations.py",
+              args=[("--follow", True),
+                    ("--concat_plan", plan_stream),
+                    ("--annotations", cleaned),
+                    ("--sample_frames_dir", frames_dir),
+                    ("--output", train_conversations),
+                    ("--video_metadata", metadata_stream),
+                    ("--shard_size", config.shard_size),
+                    ("--max_frames", config.max_frames),
+                    ("--frame_stride", config.frame_stride),
+                    ("--subsample", config.subsample)],
+              inputs=[plan_stream, cleaned, metadata_stream],
+              outputs=[train_conversations],
+              description="生成对话格式训练数据",
+              follow=True),
+        Stage("statistic", "statistic/analyze_concatenated_videos.py",
+              args=[("", cleaned),
+                    ("-o", analysis)],
+              inputs=[cleaned],
+              outputs=[analysis],
+              description="数据统计分析"),
+    ]
+
+
+def attach_profiling(stages: List[Stage],
+                     profile_dir: str,
+                     cprofile_stages: Optional[List[str]] = None,
+                     tracemalloc_stages: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    为每个步骤追加剖析参数（作为 runtime_args，不计入缓存键）
+
+    Args:
+        stages: 步骤列表
+        profile_dir: 剖析结果目录
+        cprofile_stages: 额外启用 cProfile 的步骤
+        tracemalloc_stages: 额外启用 tracemalloc 的步骤
+
+    Returns:
+        步骤名称 -> 剖析 JSON 路径
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    profile_paths = {}
+    for stage in stages:
+        path = os.path.join(profile_dir, f"{stage.name}.json")
+        # 跳过的步骤不会写剖析文件，删除同名旧文件以免混入汇总
+        if os.path.exists(path):
+            os.remove(path)
+        stage.runtime_args.append(("--profile", path))
+        if stage.name in (cprofile_stages or []):
+            stage.runtime_args.append(("--cprofile", os.path.join(profile_dir, f"{stage.name}.prof")))
+        if stage.name in (tracemalloc_stages or []):
+            stage.runtime_args.append(("--tracemalloc", True))
+        profile_paths[stage.name] = path
+    return profile_paths
+
+
+def collect_profiles(profile_paths: Dict[str, str], profile_dir: str, wall_sec: float) -> List[Dict[str, Any]]:
+    """
+    读取本次实际执行的步骤的剖析结果，汇总写入 <profile_dir>/pipeline_profile.json
+
+    Args:
+        profile_paths: attach_profiling 返回的剖析文件路径
+        profile_dir: 剖析结果目录
+        wall_sec: 整个流程的耗时（流式模式下各步骤重叠执行，不等于各步骤耗时之和）
+
+    Returns:
+        各步骤的剖析结果
+    """
+    profiles = []
+    for path in profile_paths.values():
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+    summary = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "wall_sec": round(wall_sec, 3),
+        "stages": profiles,
+    }
+    with open(os.path.join(profile_dir, PROFILE_SUMMARY), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return profiles
+
+
+def run_streaming(stages: List[Stage], dry_run: bool = False, poll_interval: float = 0.5) -> Dict[str, float]:
+    """
+    同时启动各步骤，跟随读取的步骤立即启动，其余步骤在上游全部结束后启动
+
+    任一步骤失败时终止其余步骤。
+
+    Args:
+        stages: build_stream_stages 构造的步骤
+        dry_run: 只打印各步骤的命令
+        poll_interval: 检查子进程状态的间隔（秒）
+
+    Returns:
+        每个步骤从流程开始到结束的耗时（秒），以及首个训练分片写出的时间 "first_shard"
+    """
+    order, upstream = topological_order(stages)
+    if dry_run:
+        for stage in order:
+            when = "立即启动" if stage.follow or not upstream[stage.name] else f"等待 {upstream[stage.name]} 结束"
+            print(f"[{stage.name}] {stage.description}: {when}")
+            print("    " + " ".join(stage.command()))
+        return {}
+
+    for stage in order:
+        for path in stage.outputs:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if path.endswith(".jsonl"):
+                reset_stream(path)
+
+    train_output = next(stage.outputs[0] for stage in order if stage.name == "conversations")
+    first_shard = "{}_shard_00000{}".format(*os.path.splitext(train_output))
+    if os.path.exists(first_shard):
+        os.remove(first_shard)
+
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    running: Dict[str, subprocess.Popen] = {}
+    pending = list(order)
+    try:
+        while pending or running:
+            for stage in list(pending):
+                if stage.follow or all(name in timings for name in upstream[stage.name]):
+                    print(f"[{time.perf_counter() - start:.1f}s] [{stage.name}] {stage.description}: 启动")
+                    running[stage.name] = subprocess.Popen(
+                        stage.command(), cwd=os.path.dirname(os.path.join(REPO_DIR, stage.script)))
+                    pending.remove(stage)
+
+            for name, process in list(running.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                del running[name]
+                if code != 0:
+                    raise RuntimeError(f"Stage '{name}' failed with exit code {code}")
+                timings[name] = round(time.perf_counter() - start, 3)
+                print(f"[{timings[name]:.1f}s] [{name}] 完成")
+
+            if "first_shard" not in timings and os.path.exists(first_shard):
+                timings["first_shard"] = round(time.perf_counter() - start, 3)
+                print(f"[{timings['first_shard']:.1f}s] 首个训练分片已写出: {first_shard}")
+            time.sleep(poll_interval)
+    finally:
+        for process in running.values():
+            process.terminate()
+        for process in running.values():
+            process.wait()
+    return timings
+
+
+def topological_order(stages: List[Stage]) -> Tuple[List[Stage], Dict[str, List[str]]]:
+    """
+    根据输出和输入路径推导依赖关系，返回拓扑序和每个步骤的上游步骤
+
+    Raises:
+        ValueError: 依赖关系中存在环
+    """
+    producer = {output: stage.name for stage in stages for output in stage.outputs}
+    upstream = {stage.name: sorted({producer[path] for path in stage.inputs if path in producer} - {stage.name})
+                for stage in stages}
+
+    by_name = {stage.name: stage for stage in stages}
+    remaining = {name: set(deps) for name, deps in upstream.items()}
+    order = []
+    while remaining:
+        ready = [stage.name for stage in stages if stage.name in remaining and not remaining[stage.name]]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among: {sorted(remaining)}")
+        for name in ready:
+            order.append(by_name[name])
+            del remaining[name]
+            for deps in remaining.values():
+                deps.discard(name)
+    return order, upstream
+
+
+class PipelineRunner:
+    """
+    带内容哈希缓存的 DAG 流程运行器
+    """
+
+    def __init__(self, stages: List[Stage], work_dir: str):
+        self.stages, self.upstream = topological_order(stages)
+        self.work_dir = work_dir
+        self.state_path = os.path.join(work_dir, STATE_FILE)
+        self.state = self._load_state()
+        self._modules: Optional[Dict[str, str]] = None
+
+    def _load_state(self) -> Dict[str, Any]:
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"stages": {}, "file_hashes": {}}
+
+    def _save_state(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def fingerprint(self, path: str) -> Optional[str]:
+        """
+        计算文件或目录的指纹
+
+        文件使用内容的 SHA-256，并按 (大小, 修改时间) 缓存，未变化的大文件不会重复读取；
+        目录（如原始视频目录、采样帧目录）只对其中文件的清单（相对路径、大小和修改时间）做哈希，
+        文件被删除、截断或重写时指纹随之变化。
+
+        Returns:
+            指纹字符串；路径不存在时为 None
+        """
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    stat = os.stat(os.path.join(root, name))
+                    relative = os.path.relpath(os.path.join(root, name), path)
+                    digest.update(f"{relative}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+            return f"dir:{digest.hexdigest()}"
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self.state["file_hashes"].get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 22), b""):
+                digest.update(chunk)
+        self.state["file_hashes"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                           "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def code_fingerprints(self, script: str) -> Dict[str, str]:
+        """
+        步骤脚本及其直接或间接导入的仓库内模块的指纹
+
+        步骤脚本会从同目录、仓库根目录和其他步骤目录导入模块（如过滤步骤导入
+        generate_train_conversations 的选帧逻辑），这些模块改动时步骤也需要重新执行。
+        仓库内的模块文件名互不相同，因此按模块名匹配仓库根目录及其一级子目录下的 .py 文件。
+
+        Args:
+            script: 步骤脚本相对于仓库根目录的路径
+
+        Returns:
+            相对路径到指纹的映射
+        """
+        if self._modules is None:
+            self._modules = {}
+            for directory in [REPO_DIR] + sorted(
+                    os.path.join(REPO_DIR, name) for name in os.listdir(REPO_DIR)
+                    if not name.startswith(".") and os.path.isdir(os.path.join(REPO_DIR, name))):
+                for name in sorted(os.listdir(directory)):
+                    if name.endswith(".py"):
+                        self._modules.setdefault(name[:-3], os.path.join(directory, name))
+
+        fingerprints: Dict[str, str] = {}
+        pending = [os.path.join(REPO_DIR, script)]
+        while pending:
+            path = pending.pop()
+            relative = os.path.relpath(path, REPO_DIR)
+            if relative in fingerprints:
+                continue
+            fingerprints[relative] = self.fingerprint(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read(), filename=path)
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    names = [alias.name for alias in node.names]
+                elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                    names = [node.module]
+                else:
+                    continue
+                pending.extend(self._modules[name.split(".")[0]] for name in names
+                               if name.split(".")[0] in self._modules)
+        return fingerprints
+
+    def stage_key(self, stage: Stage) -> Optional[str]:
+        """
+        计算步骤的缓存键：步骤脚本及其导入的仓库内模块的内容 + 参数 + 输入指纹
+
+        Returns:
+            缓存键；有输入不存在时为 None
+        """
+        inputs = {path: self.fingerprint(path) for path in stage.inputs}
+        if any(value is None for value in inputs.values()):
+            return None
+        payload = {
+            "stage": stage.name,
+            "code": self.code_fingerprints(stage.script),
+            "args": [[flag, value] for flag, value in stage.args],
+            "inputs": inputs,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def is_up_to_date(self, stage: Stage, key: Optional[str]) -> bool:
+        """缓存键未变，且上次记录的输出文件都存在且未被改动"""
+        record = self.state["stages"].get(stage.name)
+        if key is None or not record or record.get("key") != key:
+            return False
+        return all(self.fingerprint(path) == record["outputs"].get(path) for path in stage.outputs)
+
+    def run(self,
+            selected: Optional[List[str]] = None,
+            force: Optional[List[str]] = None,
+            dry_run: bool = False) -> Dict[str, str]:
+        """
+        按拓扑序执行步骤
+
+        Args:
+            selected: 只考虑这些步骤（默认全部）
+            force: 无论缓存是否命中都重新执行的步骤，"all" 表示全部
+            dry_run: 只打印每个步骤将被执行还是跳过
+
+        Returns:
+            每个步骤的结果（"skipped"、"ran"、"would_run"、"not_selected"）
+        """
+        force = set(STAGE_NAMES if force and "all" in force else force or [])
+        results: Dict[str, str] = {}
+        for stage in self.stages:
+            if selected and stage.name not in selected:
+                results[stage.name] = "not_selected"
+                continue
+
+            upstream_pending = any(results.get(name) == "would_run" for name in self.upstream[stage.name])
+            key = None if upstream_pending else self.stage_key(stage)
+            if stage.name not in force and not upstream_pending and self.is_up_to_date(stage, key):
+                print(f"[{stage.name}] {stage.description}: 已是最新，跳过")
+                results[stage.name] = "skipped"
+                continue
+
+            if dry_run:
+                reason = "上游将重新执行" if upstream_pending else "缓存未命中" if key else "输入不存在"
+                print(f"[{stage.name}] {stage.description}: 将执行（{reason}）")
+                print("    " + " ".join(stage.command()))
+                results[stage.name] = "would_run"
+                continue
+
+            if key is None:
+                missing = [path for path in stage.inputs if self.fingerprint(path) is None]
+                raise FileNotFoundError(f"Stage '{stage.name}' is missing inputs: {missing}")
+
+            print(f"[{stage.name}] {stage.description}: 开始执行")
+            for output in stage.outputs:
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+            start = time.perf_counter()
+            completed = subprocess.run(stage.command(), cwd=os.path.dirname(os.path.join(REPO_DIR, stage.script)))
+            elapsed = time.perf_counter() - start
+            if completed.returncode != 0:
+                self._save_state()
+                raise RuntimeError(f"Stage '{stage.name}' failed with exit code {completed.returncode}")
+
+            self.state["stages"][stage.name] = {
+                "key": key,
+                "outputs": {path: self.fingerprint(path) for path in stage.outputs},
+                "elapsed_sec": round(elapsed, 3),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._save_state()
+            print(f"[{stage.name}] 完成，耗时 {elapsed:.1f}s")
+            results[stage.name] = "ran"
+        return results
+
+
+def report_profiles(profile_paths: Dict[str, str], profile_dir: str, wall_sec: float):
+    """汇总并打印本次运行的剖析结果"""
+    profiles = collect_profiles(profile_paths, profile_dir, wall_sec)
+    if profiles:
+        print(format_profile_table(profiles))
+        print(f"剖析结果已保存到 {os.path.join(profile_dir, PROFILE_SUMMARY)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以 DAG 执行 annotation_maker 流程，跳过输入和参数未变的步骤")
+    parser.add_argument("--workspace_root", default="/data1/whq", help="工作区根目录")
+    parser.add_argument("--work_dir", default=None,
+                        help="各步骤输出的根目录（默认：<workspace_root>/annotation_maker）")
+    parser.add_argument("--input_videos_dir", required=True, help="输入视频目录路径")
+    parser.add_argument("--sample_frames_dir", default="/data1/whq/sample_frames", help="采样帧输出目录路径")
+    parser.add_argument("--video_descriptions", default="/data1/whq/sharegpt4o/video_conversations/gpt4o.jsonl",
+                        help="原始视频描述文件路径")
+
+    # 视频采样参数
+    parser.add_argument("--sampling_interval", type=float, default=1.0, help="采样间隔(秒)")
+    parser.add_argument("--min_video_duration", type=float, default=2.0, help="最小视频时长(秒)")
+    parser.add_argument("--num_workers", type=int, default=8, help="并行处理进程数")
+
+    # 视频拼接参数
+    parser.add_argument("--total_concats", type=int, default=500, help="生成的拼接视频总数")
+    parser.add_argument("--min_videos_per_concat", type=int, default=2, help="每个拼接视频最少包含的视频数量")
+    parser.add_argument("--max_videos_per_concat", type=int, default=6, help="每个拼接视频最多包含的视频数量")
+    parser.add_argument("--target_duration_min", type=float, default=20.0, help="拼接视频的最小目标时长(秒)")
+    parser.add_argument("--target_duration_max", type=float, default=60.0, help="拼接视频的最大目标时长(秒)")
+    parser.add_argument("--reuse_mode", choices=["balanced", "random"], default="balanced", help="视频复用策略")
+    parser.add_argument("--max_usage_ratio", type=float, default=2.0,
+                        help="单个视频最多可被使用的次数与拼接视频总数的比例上限")
+    parser.add_argument("--seed", type=int, default=42, help="拼接规划的随机种子")
+
+    # 标注与过滤参数
+    parser.add_argument("--annotation_workers", type=int, default=30, help="构造标注时并发处理拼接视频的线程数")
+    parser.add_argument("--filter_predicates", nargs="+", default=["empty_summary"],
+                        choices=["empty_summary", "error_marker", "summary_length", "language", "missing_frames"],
+                        help="过滤条件（默认：empty_summary，与 clean_empty_summaries.py 相同）")
+    parser.add_argument("--min_summary_chars", type=int, default=1, help="summary 最少字符数")
+    parser.add_argument("--max_summary_chars", type=int, default=0, help="summary 最多字符数，0 表示不限制")
+    parser.add_argument("--language", choices=["en", "zh"], default="en", help="language 条件要求的语言")
+    parser.add_argument("--min_language_ratio", type=float, default=0.8, help="language 条件的最低字符占比")
+
+    # 对话生成参数
+    parser.add_argument("--max_frames", type=int, default=None, help="每个样本的最大帧数")
+    parser.add_argument("--frame_stride", type=int, default=1, help="帧步长")
+    parser.add_argument("--subsample", choices=["uniform", "boundary"], default="boundary",
+                        help="超出帧预算时的降采样方式")
+
+    # 运行控制
+    parser.add_argument("--stages", nargs="+", choices=STAGE_NAMES, default=None,
+                        help="只执行这些步骤（默认：全部）")
+    parser.add_argument("--force", nargs="+", choices=STAGE_NAMES + ["all"], default=None,
+                        help="忽略缓存强制重新执行的步骤")
+    parser.add_argument("--dry_run", action="store_true", help="只显示各步骤将被执行还是跳过")
+
+    # 流式执行
+    parser.add_argument("--stream", action="store_true",
+                        help="流式模式：各步骤同时启动，通过只追加的 JSONL 文件逐条传递结果")
+    parser.add_argument("--plan_window", type=int, default=64, help="流式模式：每到达多少个新视频规划一轮")
+    parser.add_argument("--shard_size", type=int, default=1000, help="流式模式：每个训练分片的样本数")
+
+    # 性能剖析
+    parser.add_argument("--profile_dir", default=None,
+                        help="各步骤剖析结果的目录（默认：<work_dir>/profiles/<时间戳>）")
+    parser.add_argument("--cprofile_stages", nargs="+", choices=STAGE_NAMES, default=None,
+                        help="额外启用 cProfile 的步骤，.prof 文件写入剖析目录")
+    parser.add_argument("--tracemalloc_stages", nargs="+", choices=STAGE_NAMES, default=None,
+                        help="额外启用 tracemalloc 内存分配统计的步骤")
+
+    args = parser.parse_args()
+    if args.work_dir is None:
+        args.work_dir = os.path.join(args.workspace_root, "annotation_maker")
+    if args.stream and (args.stages or args.force):
+        parser.error("--stream 总是完整执行全部步骤，不能与 --stages、--force 同时使用")
+
+    stages = build_stream_stages(args) if args.stream else build_stages(args)
+    profile_dir = os.path.abspath(args.profile_dir or os.path.join(
+        args.work_dir, "profiles", datetime.now().strftime("%Y%m%d_%H%M%S")))
+    profile_paths = {} if args.dry_run else attach_profiling(
+        stages, profile_dir, args.cprofile_stages, args.tracemalloc_stages)
+
+    if args.stream:
+        try:
+            timings = run_streaming(stages, args.dry_run)
+        except RuntimeError as e:
+            print(f"流程中止: {e}")
+            sys.exit(1)
+        if timings:
+            report_profiles(profile_paths, profile_dir, max(timings.values()))
+            print(f"流式流程结束，总耗时 {max(timings.values()):.1f}s，"
+                  f"首个训练分片 {timings.get('first_shard', float('nan')):.1f}s")
+        return
+
+    runner = PipelineRunner(stages, os.path.abspath(args.work_dir))
+    start = time.perf_counter()
+    try:
+        results = runner.run(args.stages, args.force, args.dry_run)
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"流程中止: {e}")
+        sys.exit(1)
+    finally:
+        if profile_paths:
+            report_profiles(profile_paths, profile_dir, time.perf_counter() - start)
+
+    by_result: Dict[str, List[str]] = {}
+    for name, result in results.items():
+        by_result.setdefault(result, []).append(name)
+    skipped = by_result.get("skipped", [])
+    if args.dry_run:
+        pending = by_result.get("would_run", [])
+        print(f"预演结束，将执行 {len(pending)} 个步骤 {pending}，跳过 {len(skipped)} 个步骤 {skipped}")
+    else:
+        ran = by_result.get("ran", [])
+        print(f"流程结束，执行 {len(ran)} 个步骤 {ran}，跳过 {len(skipped)} 个步骤 {skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+流程各步骤共用的性能剖析工具
+
+StageProfiler 记录一个步骤的墙钟时间、CPU 时间（本进程及已回收的子进程）、峰值内存、
+I/O 字节数、处理条目数和吞吐量，并可按阶段（phase）细分耗时；标注步骤还记录每次 LLM
+调用的延迟直方图和 prompt / completion token 数。每次运行写出一个 JSON 剖析文件。
+
+可以为单个步骤开启 cProfile（保存 .prof 文件，并在 JSON 中列出累计耗时最多的函数）
+和 tracemalloc（记录 Python 堆的峰值和分配最多的代码位置），两者都会拖慢运行，默认关闭。
+
+步骤脚本的用法：
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with StageProfiler.from_args("filter", args) as profiler:
+        with profiler.phase("filter"):
+            ...
+        profiler.add_items(total, "concats")
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import argparse
+import cProfile
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+# LLM 调用延迟直方图的区间上界（秒），最后一个区间不设上界
+LATENCY_EDGES = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+
+# 当前进程中正在运行的剖析器，供 record_llm_call 等模块级函数使用
+_active: Optional["StageProfiler"] = None
+
+
+def read_proc_io() -> Dict[str, int]:
+    """
+    读取 /proc/self/io 中本进程的 I/O 计数
+
+    rchar / wchar 为 read/write 等系统调用读写的字节数（含页缓存命中），
+    read_bytes / write_bytes 为实际到达存储设备的字节数。非 Linux 系统返回空字典。
+    """
+    try:
+        with open("/proc/self/io", 'r') as f:
+            return {key: int(value) for key, value in (line.split(":") for line in f if ":" in line)}
+    except OSError:
+        return {}
+
+
+def max_rss_bytes(who: int) -> int:
+    """getrusage 的峰值常驻内存，Linux 以 KB 为单位，macOS 以字节为单位"""
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def cpu_seconds(usage: resource.struct_rusage) -> float:
+    return usage.ru_utime + usage.ru_stime
+
+
+class LatencyStats:
+    """
+    LLM 调用的延迟和 token 统计，多个线程可同时记录
+    """
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0, error: bool = False):
+        with self._lock:
+            self.latencies.append(latency)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.errors += bool(error)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        def quantile(q: float) -> float:
+            return latencies[min(count - 1, int(q * count))] if count else 0.0
+
+        histogram = [0] * (len(LATENCY_EDGES) + 1)
+        bucket = 0
+        for latency in latencies:
+            while bucket < len(LATENCY_EDGES) and latency > LATENCY_EDGES[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+        labels = [f"<={edge}s" for edge in LATENCY_EDGES] + [f">{LATENCY_EDGES[-1]}s"]
+
+        return {
+            "calls": count,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_sec": {
+                "mean": round(sum(latencies) / count, 4) if count else 0.0,
+                "p50": round(quantile(0.5), 4),
+                "p90": round(quantile(0.9), 4),
+                "p99": round(quantile(0.99), 4),
+                "max": round(latencies[-1], 4) if count else 0.0,
+            },
+            "latency_histogram": dict(zip(labels, histogram)),
+        }
+
+
+class StageProfiler:
+    """
+    单个步骤的剖析器，作为上下文管理器包住步骤的主体
+    """
+
+    def __init__(self,
+                 stage: str,
+                 output: Optional[str] = None,
+                 cprofile_output: Optional[str] = None,
+                 trace_memory: bool = False,
+                 top_n: int = 25):
+        """
+        Args:
+            stage: 步骤名称
+            output: JSON 剖析结果的输出路径，None 表示只在内存中统计
+            cprofile_output: 开启 cProfile 并将结果保存到该 .prof 路径
+            trace_memory: 是否开启 tracemalloc
+            top_n: cProfile 函数和 tracemalloc 分配位置各列出的条数
+        """
+        self.stage = stage
+        self.output = output
+        self.cprofile_output = cprofile_output
+        self.trace_memory = trace_memory
+        self.top_n = top_n
+
+        self.items = 0
+        self.item_unit = "items"
+        self.extra: Dict[str, Any] = {}
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.llm = LatencyStats()
+        self.result: Optional[Dict[str, Any]] = None
+
+        self._previous: Optional[StageProfiler] = None
+        self._profiler: Optional[cProfile.Profile] = None
+
+    @classmethod
+    def from_args(cls, stage: str, args: argparse.Namespace) -> "StageProfiler":
+        """根据 add_profile_arguments 添加的命令行参数创建剖析器"""
+        return cls(stage,
+                   output=os.path.abspath(args.profile) if args.profile else None,
+                   cprofile_output=os.path.abspath(args.cprofile) if args.cprofile else None,
+                   trace_memory=args.tracemalloc)
+
+    def __enter__(self) -> "StageProfiler":
+        global _active
+        self._previous, _active = _active, self
+        self._started_at = datetime.now().isoformat(timespec="seconds")
+        self._io = read_proc_io()
+        self._self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        self._children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.cprofile_output:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        wall = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        _active = self._previous
+
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        io_now = read_proc_io()
+        cpu_self = cpu_seconds(self_usage) - cpu_seconds(self._self_usage)
+        cpu_children = cpu_seconds(children_usage) - cpu_seconds(self._children_usage)
+
+        result: Dict[str, Any] = {
+            "stage": self.stage,
+            "status": "ok" if exc_type is None else f"failed: {exc_type.__name__}",
+            "started_at": self._started_at,
+            "pid": os.getpid(),
+            "wall_sec": round(wall, 3),
+            "cpu_sec": {
+                "self": round(cpu_self, 3),
+                "children": round(cpu_children, 3),
+                "total": round(cpu_self + cpu_children, 3),
+            },
+            # CPU 时间与墙钟时间之比，约等于平均占用的核数
+            "cpu_utilization": round((cpu_self + cpu_children) / wall, 3) if wall > 0 else 0.0,
+            "peak_rss_bytes": {
+                "self": max_rss_bytes(resource.RUSAGE_SELF),
+                # 已回收子进程中最大的一个
+                "children": max_rss_bytes(resource.RUSAGE_CHILDREN),
+            },
+            "io_bytes": {
+                "read": io_now.get("rchar", 0) - self._io.get("rchar", 0),
+                "written": io_now.get("wchar", 0) - self._io.get("wchar", 0),
+                "storage_read": io_now.get("read_bytes", 0) - self._io.get("read_bytes", 0),
+                "storage_written": io_now.get("write_bytes", 0) - self._io.get("write_bytes", 0),
+                # 子进程只能拿到块设备 I/O 次数（每块 512 字节）
+                "children_storage_read": (children_usage.ru_inblock - self._children_usage.ru_inblock) * 512,
+                "children_storage_written": (children_usage.ru_oublock - self._children_usage.ru_oublock) * 512,
+            },
+            "items": self.items,
+            "item_unit": self.item_unit,
+            "items_per_sec": round(self.items / wall, 3) if wall > 0 else 0.0,
+            "phases": {name: {"wall_sec": round(phase["wall_sec"], 3), "count": int(phase["count"])}
+                       for name, phase in self.phases.items()},
+        }
+        if self.llm.latencies:
+            result["llm"] = self.llm.to_dict()
+        if self.extra:
+            result["extra"] = self.extra
+        if self._profiler is not None:
+            result["cprofile"] = self._cprofile_summary()
+        if self.trace_memory:
+            result["tracemalloc"] = self._tracemalloc_summary()
+            tracemalloc.stop()
+
+        self.result = result
+        if self.output:
+            os.makedirs(os.path.dirname(self.output), exist_ok=True)
+            with open(self.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        return False
+
+    def _cprofile_summary(self) -> Dict[str, Any]:
+        os.makedirs(os.path.dirname(self.cprofile_output), exist_ok=True)
+        self._profiler.dump_stats(self.cprofile_output)
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({"function": f"{os.path.basename(filename)}:{line}({function})",
+                         "calls": calls, "tottime": round(total, 4), "cumtime": round(cumulative, 4)})
+        rows.sort(key=lambda row: -row["cumtime"])
+        return {"prof_file": self.cprofile_output, "top_cumulative": rows[:self.top_n]}
+
+    def _tracemalloc_summary(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        top = snapshot.statistics("lineno")[:self.top_n]
+        return {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top_allocations": [{"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                                 "size_bytes": stat.size, "count": stat.count} for stat in top],
+        }
+
+    @contextmanager
+    def phase(self, name: str):
+        """累计一个阶段的墙钟时间，同名阶段可多次进入"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase = self.phases.setdefault(name, {"wall_sec": 0.0, "count": 0})
+            phase["wall_sec"] += time.perf_counter() - start
+            phase["count"] += 1
+
+    def add_items(self, count: int, unit: Optional[str] = None):
+        """累加处理的条目数，用于计算吞吐量"""
+        self.items += count
+        if unit:
+            self.item_unit = unit
+
+    def set_extra(self, key: str, value: Any):
+        """记录步骤特有的数值（如采样帧数），写在 JSON 的 extra 中"""
+        self.extra[key] = value
+
+    def record_llm_call(self, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+                        error: bool = False):
+        self.llm.record(latency, prompt_tokens, completion_tokens, error)
+
+
+def active_profiler() -> Optional[StageProfiler]:
+    """当前进程中正在运行的剖析器"""
+    return _active
+
+
+def record_llm_call(latency: float, prompt_tokens: int = 0, completion_tokens: int = 0, error: bool = False):
+    """记录一次 LLM 调用；没有正在运行的剖析器时不做任何事"""
+    if _active is not None:
+        _active.record_llm_call(latency, prompt_tokens, completion_tokens, error)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """为步骤脚本添加剖析相关的命令行参数"""
+    group = parser.add_argument_group("性能剖析")
+    group.add_argument("--profile", default=None,
+                       help="将本次运行的剖析结果（耗时、CPU、内存、I/O、吞吐量）写入该 JSON 文件")
+    group.add_argument("--cprofile", default=None,
+                       help="开启 cProfile，将结果保存到该 .prof 文件，并在剖析 JSON 中列出耗时最多的函数")
+    group.add_argument("--tracemalloc", action="store_true",
+                       help="开启 tracemalloc，在剖析 JSON 中记录 Python 堆峰值和分配最多的代码位置")
+
+
+def format_profile_table(profiles: List[Dict[str, Any]]) -> str:
+    """把若干步骤的剖析结果排成一张表"""
+    header = f"{'步骤':<14}{'耗时(s)':>10}{'CPU(s)':>10}{'核数':>7}{'峰值内存(MB)':>14}" \
+             f"{'读(MB)':>10}{'写(MB)':>10}{'吞吐量':>20}"
+    lines = [header, "-" * len(header)]
+    for profile in profiles:
+        rss = max(profile["peak_rss_bytes"].values()) / 1024 / 1024
+        io_bytes = profile["io_bytes"]
+        read = (io_bytes["read"] + io_bytes["children_storage_read"]) / 1024 / 1024
+        written = (io_bytes["written"] + io_bytes["children_storage_written"]) / 1024 / 1024
+        throughput = f"{profile['items_per_sec']:.1f} {profile['item_unit']}/s"
+        lines.append(f"{profile['stage']:<14}{profile['wall_sec']:>10.1f}{profile['cpu_sec']['total']:>10.1f}"
+                     f"{profile['cpu_utilization']:>7.1f}{rss:>14.1f}{read:>10.1f}{written:>10.1f}{throughput:>20}")
+        if "llm" in profile:
+            llm = profile["llm"]
+            lines.append(f"{'':<14}LLM 调用 {llm['calls']} 次（失败 {llm['errors']}），"
+                         f"延迟 p50 {llm['latency_sec']['p50']:.2f}s / p99 {llm['latency_sec']['p99']:.2f}s，"
+                         f"tokens {llm['prompt_tokens']} + {llm['completion_tokens']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总显示步骤剖析结果")
+    parser.add_argument("profiles", nargs="+", help="剖析 JSON 文件，或包含剖析 JSON 的目录")
+    args = parser.parse_args()
+
+    profiles = []
+    for path in args.profiles:
+        if os.path.isdir(path):
+            # 流程运行目录中已有汇总文件时只读取汇总，避免重复计入各步骤
+            summary = os.path.join(path, "pipeline_profile.json")
+            files = [summary] if os.path.isfile(summary) else \
+                sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+        else:
+            files = [path]
+        for file in files:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 流程汇总文件中包含多个步骤
+            profiles.extend(data["stages"] if "stages" in data else [data])
+    print(format_profile_table(profiles))
+
+
+if __name__ == "__main__":
+    main()
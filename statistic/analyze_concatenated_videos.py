@@ -1,124 +1,219 @@
+import os
+import sys
 import json
 import numpy as np
-from collections import Counter
-import sys
 from datetime import datetime
+from multiprocessing import Pool
+from typing import List, Dict, Any, Optional, Union
+
+from streaming_stats import DistributionSketch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_io import iter_json_records
+
+# 拼接视频时长区间（左闭右开）
+DURATION_EDGES = [0, 30, 60, 90, 120, 150, 180, 210, 240, float('inf')]
+DURATION_LABELS = ['0-30s', '30-60s', '60-90s', '90-120s', '120-150s', '150-180s', '180-210s', '210-240s', '240s+']
 
-def analyze_concatenated_videos(file_path, output_file=None):
+# 元视频数量区间
+COUNT_EDGES = list(range(1, 11)) + [float('inf')]
+COUNT_LABELS = [str(i) for i in range(1, 10)] + ['10+']
+
+
+class ConcatAnnotationStats:
+    """
+    拼接视频标注的流式统计，记录按批向量化地更新到可合并的草图中
+    """
+
+    def __init__(self, batch_size: int = 65536):
+        self.batch_size = batch_size
+        self.total_durations = DistributionSketch(DURATION_EDGES, DURATION_LABELS)   # 拼接视频总时长
+        self.video_counts = DistributionSketch(COUNT_EDGES, COUNT_LABELS, exact_counts=True)  # 每个拼接视频包含的元视频数量
+        self.single_video_durations = DistributionSketch()   # 单个元视频的时长
+        self._pending_totals: List[float] = []
+        self._pending_counts: List[int] = []
+        self._pending_singles: List[float] = []
+
+    @property
+    def concat_count(self) -> int:
+        return self.total_durations.moments.count + len(self._pending_totals)
+
+    def update(self, concat_video: Dict[str, Any]):
+        """追加一条拼接视频标注"""
+        concat_data = concat_video['data']
+        self._pending_totals.append(concat_data[-1]['end'] if concat_data else 0)
+        self._pending_counts.append(len(concat_data))
+        self._pending_singles.extend(video['end'] - video['start'] for video in concat_data)
+        if len(self._pending_totals) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的记录批量写入草图"""
+        self.total_durations.update(np.asarray(self._pending_totals))
+        self.video_counts.update(np.asarray(self._pending_counts))
+        self.single_video_durations.update(np.asarray(self._pending_singles))
+        self._pending_totals, self._pending_counts, self._pending_singles = [], [], []
+
+    def merge(self, other: "ConcatAnnotationStats"):
+        """合并另一分片的统计"""
+        self.flush()
+        other.flush()
+        self.total_durations.merge(other.total_durations)
+        self.video_counts.merge(other.video_counts)
+        self.single_video_durations.merge(other.single_video_durations)
+
+    def to_dict(self) -> Dict[str, Any]:
+        self.flush()
+        return {"total_durations": self.total_durations.to_dict(),
+                "video_counts": self.video_counts.to_dict(),
+                "single_video_durations": self.single_video_durations.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConcatAnnotationStats":
+        stats = cls()
+        stats.total_durations = DistributionSketch.from_dict(data["total_durations"])
+        stats.video_counts = DistributionSketch.from_dict(data["video_counts"])
+        stats.single_video_durations = DistributionSketch.from_dict(data["single_video_durations"])
+        return stats
+
+    def summary(self) -> Dict[str, Any]:
+        """机器可读的汇总"""
+        self.flush()
+        return {"concat_videos": self.concat_count,
+                "total_durations": self.total_durations.summary(),
+                "video_counts": self.video_counts.summary(),
+                "single_video_durations": self.single_video_durations.summary()}
+
+    def report(self) -> str:
+        """与原文本报告格式一致的统计结果"""
+        self.flush()
+        total = self.concat_count
+        lines = [f"总共 {total} 个拼接视频"]
+        if total == 0:
+            return "\n".join(lines)
+
+        durations = self.total_durations.moments
+        lines.append("\n=== 拼接视频时长分布 ===")
+        lines.append(f"总时长: {durations.total:.2f} 秒 ({durations.total/3600:.2f} 小时)")
+        lines.append(f"平均时长: {durations.mean:.2f} 秒")
+        lines.append(f"最短时长: {durations.min:.2f} 秒")
+        lines.append(f"最长时长: {durations.max:.2f} 秒")
+        lines.append(f"时长中位数: {self.total_durations.quantile(0.5):.2f} 秒")
+        lines.append(f"时长标准差: {durations.std:.2f} 秒")
+
+        counts = self.video_counts.moments
+        lines.append("\n=== 元视频数量分布 ===")
+        for count, freq in sorted(self.video_counts.value_counts.items()):
+            lines.append(f"包含 {count} 个元视频的拼接视频有 {freq} 个 ({freq/total*100:.2f}%)")
+        lines.append(f"平均每拼接视频包含元视频数: {counts.mean:.2f}")
+        lines.append(f"最少元视频数: {int(counts.min)}")
+        lines.append(f"最多元视频数: {int(counts.max)}")
+
+        singles = self.single_video_durations.moments
+        lines.append("\n=== 元视频时长分布 ===")
+        if singles.count:
+            lines.append(f"平均时长: {singles.mean:.2f} 秒")
+            lines.append(f"最短时长: {singles.min:.2f} 秒")
+            lines.append(f"最长时长: {singles.max:.2f} 秒")
+            lines.append(f"时长中位数: {self.single_video_durations.quantile(0.5):.2f} 秒")
+            lines.append(f"时长标准差: {singles.std:.2f} 秒")
+
+        lines.append("\n=== 拼接视频时长区间分布 ===")
+        for label, count in zip(DURATION_LABELS, self.total_durations.histogram.counts.tolist()):
+            lines.append(f"{label:8}: {count:4} ({count/total*100:5.2f}%)")
+
+        lines.append("\n=== 拼接视频包含元视频数量分布 ===")
+        for label, count in zip(COUNT_LABELS, self.video_counts.histogram.counts.tolist()):
+            lines.append(f"{label:>4}个元视频: {count:4} ({count/total*100:5.2f}%)")
+        return "\n".join(lines)
+
+
+def analyze_file(file_path: str) -> ConcatAnnotationStats:
+    """流式统计单个标注文件（JSON 数组或 JSONL）"""
+    stats = ConcatAnnotationStats()
+    for concat_video in iter_json_records(file_path):
+        stats.update(concat_video)
+    stats.flush()
+    return stats
+
+
+def analyze_concatenated_videos(file_path: Union[str, List[str]],
+                                output_file: Optional[str] = None,
+                                num_workers: int = 1,
+                                sketch_output: Optional[str] = None,
+                                sketch_inputs: Optional[List[str]] = None) -> ConcatAnnotationStats:
     """
     分析clean后的拼接视频标注文件，统计拼接视频时长分布、元视频数量分布等信息
+
+    Args:
+        file_path: 标注文件路径，或分片文件路径列表（各分片并行统计后合并）
+        output_file: 文本报告输出路径，None 时输出到标准输出
+        num_workers: 并行统计分片的进程数
+        sketch_output: 可选，保存合并后的草图，供之后与其他分片的统计合并
+        sketch_inputs: 可选，需要一并合并的已保存草图文件
+
+    Returns:
+        合并后的统计
     """
-    # 保存原始stdout
-    original_stdout = sys.stdout
-    
-    # 如果指定了输出文件，则重定向输出
+    file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+
+    if num_workers > 1 and len(file_paths) > 1:
+        with Pool(processes=min(num_workers, len(file_paths))) as pool:
+            shard_stats = pool.map(analyze_file, file_paths)
+    else:
+        shard_stats = [analyze_file(path) for path in file_paths]
+
+    stats = ConcatAnnotationStats()
+    for shard in shard_stats:
+        stats.merge(shard)
+    for sketch_file in sketch_inputs or []:
+        with open(sketch_file, 'r', encoding='utf-8') as f:
+            stats.merge(ConcatAnnotationStats.from_dict(json.load(f)["sketch"]))
+
+    report = stats.report()
     if output_file:
-        sys.stdout = open(output_file, 'w')
-    
-    try:
-        # 读取数据
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        # 统计信息
-        total_durations = []  # 拼接视频总时长
-        video_counts = []     # 每个拼接视频包含的元视频数量
-        single_video_durations = []  # 单个元视频的时长
-        
-        print(f"总共 {len(data)} 个拼接视频")
-        
-        for concat_video in data:
-            # 计算拼接视频总时长
-            concat_data = concat_video['data']
-            total_duration = concat_data[-1]['end'] if concat_data else 0
-            total_durations.append(total_duration)
-            
-            # 计算元视频数量
-            video_count = len(concat_data)
-            video_counts.append(video_count)
-            
-            # 收集单个元视频时长
-            for video in concat_data:
-                duration = video['end'] - video['start']
-                single_video_durations.append(duration)
-        
-        # 输出统计信息
-        print("\n=== 拼接视频时长分布 ===")
-        print(f"总时长: {np.sum(total_durations):.2f} 秒 ({np.sum(total_durations)/3600:.2f} 小时)")
-        print(f"平均时长: {np.mean(total_durations):.2f} 秒")
-        print(f"最短时长: {np.min(total_durations):.2f} 秒")
-        print(f"最长时长: {np.max(total_durations):.2f} 秒")
-        print(f"时长中位数: {np.median(total_durations):.2f} 秒")
-        print(f"时长标准差: {np.std(total_durations):.2f} 秒")
-        
-        print("\n=== 元视频数量分布 ===")
-        video_count_counter = Counter(video_counts)
-        for count, freq in sorted(video_count_counter.items()):
-            print(f"包含 {count} 个元视频的拼接视频有 {freq} 个 ({freq/len(data)*100:.2f}%)")
-        print(f"平均每拼接视频包含元视频数: {np.mean(video_counts):.2f}")
-        print(f"最少元视频数: {np.min(video_counts)}")
-        print(f"最多元视频数: {np.max(video_counts)}")
-        
-        print("\n=== 元视频时长分布 ===")
-        print(f"平均时长: {np.mean(single_video_durations):.2f} 秒")
-        print(f"最短时长: {np.min(single_video_durations):.2f} 秒")
-        print(f"最长时长: {np.max(single_video_durations):.2f} 秒")
-        print(f"时长中位数: {np.median(single_video_durations):.2f} 秒")
-        print(f"时长标准差: {np.std(single_video_durations):.2f} 秒")
-        
-        # 按时长区间统计
-        duration_ranges = [0, 30, 60, 90, 120, 150, 180, 210, 240, float('inf')]
-        duration_labels = ['0-30s', '30-60s', '60-90s', '90-120s', '120-150s', '150-180s', '180-210s', '210-240s', '240s+']
-        
-        # 统计每个区间的数量
-        duration_counts = [0] * len(duration_ranges)
-        for duration in total_durations:
-            for i, range_limit in enumerate(duration_ranges):
-                if duration < range_limit:
-                    duration_counts[i] += 1
-                    break
-        
-        print("\n=== 拼接视频时长区间分布 ===")
-        for i, (label, count) in enumerate(zip(duration_labels, duration_counts)):
-            print(f"{label:8}: {count:4} ({count/len(data)*100:5.2f}%)")
-        
-        # 按元视频数量区间统计
-        count_ranges = list(range(1, 11)) + [float('inf')]
-        count_labels = [str(i) for i in range(1, 10)] + ['10+']
-        
-        # 统计每个区间的数量
-        count_counts = [0] * len(count_ranges)
-        for count in video_counts:
-            for i, range_limit in enumerate(count_ranges):
-                if count < range_limit:
-                    count_counts[i] += 1
-                    break
-        
-        print("\n=== 拼接视频包含元视频数量分布 ===")
-        for i, (label, count) in enumerate(zip(count_labels, count_counts)):
-            print(f"{label:>4}个元视频: {count:4} ({count/len(data)*100:5.2f}%)")
-            
-    finally:
-        # 恢复原始stdout
-        if output_file:
-            sys.stdout.close()
-            sys.stdout = original_stdout
+        with open(output_file, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if sketch_output:
+        with open(sketch_output, 'w', encoding='utf-8') as f:
+            json.dump({"summary": stats.summary(), "sketch": stats.to_dict()}, f, ensure_ascii=False)
+    return stats
+
 
 if __name__ == "__main__":
     import argparse
+    from stage_profile import StageProfiler, add_profile_arguments
+
     parser = argparse.ArgumentParser(description='分析拼接视频标注文件')
-    parser.add_argument('input_file', nargs='?', default="concatenated_video_annotations_cleaned.json", 
-                        help='输入的JSON文件路径')
+    parser.add_argument('input_file', nargs='*', default=["concatenated_video_annotations_cleaned.json"],
+                        help='输入的JSON/JSONL文件路径，可指定多个分片')
     parser.add_argument('-o', '--output', default=None, help='输出的文本文件路径')
-    
+    parser.add_argument('--num_workers', type=int, default=1, help='并行统计分片的进程数（默认：1）')
+    parser.add_argument('--save_sketch', default=None,
+                        help='将可合并的统计草图保存为JSON，供之后与其他分片的结果合并')
+    parser.add_argument('--merge_sketch', nargs='+', default=None,
+                        help='一并合并的已保存草图文件（可以不再指定输入文件）')
+    add_profile_arguments(parser)
+
     args = parser.parse_args()
-    
+
+    # 只合并草图时不读取默认输入文件
+    input_files = args.input_file
+    if args.merge_sketch and input_files == parser.get_default('input_file'):
+        input_files = []
+
     # 默认输出到txt文件
     output_file = args.output
     if output_file is None:
         # 如果没有指定输出文件，使用默认名称
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = f"concatenated_video_analysis_{timestamp}.txt"
-    
-    analyze_concatenated_videos(args.input_file, output_file)
-    print(f"分析完成，结果已保存到 {output_file}")
\ No newline at end of file
+
+    with StageProfiler.from_args("statistic", args) as profiler:
+        stats = analyze_concatenated_videos(input_files, output_file, args.num_workers,
+                                            args.save_sketch, args.merge_sketch)
+        profiler.add_items(stats.concat_count, "concats")
+    print(f"分析完成，结果已保存到 {output_file}")
@@ -0,0 +1,341 @@
+"""
+跨阶段数据集统计
+
+在一次并行处理中统计流水线各阶段的产物，输出文本报告和同名的 JSON 报告：
+- 拼接计划（concat_metadata.json）：每个视频的复用次数分布，并与 max_usage_ratio 对应的上限比较
+- 拼接标注（concatenated_video_annotations_cleaned.json）：时长与元视频数量分布
+- 训练对话（train_conversations.json）：每个样本的帧数、对话轮数和估计 token 长度，
+  列出最长的样本和超出 --max_seq_tokens 的样本数，便于在启动训练前发现会撑爆显存的序列
+
+每个文件（或分片）由一个工作进程顺序读取一遍，各阶段的统计可以合并。
+"""
+
+import os
+import sys
+import json
+import heapq
+from collections import Counter
+from datetime import datetime
+from multiprocessing import Pool
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from streaming_stats import DistributionSketch
+from analyze_concatenated_videos import analyze_file
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 与序列打包共用 token 估计，超出 --max_seq_tokens 的统计与打包预算一致
+sys.path.insert(0, os.path.join(sys.path[0], "conversation_maker"))
+from stream_io import iter_json_records
+from pack_conversations import estimate_sample_tokens
+
+TOKEN_EDGES = [0, 2048, 4096, 8192, 16384, 32768, 65536, 131072, float('inf')]
+TOKEN_LABELS = ['0-2K', '2K-4K', '4K-8K', '8K-16K', '16K-32K', '32K-64K', '64K-128K', '128K+']
+
+class PlanStats:
+    """拼接计划统计：每个视频的复用次数和每条拼接的视频数"""
+
+    def __init__(self):
+        self.concat_count = 0
+        self.video_usage = Counter()
+        self.videos_per_concat = DistributionSketch(exact_counts=True)
+        self.total_durations = DistributionSketch()
+        self._pending_counts: List[int] = []
+        self._pending_durations: List[float] = []
+
+    def update(self, plan: Dict[str, Any]):
+        videos = plan.get("videos") or [boundary["video_id"] for boundary in plan["boundaries"]]
+        self.concat_count += 1
+        self.video_usage.update(videos)
+        self._pending_counts.append(len(videos))
+        self._pending_durations.append(plan.get("total_duration", 0.0))
+        if len(self._pending_counts) >= 65536:
+            self.flush()
+
+    def flush(self):
+        self.videos_per_concat.update(np.asarray(self._pending_counts))
+        self.total_durations.update(np.asarray(self._pending_durations))
+        self._pending_counts, self._pending_durations = [], []
+
+    def merge(self, other: "PlanStats"):
+        self.flush()
+        other.flush()
+        self.concat_count += other.concat_count
+        self.video_usage.update(other.video_usage)
+        self.videos_per_concat.merge(other.videos_per_concat)
+        self.total_durations.merge(other.total_durations)
+
+    def summary(self, max_usage_ratio: float, top_k: int) -> Dict[str, Any]:
+        self.flush()
+        usage = DistributionSketch(exact_counts=True)
+        usage.update(np.fromiter(self.video_usage.values(), dtype=np.float64, count=len(self.video_usage)))
+        usage_cap = self.concat_count * max_usage_ratio
+        over_cap = [(video_id, count) for video_id, count in self.video_usage.items() if count > usage_cap]
+        max_usage = max(self.video_usage.values(), default=0)
+        return {
+            "concat_count": self.concat_count,
+            "unique_videos": len(self.video_usage),
+            "video_uses": sum(self.video_usage.values()),
+            "max_usage_ratio": max_usage_ratio,
+            "usage_cap": usage_cap,
+            "max_usage": max_usage,
+            "max_observed_ratio": max_usage / self.concat_count if self.concat_count else None,
+            "videos_over_cap": len(over_cap),
+            "most_used_videos": [{"video_id": video_id, "uses": count}
+                                 for video_id, count in self.video_usage.most_common(top_k)],
+            "usage": usage.summary(),
+            "videos_per_concat": self.videos_per_concat.summary(),
+            "total_durations": self.total_durations.summary(),
+        }
+
+
+class ConversationStats:
+    """训练对话统计：每个样本的帧数、对话轮数、回复数和估计 token 长度"""
+
+    def __init__(self, tokens_per_image: int, tokens_per_turn: int, max_seq_tokens: int, top_k: int):
+        self.tokens_per_image = tokens_per_image
+        self.tokens_per_turn = tokens_per_turn
+        self.max_seq_tokens = max_seq_tokens
+        self.top_k = top_k
+        self.frames = DistributionSketch()
+        self.turns = DistributionSketch()
+        self.responses = DistributionSketch()
+        self.tokens = DistributionSketch(TOKEN_EDGES, TOKEN_LABELS)
+        self.over_budget = 0
+        self.longest: List[Tuple[int, str]] = []
+        self._pending: List[Tuple[int, int, int, int]] = []
+
+    def sample_tokens(self, sample: Dict[str, Any]) -> int:
+        """估计一个样本的 token 长度，与 pack_conversations 的装箱预算使用同一估计"""
+        return estimate_sample_tokens(sample, self.tokens_per_image, self.tokens_per_turn)
+
+    def update(self, sample: Dict[str, Any]):
+        conversations = sample["conversations"]
+        responses = sum(1 for turn in conversations
+                        if turn["from"] == "gpt" and turn["value"].startswith("<|response|>"))
+        tokens = self.sample_tokens(sample)
+        self._pending.append((len(sample.get("images", [])), len(conversations), responses, tokens))
+        if tokens > self.max_seq_tokens:
+            self.over_budget += 1
+        if len(self.longest) < self.top_k:
+            heapq.heappush(self.longest, (tokens, sample.get("video", "")))
+        elif tokens > self.longest[0][0]:
+            heapq.heapreplace(self.longest, (tokens, sample.get("video", "")))
+        if len(self._pending) >= 65536:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        frames, turns, responses, tokens = np.asarray(self._pending, dtype=np.float64).T
+        self.frames.update(frames)
+        self.turns.update(turns)
+        self.responses.update(responses)
+        self.tokens.update(tokens)
+        self._pending = []
+
+    def merge(self, other: "ConversationStats"):
+        self.flush()
+        other.flush()
+        self.frames.merge(other.frames)
+        self.turns.merge(other.turns)
+        self.responses.merge(other.responses)
+        self.tokens.merge(other.tokens)
+        self.over_budget += other.over_budget
+        self.longest = heapq.nlargest(self.top_k, self.longest + other.longest)
+        heapq.heapify(self.longest)
+
+    def summary(self) -> Dict[str, Any]:
+        self.flush()
+        return {
+            "samples": self.tokens.moments.count,
+            "tokens_per_image": self.tokens_per_image,
+            "tokens_per_turn": self.tokens_per_turn,
+            "max_seq_tokens": self.max_seq_tokens,
+            "samples_over_budget": self.over_budget,
+            "longest_samples": [{"video": video, "estimated_tokens": tokens}
+                                for tokens, video in sorted(self.longest, reverse=True)],
+            "frames_per_sample": self.frames.summary(),
+            "turns_per_sample": self.turns.summary(),
+            "responses_per_sample": self.responses.summary(),
+            "estimated_tokens": self.tokens.summary(),
+        }
+
+
+def analyze_task(task: Tuple[str, str, Dict[str, Any]]) -> Tuple[str, Any]:
+    """
+    工作进程：顺序读取一个文件并返回对应阶段的统计
+
+    Args:
+        task: (阶段名, 文件路径, 统计参数)
+    """
+    kind, file_path, options = task
+    if kind == "annotations":
+        return kind, analyze_file(file_path)
+
+    stats = PlanStats() if kind == "concat_plan" else ConversationStats(**options)
+    for record in iter_json_records(file_path):
+        stats.update(record)
+    stats.flush()
+    return kind, stats
+
+
+def analyze_dataset(concat_plans: List[str],
+                    annotations: List[str],
+                    train_conversations: List[str],
+                    max_usage_ratio: float = 2.0,
+                    tokens_per_image: int = 256,
+                    tokens_per_turn: int = 4,
+                    max_seq_tokens: int = 32768,
+                    top_k: int = 10,
+                    num_workers: int = 4) -> Dict[str, Any]:
+    """
+    并行统计各阶段的产物
+
+    Args:
+        concat_plans: 拼接计划文件（或分片）路径列表
+        annotations: 拼接标注文件（或分片）路径列表
+        train_conversations: 训练对话文件（或分片）路径列表
+        max_usage_ratio: 规划时使用的复用上限比例
+        tokens_per_image: 每帧图像的估计 token 数
+        tokens_per_turn: 每轮对话的角色标记等额外 token 数
+        max_seq_tokens: 训练允许的最大序列长度
+        top_k: 列出的最常用视频和最长样本个数
+        num_workers: 工作进程数
+
+    Returns:
+        各阶段的统计汇总
+    """
+    conversation_options = {"tokens_per_image": tokens_per_image, "tokens_per_turn": tokens_per_turn,
+                            "max_seq_tokens": max_seq_tokens, "top_k": top_k}
+    tasks = ([("concat_plan", path, {}) for path in concat_plans] +
+             [("annotations", path, {}) for path in annotations] +
+             [("train_conversations", path, conversation_options) for path in train_conversations])
+
+    if num_workers > 1 and len(tasks) > 1:
+        with Pool(processes=min(num_workers, len(tasks))) as pool:
+            results = pool.map(analyze_task, tasks)
+    else:
+        results = [analyze_task(task) for task in tasks]
+
+    merged: Dict[str, Any] = {}
+    for kind, stats in results:
+        if kind in merged:
+            merged[kind].merge(stats)
+        else:
+            merged[kind] = stats
+
+    summary: Dict[str, Any] = {"generated_at": datetime.now().isoformat(timespec="seconds"),
+                               "inputs": {"concat_plan": concat_plans, "annotations": annotations,
+                                          "train_conversations": train_conversations}}
+    if "concat_plan" in merged:
+        summary["concat_plan"] = merged["concat_plan"].summary(max_usage_ratio, top_k)
+    if "annotations" in merged:
+        summary["annotations"] = merged["annotations"].summary()
+    if "train_conversations" in merged:
+        summary["train_conversations"] = merged["train_conversations"].summary()
+    return summary
+
+
+def _format_distribution(name: str, summary: Dict[str, Any], unit: str = "") -> str:
+    if not summary["count"]:
+        return f"{name}: 无数据"
+    return (f"{name}: 平均 {summary['mean']:.2f}{unit}，中位数 {summary['p50']:.2f}{unit}，"
+            f"P90 {summary['p90']:.2f}{unit}，P99 {summary['p99']:.2f}{unit}，"
+            f"最小 {summary['min']:.2f}{unit}，最大 {summary['max']:.2f}{unit}")
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    """将统计汇总格式化为文本报告"""
+    lines = []
+    plan = summary.get("concat_plan")
+    if plan:
+        lines.append("=== 拼接计划 ===")
+        lines.append(f"拼接视频数: {plan['concat_count']}，使用的视频数: {plan['unique_videos']}，"
+                     f"视频使用总次数: {plan['video_uses']}")
+        lines.append(_format_distribution("每条拼接的视频数", plan["videos_per_concat"]))
+        lines.append(_format_distribution("拼接视频时长", plan["total_durations"], " 秒"))
+        lines.append(_format_distribution("每个视频的复用次数", plan["usage"]))
+        lines.append(f"复用上限: {plan['usage_cap']:.1f} 次（max_usage_ratio={plan['max_usage_ratio']}），"
+                     f"最大复用 {plan['max_usage']} 次（比例 {plan['max_observed_ratio'] or 0:.4f}），"
+                     f"超出上限的视频 {plan['videos_over_cap']} 个")
+        lines.append("复用次数分布:")
+        usage_counts = plan["usage"].get("value_counts", {})
+        for uses, videos in usage_counts.items():
+            lines.append(f"  使用 {uses} 次: {videos} 个视频")
+        lines.append("最常用的视频: " + ", ".join(f"{item['video_id']}({item['uses']})"
+                                               for item in plan["most_used_videos"]))
+
+    annotations = summary.get("annotations")
+    if annotations:
+        lines.append("\n=== 拼接标注 ===")
+        lines.append(f"拼接视频数: {annotations['concat_videos']}")
+        lines.append(_format_distribution("拼接视频时长", annotations["total_durations"], " 秒"))
+        lines.append(_format_distribution("每个拼接视频的元视频数", annotations["video_counts"]))
+        lines.append(_format_distribution("元视频时长", annotations["single_video_durations"], " 秒"))
+
+    conversations = summary.get("train_conversations")
+    if conversations:
+        total = conversations["samples"]
+        lines.append("\n=== 训练对话 ===")
+        lines.append(f"样本数: {total}")
+        lines.append(_format_distribution("每个样本的帧数", conversations["frames_per_sample"]))
+        lines.append(_format_distribution("每个样本的对话轮数", conversations["turns_per_sample"]))
+        lines.append(_format_distribution("每个样本的回复数", conversations["responses_per_sample"]))
+        lines.append(_format_distribution("估计 token 长度", conversations["estimated_tokens"]))
+        lines.append(f"（按每帧 {conversations['tokens_per_image']} token、每轮 {conversations['tokens_per_turn']} "
+                     f"token 额外开销估计）")
+        lines.append("估计 token 长度区间分布:")
+        for label, count in conversations["estimated_tokens"].get("histogram", {}).items():
+            lines.append(f"  {label:>9}: {count:6} ({count / max(total, 1) * 100:5.2f}%)")
+        lines.append(f"超出 {conversations['max_seq_tokens']} token 的样本: {conversations['samples_over_budget']} 个")
+        lines.append("最长的样本: " + ", ".join(f"{item['video']}({item['estimated_tokens']})"
+                                              for item in conversations["longest_samples"]))
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='跨阶段数据集统计：拼接计划复用、标注分布和训练序列长度')
+    parser.add_argument('--concat_plan', nargs='+', default=[], help='拼接计划文件路径，可指定多个分片')
+    parser.add_argument('--annotations', nargs='+', default=[], help='拼接标注文件路径，可指定多个分片')
+    parser.add_argument('--train_conversations', nargs='+', default=[], help='训练对话文件路径，可指定多个分片')
+    parser.add_argument('--max_usage_ratio', type=float, default=2.0,
+                        help='规划时使用的 max_usage_ratio，用于计算复用上限（默认：2.0）')
+    parser.add_argument('--tokens_per_image', type=int, default=256, help='每帧图像的估计 token 数（默认：256）')
+    parser.add_argument('--tokens_per_turn', type=int, default=4, help='每轮对话的额外 token 数（默认：4）')
+    parser.add_argument('--max_seq_tokens', type=int, default=32768, help='训练允许的最大序列长度（默认：32768）')
+    parser.add_argument('--top_k', type=int, default=10, help='列出的最常用视频和最长样本个数（默认：10）')
+    parser.add_argument('--num_workers', type=int, default=4, help='并行处理文件的进程数（默认：4）')
+    parser.add_argument('-o', '--output', default=None, help='输出的文本报告路径')
+    parser.add_argument('--json_output', default=None, help='输出的 JSON 报告路径（默认：与文本报告同名的 .json）')
+
+    args = parser.parse_args()
+
+    if not (args.concat_plan or args.annotations or args.train_conversations):
+        parser.error('至少需要指定 --concat_plan、--annotations、--train_conversations 之一')
+
+    output_file = args.output
+    if output_file is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = f"dataset_analysis_{timestamp}.txt"
+    json_output = args.json_output or os.path.splitext(output_file)[0] + ".json"
+
+    summary = analyze_dataset(args.concat_plan, args.annotations, args.train_conversations,
+                              max_usage_ratio=args.max_usage_ratio,
+                              tokens_per_image=args.tokens_per_image,
+                              tokens_per_turn=args.tokens_per_turn,
+                              max_seq_tokens=args.max_seq_tokens,
+                              top_k=args.top_k,
+                              num_workers=args.num_workers)
+
+    with open(output_file, 'w') as f:
+        f.write(format_report(summary) + "\n")
+    with open(json_output, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"分析完成，文本报告已保存到 {output_file}，JSON 报告已保存到 {json_output}")
+
+
+if __name__ == "__main__":
+    main()
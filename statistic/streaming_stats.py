@@ -0,0 +1,298 @@
+"""
+流式统计引擎
+
+提供可合并的统计草图（sketch），数据只需顺序读取一遍，内存占用与数据量无关：
+- RunningMoments：在线计算数量、总和、均值、方差、最值（Chan 并行合并公式）
+- TDigest：近似分位数（merging t-digest）
+- FixedHistogram：固定区间直方图（np.searchsorted 向量化分桶）
+- DistributionSketch：以上三者的组合，可选精确计数离散取值
+
+各草图都支持 update（按批追加 numpy 数组）、merge（合并另一分片的草图）以及
+to_dict / from_dict（序列化为 JSON），分片数据可以并行统计后再合并。
+"""
+
+import math
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+
+class RunningMoments:
+    """在线均值、方差与最值"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        batch = RunningMoments()
+        batch.count = len(values)
+        batch.total = float(values.sum())
+        batch.mean = batch.total / batch.count
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other: "RunningMoments"):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        """总体标准差（与 np.std 一致）"""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "total": self.total, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunningMoments":
+        moments = cls()
+        moments.count = data["count"]
+        moments.total = data["total"]
+        moments.mean = data["mean"]
+        moments.m2 = data["m2"]
+        if moments.count:
+            moments.min = data["min"]
+            moments.max = data["max"]
+        return moments
+
+
+class TDigest:
+    """
+    Merging t-digest 近似分位数
+
+    新数据先进入缓冲区，缓冲区满时与已有质心一起排序，按 k1 尺度函数
+    k(q) = δ/(2π)·asin(2q-1) 向量化地把相邻点归入同一质心：每个质心覆盖的 k 值跨度
+    不超过 1，因此两端的质心更小，尾部分位数更精确。
+    """
+
+    def __init__(self, compression: float = 200, buffer_size: int = 50000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[np.ndarray] = []
+        self._buffered = 0
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + self._buffered
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        if len(other.weights) == 0:
+            # 对方只有缓冲数据时直接并入缓冲区，小数据量时保持精确
+            for values in other._buffer:
+                self.update(values)
+            return
+        other._compress()
+        if len(other.weights) == 0:
+            return
+        self._compress()
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(other.means, other.weights)
+
+    def _compress(self, extra_means: Optional[np.ndarray] = None, extra_weights: Optional[np.ndarray] = None):
+        means = [self.means] + self._buffer
+        weights = [self.weights] + [np.ones(len(values)) for values in self._buffer]
+        if extra_means is not None:
+            means.append(extra_means)
+            weights.append(extra_weights)
+        self._buffer = []
+        self._buffered = 0
+        means = np.concatenate(means)
+        weights = np.concatenate(weights)
+        if len(means) == 0:
+            return
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        scale = self.compression / (2 * math.pi) * np.arcsin(2 * q_left - 1) + self.compression / 4
+        groups = np.floor(scale).astype(np.int64)
+        starts = np.r_[0, np.flatnonzero(np.diff(groups)) + 1]
+
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        估计 q 分位数
+
+        Args:
+            q: 0 到 1 之间的分位点
+
+        Returns:
+            分位数估计值；没有数据时为 None
+        """
+        # 数据量不超过缓冲区时直接计算精确分位数
+        if len(self.weights) == 0 and self._buffer:
+            return float(np.quantile(np.concatenate(self._buffer), q))
+        self._compress()
+        if len(self.weights) == 0:
+            return None
+        if len(self.weights) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.r_[0.0, centers, total]
+        values = np.r_[self.min, self.means, self.max]
+        return float(np.interp(q * total, positions, values))
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._compress()
+        return {"compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist(),
+                "min": self.min if len(self.weights) else None, "max": self.max if len(self.weights) else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        digest = cls(compression=data["compression"])
+        digest.means = np.asarray(data["means"], dtype=np.float64)
+        digest.weights = np.asarray(data["weights"], dtype=np.float64)
+        if len(digest.weights):
+            digest.min = data["min"]
+            digest.max = data["max"]
+        return digest
+
+
+class FixedHistogram:
+    """固定区间直方图，区间为左闭右开 [edges[i], edges[i+1])"""
+
+    def __init__(self, edges: Sequence[float], labels: Optional[Sequence[str]] = None):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.labels = list(labels) if labels else [f"{lo:g}-{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])]
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+    def update(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        bins = np.searchsorted(self.edges, values, side="right") - 1
+        valid = (bins >= 0) & (bins < len(self.counts))
+        self.counts += np.bincount(bins[valid], minlength=len(self.counts))
+
+    def merge(self, other: "FixedHistogram"):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different edges")
+        self.counts += other.counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"edges": [edge if math.isfinite(edge) else None for edge in self.edges.tolist()],
+                "labels": self.labels, "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FixedHistogram":
+        histogram = cls([math.inf if edge is None else edge for edge in data["edges"]], data["labels"])
+        histogram.counts = np.asarray(data["counts"], dtype=np.int64)
+        return histogram
+
+
+class DistributionSketch:
+    """
+    一个数值分布的组合草图：矩统计 + t-digest 分位数 + 可选的固定区间直方图与离散取值计数
+    """
+
+    QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+    def __init__(self,
+                 edges: Optional[Sequence[float]] = None,
+                 labels: Optional[Sequence[str]] = None,
+                 exact_counts: bool = False,
+                 compression: float = 200):
+        """
+        Args:
+            edges: 可选的直方图区间边界
+            labels: 直方图区间标签
+            exact_counts: 是否精确统计每个取值的出现次数（只适用于取值种类很少的整数分布）
+            compression: t-digest 压缩参数，越大越精确
+        """
+        self.moments = RunningMoments()
+        self.digest = TDigest(compression)
+        self.histogram = FixedHistogram(edges, labels) if edges is not None else None
+        self.value_counts: Optional[Dict[int, int]] = {} if exact_counts else None
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        self.moments.update(values)
+        self.digest.update(values)
+        if self.histogram is not None:
+            self.histogram.update(values)
+        if self.value_counts is not None:
+            keys, counts = np.unique(values.astype(np.int64), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                self.value_counts[key] = self.value_counts.get(key, 0) + count
+
+    def merge(self, other: "DistributionSketch"):
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+        if self.histogram is not None:
+            self.histogram.merge(other.histogram)
+        if self.value_counts is not None:
+            for key, count in other.value_counts.items():
+                self.value_counts[key] = self.value_counts.get(key, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.digest.quantile(q)
+
+    def summary(self) -> Dict[str, Any]:
+        """便于阅读的汇总（不含草图内部状态）"""
+        summary = {"count": self.moments.count, "sum": self.moments.total,
+                   "mean": self.moments.mean if self.moments.count else None,
+                   "std": self.moments.std if self.moments.count else None,
+                   "min": self.moments.min if self.moments.count else None,
+                   "max": self.moments.max if self.moments.count else None}
+        for q in self.QUANTILES:
+            summary[f"p{int(q * 100)}"] = self.quantile(q)
+        if self.histogram is not None:
+            summary["histogram"] = dict(zip(self.histogram.labels, self.histogram.counts.tolist()))
+        if self.value_counts is not None:
+            summary["value_counts"] = {str(key): count for key, count in sorted(self.value_counts.items())}
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"moments": self.moments.to_dict(), "digest": self.digest.to_dict(),
+                "histogram": self.histogram.to_dict() if self.histogram is not None else None,
+                "value_counts": ({str(key): count for key, count in self.value_counts.items()}
+                                 if self.value_counts is not None else None)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DistributionSketch":
+        sketch = cls()
+        sketch.moments = RunningMoments.from_dict(data["moments"])
+        sketch.digest = TDigest.from_dict(data["digest"])
+        if data["histogram"] is not None:
+            sketch.histogram = FixedHistogram.from_dict(data["histogram"])
+        if data["value_counts"] is not None:
+            sketch.value_counts = {int(key): count for key, count in data["value_counts"].items()}
+        return sketch
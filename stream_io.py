@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+流式执行的文件接口：各步骤通过只追加的 JSONL 文件相连
+
+生产者每写完一条记录就追加一行并立即刷新，全部写完后创建 <path>.done 完成标记；
+消费者从上次读到的位置继续读取新追加的完整行，直到看到完成标记且文件已读完。
+中间文件本身就是步骤之间的缓冲区，生产者和消费者不需要同时在线。
+
+生产者异常退出时创建 <path>.failed 失败标记（内容为出错原因），消费者看到后抛出
+UpstreamFailed 结束，而不是一直等待永远不会出现的完成标记。
+
+iter_raw_records / iter_json_records 逐条读取已写完的 JSONL 或大型 JSON 数组文件，
+不会一次性载入内存，供批量模式的各步骤共用。
+"""
+
+import os
+import re
+import json
+import time
+from typing import List, Dict, Any, Iterator, Optional, TextIO
+
+DONE_SUFFIX = ".done"
+FAILED_SUFFIX = ".failed"
+
+_CONTAINER_TOKEN = re.compile(r'[\[\]{}"]')
+_STRING_TOKEN = re.compile(r'["\\]')
+
+
+class UpstreamFailed(RuntimeError):
+    """上游生产者异常退出，流文件不会再写完"""
+
+
+def done_marker(path: str) -> str:
+    """完成标记文件路径"""
+    return path + DONE_SUFFIX
+
+
+def is_done(path: str) -> bool:
+    """生产者是否已写完该文件"""
+    return os.path.exists(done_marker(path))
+
+
+def failed_marker(path: str) -> str:
+    """失败标记文件路径"""
+    return path + FAILED_SUFFIX
+
+
+def is_failed(path: str) -> bool:
+    """生产者是否已异常退出"""
+    return os.path.exists(failed_marker(path))
+
+
+def reset_stream(path: str):
+    """删除上一次运行留下的流文件、完成标记和失败标记"""
+    for stale in (path, done_marker(path), failed_marker(path)):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+def mark_done(path: str):
+    """创建完成标记"""
+    with open(done_marker(path), 'w', encoding='utf-8') as f:
+        f.write(f"{time.time():.3f}\n")
+
+
+def mark_failed(path: str, reason: str = ""):
+    """创建失败标记，记录出错原因"""
+    with open(failed_marker(path), 'w', encoding='utf-8') as f:
+        f.write(f"{time.time():.3f} {reason}\n")
+
+
+class JsonlAppender:
+    """
+    只追加的 JSONL 写入器，每批记录写完后立即刷新，关闭时创建完成标记
+
+    作为上下文管理器使用时，异常退出会创建失败标记。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        reset_stream(path)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record: Dict[str, Any]):
+        """追加一条记录"""
+        self.write_lines([json.dumps(record, ensure_ascii=False)])
+
+    def write_lines(self, lines: List[str]):
+        """追加若干条已序列化为单行 JSON 的记录"""
+        if not lines:
+            return
+        self._file.write("".join(line + "\n" for line in lines))
+        self._file.flush()
+        self.count += len(lines)
+
+    def close(self):
+        """关闭文件并创建完成标记；重复调用无效果"""
+        if self._file.closed:
+            return
+        self._file.close()
+        mark_done(self.path)
+
+    def fail(self, reason: str = ""):
+        """关闭文件并创建失败标记"""
+        if self._file.closed:
+            return
+        self._file.close()
+        mark_failed(self.path, reason)
+
+    def __enter__(self) -> "JsonlAppender":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 异常退出时创建失败标记而不是完成标记，消费者不会把不完整的文件当作已写完
+        if exc_type is None:
+            self.close()
+        else:
+            self.fail(f"{exc_type.__name__}: {exc}")
+
+
+class JsonlFollower:
+    """
+    跟随读取只追加的 JSONL 文件
+
+    每次 poll() 返回自上次调用以来新追加的完整行；行尾尚未写完的部分留到下一次。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.finished = False
+        self._file = None
+        self._partial = ""
+
+    def poll(self) -> List[str]:
+        """
+        读取新追加的完整行
+
+        Returns:
+            非空行列表（原始 JSON 文本，不含换行）
+
+        Raises:
+            UpstreamFailed: 生产者已异常退出
+        """
+        if self.finished:
+            return []
+        # 先检查完成标记再读取：标记创建前写入的内容都会在这次读到
+        done = is_done(self.path)
+        if not done and is_failed(self.path):
+            with open(failed_marker(self.path), 'r', encoding='utf-8') as f:
+                # 标记内容为 "<时间戳> <原因>"
+                reason = f.read().strip().partition(" ")[2]
+            raise UpstreamFailed(f"Upstream producer of {self.path} failed: {reason}")
+        if self._file is None:
+            if not os.path.exists(self.path):
+                return []
+            self._file = open(self.path, 'r', encoding='utf-8')
+
+        data = self._partial + self._file.read()
+        lines = data.split("\n")
+        self._partial = lines.pop()
+        if done:
+            if self._partial.strip():
+                lines.append(self._partial)
+            self._partial = ""
+            self._file.close()
+            self.finished = True
+
+        lines = [line for line in lines if line.strip()]
+        self.count += len(lines)
+        return lines
+
+    def batches(self, poll_interval: float = 0.5, max_batch: Optional[int] = None) -> Iterator[List[str]]:
+        """
+        持续产出新追加的行，直到生产者写完
+
+        Args:
+            poll_interval: 没有新数据时的等待间隔（秒）
+            max_batch: 每批最多的行数，None 表示不限制
+
+        Yields:
+            非空的行列表
+        """
+        while not self.finished:
+            lines = self.poll()
+            if not lines:
+                if not self.finished:
+                    time.sleep(poll_interval)
+                continue
+            step = max_batch or len(lines)
+            for start in range(0, len(lines), step):
+                yield lines[start:start + step]
+
+
+def follow_records(path: str, poll_interval: float = 0.5) -> Iterator[Dict[str, Any]]:
+    """逐条产出流文件中解析后的记录，直到生产者写完"""
+    for lines in JsonlFollower(path).batches(poll_interval):
+        for line in lines:
+            yield json.loads(line)
+
+
+def iter_json_array_records(f: TextIO, chunk_size: int = 1 << 22) -> Iterator[str]:
+    """
+    逐条产出顶层 JSON 数组中每个元素的原始文本
+
+    只扫描括号和字符串边界来定位元素，不解析内容，解析留给工作进程并行完成。
+
+    Args:
+        f: 以文本模式打开的 JSON 文件
+        chunk_size: 每次读取的字符数
+
+    Yields:
+        每个数组元素（对象或数组）的 JSON 文本
+    """
+    buffer = f.read(chunk_size)
+    pos = len(buffer) - len(buffer.lstrip())
+    if not buffer[pos:pos + 1] == "[":
+        raise ValueError("输入不是 JSON 数组")
+    pos += 1
+
+    depth = 0
+    start = None
+    in_string = False
+    while True:
+        match = (_STRING_TOKEN if in_string else _CONTAINER_TOKEN).search(buffer, pos)
+        if match is not None:
+            token = match.group()
+            pos = match.end()
+            if in_string:
+                if token == "\\":
+                    # 跳过被转义的字符
+                    pos += 1
+                else:
+                    in_string = False
+            elif token == '"':
+                if depth == 0:
+                    raise ValueError("数组元素必须为对象或数组")
+                in_string = True
+            elif token in "{[":
+                if depth == 0:
+                    start = match.start()
+                depth += 1
+            elif depth == 0:
+                # 顶层数组结束
+                return
+            else:
+                depth -= 1
+                if depth == 0:
+                    yield buffer[start:pos]
+                    start = None
+            continue
+
+        # 当前缓冲区已扫描完，丢弃已处理的部分并读取下一块
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError("JSON 数组不完整")
+        keep_from = start if start is not None else min(pos, len(buffer))
+        buffer = buffer[keep_from:] + chunk
+        pos -= keep_from
+        if start is not None:
+            start = 0
+
+
+def iter_raw_records(input_file: str) -> Iterator[str]:
+    """
+    逐条产出输入文件中每条记录的 JSON 文本，自动识别 JSONL 和 JSON 数组
+
+    Args:
+        input_file: 输入文件路径
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        first = ""
+        while not first:
+            char = f.read(1)
+            if not char:
+                return
+            first = char.strip()
+        f.seek(0)
+
+        if first == "[":
+            yield from iter_json_array_records(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def iter_json_records(input_file: str) -> Iterator[Any]:
+    """逐条产出输入文件（JSONL 或 JSON 数组）中解析后的记录"""
+    for raw in iter_raw_records(input_file):
+        yield json.loads(raw)
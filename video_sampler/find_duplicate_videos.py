@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Video Finder
+
+Groups re-uploads and trimmed copies of the same clip using the frames that
+sample_videos.py has already written:
+
+1. Each video gets a signature of up to --frames_per_video perceptual hashes
+   (64-bit DCT pHash of evenly spaced sampled frames; flat frames are skipped)
+2. Frame hashes are indexed in several locality-sensitive hash tables, each
+   keyed by a random subset of the hash bits, so only videos sharing at least
+   one table bucket are compared (no all-pairs comparison)
+3. Candidate pairs are verified by the fraction of frames of one video that
+   have a close match (Hamming distance) in the other
+4. Verified pairs are merged into clusters with union-find
+
+The resulting duplicate_clusters.json can be passed to concat_planer.py with
+--duplicate_clusters to exclude or co-limit the members of each cluster.
+"""
+
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool, cpu_count
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from frame_metadata import iter_frames, load_video_metadata
+
+
+def frame_phash(frame_path, min_std=5.0):
+    """
+    Compute the 64-bit perceptual hash of a frame.
+
+    Args:
+        frame_path (str): Path to the frame image
+        min_std (float): Frames with a lower grayscale standard deviation
+            (black, white or flat frames) are skipped
+
+    Returns:
+        int: The hash, or None if the frame is unreadable or flat
+    """
+    image = cv2.imread(frame_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    if small.std() < min_std:
+        return None
+
+    # Low-frequency DCT coefficients compared with their median (DC term excluded)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_video_frames(task):
+    """
+    Worker: hash the selected frames of one video.
+
+    Args:
+        task (tuple): (video index, list of frame paths)
+
+    Returns:
+        tuple: (video index, list of frame hashes)
+    """
+    index, frame_paths = task
+    hashes = []
+    for frame_path in frame_paths:
+        frame_hash = frame_phash(frame_path)
+        if frame_hash is not None:
+            hashes.append(frame_hash)
+    return index, hashes
+
+
+def select_frame_paths(video_metadata, frames_per_video):
+    """Paths of up to frames_per_video evenly spaced frames of a video entry."""
+    frames = list(iter_frames(video_metadata))
+    if len(frames) <= frames_per_video:
+        return [frame["path"] for frame in frames]
+    positions = np.linspace(0, len(frames) - 1, frames_per_video).round().astype(int)
+    return [frames[position]["path"] for position in positions]
+
+
+def compute_signatures(videos, frames_per_video, num_workers):
+    """
+    Hash the frames of all videos in parallel.
+
+    Returns:
+        tuple: (signatures, valid) arrays of shape (num_videos, frames_per_video);
+            signatures holds the uint64 frame hashes, valid marks the filled slots
+    """
+    signatures = np.zeros((len(videos), frames_per_video), dtype=np.uint64)
+    valid = np.zeros((len(videos), frames_per_video), dtype=bool)
+
+    tasks = ((index, select_frame_paths(video, frames_per_video)) for index, video in enumerate(videos))
+    with Pool(processes=num_workers) as pool:
+        for index, hashes in tqdm(pool.imap_unordered(hash_video_frames, tasks, chunksize=64),
+                                  total=len(videos), desc="Hashing frames"):
+            signatures[index, :len(hashes)] = hashes
+            valid[index, :len(hashes)] = True
+
+    return signatures, valid
+
+
+def load_signature_cache(cache_path, video_names, frames_per_video):
+    """Load cached signatures if they were computed for the same videos and settings."""
+    if not cache_path or not os.path.isfile(cache_path):
+        return None
+    cache = np.load(cache_path)
+    if cache["signatures"].shape[1] != frames_per_video or list(cache["video_names"]) != video_names:
+        return None
+    return cache["signatures"], cache["valid"]
+
+
+def popcount64(values):
+    """Number of set bits of each element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(values.shape + (8,)), axis=-1).sum(axis=-1)
+
+
+def lsh_candidate_pairs(signatures, valid, num_tables, bits_per_table, max_bucket_size, seed):
+    """
+    Find candidate video pairs that share a bucket in at least one hash table.
+
+    Each table keys every frame hash by bits_per_table randomly chosen bits, so
+    two frames within a small Hamming distance are likely to collide in some
+    table while unrelated frames rarely do. Buckets larger than max_bucket_size
+    (logos, title cards and other frames shared by many videos) are ignored.
+
+    Returns:
+        np.ndarray: Unique candidate pairs (i, j) with i < j, shape (num_pairs, 2)
+    """
+    rng = np.random.default_rng(seed)
+    num_videos, frames_per_video = signatures.shape
+    frame_hashes = signatures[valid]
+    frame_videos = np.repeat(np.arange(num_videos, dtype=np.int64), frames_per_video)[valid.ravel()]
+
+    pair_keys = []
+    for _ in range(num_tables):
+        positions = rng.choice(64, size=bits_per_table, replace=False)
+        keys = np.zeros(len(frame_hashes), dtype=np.uint64)
+        for bit, position in enumerate(positions):
+            keys |= ((frame_hashes >> np.uint64(position)) & np.uint64(1)) << np.uint64(bit)
+
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        sorted_videos = frame_videos[order]
+        run_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        run_ends = np.r_[run_starts[1:], len(sorted_keys)]
+        run_sizes = run_ends - run_starts
+
+        # Buckets of two frames (most of them) are handled without a Python loop
+        first = sorted_videos[run_starts[run_sizes == 2]]
+        second = sorted_videos[run_starts[run_sizes == 2] + 1]
+        distinct = first != second
+        first, second = first[distinct], second[distinct]
+        pair_keys.append(np.minimum(first, second) * num_videos + np.maximum(first, second))
+
+        for start, end in zip(run_starts[run_sizes > 2], run_ends[run_sizes > 2]):
+            members = np.unique(sorted_videos[start:end])
+            if len(members) < 2 or len(members) > max_bucket_size:
+                continue
+            first, second = np.triu_indices(len(members), k=1)
+            pair_keys.append(members[first] * num_videos + members[second])
+
+    if not pair_keys:
+        return np.zeros((0, 2), dtype=np.int64)
+    pair_keys = np.unique(np.concatenate(pair_keys))
+    return np.stack([pair_keys // num_videos, pair_keys % num_videos], axis=1)
+
+
+def verify_pairs(pairs, signatures, valid, max_hamming, min_match_ratio, chunk_size=20000):
+    """
+    Keep candidate pairs whose frames match closely enough.
+
+    A frame matches if the other video has a frame within max_hamming bits.
+    The pair is a duplicate if, for either video, at least min_match_ratio of
+    its frames match; trimmed copies are thus caught through the shorter clip.
+
+    Returns:
+        np.ndarray: Verified duplicate pairs
+    """
+    verified = []
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start:start + chunk_size]
+        a_hashes, b_hashes = signatures[chunk[:, 0]], signatures[chunk[:, 1]]
+        a_valid, b_valid = valid[chunk[:, 0]], valid[chunk[:, 1]]
+
+        distances = popcount64(a_hashes[:, :, None] ^ b_hashes[:, None, :])
+        close = (distances <= max_hamming) & a_valid[:, :, None] & b_valid[:, None, :]
+
+        a_ratio = close.any(axis=2).sum(axis=1) / np.maximum(a_valid.sum(axis=1), 1)
+        b_ratio = close.any(axis=1).sum(axis=1) / np.maximum(b_valid.sum(axis=1), 1)
+        verified.append(chunk[np.maximum(a_ratio, b_ratio) >= min_match_ratio])
+
+    if not verified:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.concatenate(verified)
+
+
+def cluster_pairs(num_videos, pairs):
+    """
+    Merge duplicate pairs into clusters with union-find.
+
+    Returns:
+        list: Clusters of at least two video indices
+    """
+    parent = list(range(num_videos))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in pairs.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = {}
+    for a, b in pairs.tolist():
+        for node in (a, b):
+            clusters.setdefault(find(node), set()).add(node)
+    return [sorted(members) for members in clusters.values()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate videos from their sampled frames")
+    parser.add_argument("--metadata_path", required=True,
+                        help="video_metadata.json written by sample_videos.py (full or compact)")
+    parser.add_argument("--output_path", required=True, help="Path to output duplicate_clusters.json")
+    parser.add_argument("--frames_per_video", type=int, default=16,
+                        help="Evenly spaced frames hashed per video (default: 16)")
+    parser.add_argument("--num_tables", type=int, default=8,
+                        help="Number of LSH tables (default: 8)")
+    parser.add_argument("--bits_per_table", type=int, default=28,
+                        help="Hash bits per LSH table key; fewer bits find more distant matches but "
+                             "produce more candidate pairs (default: 28)")
+    parser.add_argument("--max_hamming", type=int, default=10,
+                        help="Maximum Hamming distance between matching frame hashes (default: 10)")
+    parser.add_argument("--min_match_ratio", type=float, default=0.5,
+                        help="Fraction of a video's frames that must match the other video (default: 0.5)")
+    parser.add_argument("--max_bucket_size", type=int, default=200,
+                        help="Ignore LSH buckets shared by more videos than this (default: 200)")
+    parser.add_argument("--signature_cache", default=None,
+                        help="Optional .npz file to store frame hashes and reuse them on later runs")
+    parser.add_argument("--num_workers", type=int, default=None,
+                        help="Number of worker processes (default: number of CPU cores)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the LSH tables (default: 42)")
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(os.path.abspath(args.metadata_path)):
+        print(f"Error: Metadata file '{args.metadata_path}' does not exist")
+        sys.exit(1)
+    if not 1 <= args.bits_per_table <= 64:
+        parser.error("--bits_per_table must be between 1 and 64")
+
+    videos = load_video_metadata(args.metadata_path)
+    video_names = [video["video_name"] for video in videos]
+    print(f"Loaded {len(videos)} videos")
+
+    cached = load_signature_cache(args.signature_cache, video_names, args.frames_per_video)
+    if cached is not None:
+        signatures, valid = cached
+        print(f"Loaded frame hashes from {args.signature_cache}")
+    else:
+        signatures, valid = compute_signatures(videos, args.frames_per_video, args.num_workers or cpu_count())
+        if args.signature_cache:
+            np.savez(args.signature_cache, signatures=signatures, valid=valid, video_names=np.array(video_names))
+            print(f"Saved frame hashes to {args.signature_cache}")
+
+    candidates = lsh_candidate_pairs(signatures, valid, args.num_tables, args.bits_per_table,
+                                     args.max_bucket_size, args.seed)
+    print(f"Candidate pairs: {len(candidates)}")
+    duplicates = verify_pairs(candidates, signatures, valid, args.max_hamming, args.min_match_ratio)
+    print(f"Verified duplicate pairs: {len(duplicates)}")
+
+    clusters = []
+    for members in cluster_pairs(len(videos), duplicates):
+        # Keep the longest video of each cluster as its representative
+        representative = max(members, key=lambda index: (videos[index].get("duration_sec", 0), -index))
+        clusters.append({
+            "cluster_id": len(clusters),
+            "representative": video_names[representative],
+            "videos": [video_names[index] for index in members]
+        })
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_path)), exist_ok=True)
+    with open(os.path.abspath(args.output_path), 'w') as f:
+        json.dump(clusters, f, indent=2)
+
+    duplicate_count = sum(len(cluster["videos"]) - 1 for cluster in clusters)
+    print(f"Found {len(clusters)} duplicate clusters ({duplicate_count} redundant videos)")
+    print(f"Clusters saved to: {os.path.abspath(args.output_path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Frame Metadata Accessors
+
+Helpers for the two video_metadata.json layouts written by sample_videos.py:
+
+- full: every video entry carries a "frames" list with frame_index,
+  timestamp_sec and an absolute path for each sampled frame
+- compact: the "frames" list is dropped; frame paths follow from frame_dir and
+  the frame index, timestamps from frame_index * sampling_interval, and only
+  timestamps that differ from that grid are stored in "timestamp_overrides"
+
+Only the standard library is used, so downstream stages can import this module
+without OpenCV.
+"""
+
+import json
+import os
+
+
+def frame_filename(frame_index):
+    """File name of a sampled frame."""
+    return f"frame_{frame_index:05d}.jpg"
+
+
+def is_compact(video_metadata):
+    """Whether a video entry uses the compact layout."""
+    return "frames" not in video_metadata
+
+
+def compact_video_metadata(video_metadata):
+    """
+    Convert a full video entry to the compact layout.
+
+    Args:
+        video_metadata (dict): Video entry with a "frames" list
+
+    Returns:
+        dict: Video entry without "frames"; irregular timestamps are kept in
+            "timestamp_overrides" keyed by the frame index as a string
+    """
+    if is_compact(video_metadata):
+        return video_metadata
+
+    compact = {key: value for key, value in video_metadata.items() if key != "frames"}
+    sampling_interval = video_metadata["sampling_interval"]
+    overrides = {}
+    for frame in video_metadata["frames"]:
+        if frame["timestamp_sec"] != frame["frame_index"] * sampling_interval:
+            overrides[str(frame["frame_index"])] = frame["timestamp_sec"]
+
+    compact["sampled_frames"] = len(video_metadata["frames"])
+    if overrides:
+        compact["timestamp_overrides"] = overrides
+    return compact
+
+
+def get_frame(video_metadata, frame_index):
+    """
+    Rebuild the metadata of one frame.
+
+    Args:
+        video_metadata (dict): Video entry in either layout
+        frame_index (int): Index of the frame
+
+    Returns:
+        dict: frame_index, timestamp_sec and path of the frame
+    """
+    if not is_compact(video_metadata):
+        return video_metadata["frames"][frame_index]
+
+    overrides = video_metadata.get("timestamp_overrides", {})
+    timestamp = overrides.get(str(frame_index), frame_index * video_metadata["sampling_interval"])
+    return {
+        "frame_index": frame_index,
+        "timestamp_sec": timestamp,
+        "path": os.path.join(video_metadata["frame_dir"], frame_filename(frame_index))
+    }
+
+
+def iter_frames(video_metadata):
+    """
+    Lazily yield the frames of a video entry in either layout.
+
+    Yields:
+        dict: frame_index, timestamp_sec and path of each frame in order
+    """
+    if not is_compact(video_metadata):
+        yield from video_metadata["frames"]
+        return
+
+    for frame_index in range(video_metadata["sampled_frames"]):
+        yield get_frame(video_metadata, frame_index)
+
+
+def load_video_metadata(metadata_path):
+    """
+    Load video_metadata.json in either layout.
+
+    Args:
+        metadata_path (str): Path to the metadata file
+
+    Returns:
+        list: Video entries; use iter_frames/get_frame to access frames
+    """
+    with open(os.path.abspath(metadata_path), 'r') as f:
+        return json.load(f)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Broken Video Fixture Generator
+
+Creates a directory of deliberately damaged MP4 files from one healthy source
+video, to check that sample_videos.py records them in failed_videos.json and
+keeps the worker pool running.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+
+def make_broken_videos(source_video, output_dir, seed=42):
+    """
+    Write damaged copies of a source video next to one healthy copy.
+
+    Args:
+        source_video (str): Path to a healthy MP4 file
+        output_dir (str): Directory where the fixtures are written
+        seed (int): Random seed for the corrupted byte ranges
+
+    Returns:
+        list: Paths of the written fixture files
+    """
+    rng = random.Random(seed)
+    with open(source_video, 'rb') as f:
+        data = f.read()
+
+    os.makedirs(os.path.abspath(output_dir), exist_ok=True)
+
+    # Flip a block of bytes in the middle of the stream
+    corrupted = bytearray(data)
+    block_start = len(corrupted) // 2
+    for i in range(block_start, min(len(corrupted), block_start + 4096)):
+        corrupted[i] = rng.randrange(256)
+
+    fixtures = {
+        "healthy.mp4": data,
+        "empty.mp4": b"",
+        "garbage.mp4": bytes(rng.randrange(256) for _ in range(64 * 1024)),
+        "header_only.mp4": data[:4096],
+        "truncated.mp4": data[:len(data) // 3],
+        "corrupted_middle.mp4": bytes(corrupted),
+    }
+
+    paths = []
+    for name, content in fixtures.items():
+        path = os.path.join(os.path.abspath(output_dir), name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        paths.append(path)
+
+    # Directory with a video extension
+    dir_path = os.path.join(os.path.abspath(output_dir), "directory.mp4")
+    if os.path.isfile(dir_path):
+        os.remove(dir_path)
+    os.makedirs(dir_path, exist_ok=True)
+    paths.append(dir_path)
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deliberately broken videos for sampler robustness checks")
+    parser.add_argument("--source_video", required=True, help="Healthy MP4 file used as the basis of the fixtures")
+    parser.add_argument("--output_dir", required=True, help="Directory where the fixtures are written")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+
+    args = parser.parse_args()
+
+    if not os.path.isfile(os.path.abspath(args.source_video)):
+        print(f"Error: Source video '{args.source_video}' does not exist")
+        sys.exit(1)
+
+    paths = make_broken_videos(os.path.abspath(args.source_video), args.output_dir, args.seed)
+    print(f"Wrote {len(paths)} fixtures to {os.path.abspath(args.output_dir)}")
+    for path in paths:
+        print(f"  {os.path.basename(path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,111 +9,1145 @@ for downstream processing in video understanding tasks.
 import argparse
 import cv2
 import json
+import numpy as np
 import os
+import queue
+import re
+import shutil
+import subprocess
 import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
 from pathlib import Path
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pipe, Process, cpu_count
+from multiprocessing.connection import wait
 from tqdm import tqdm
 import functools
 
+from frame_metadata import compact_video_metadata
 
-def sample_video_frames(video_info):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_io import JsonlAppender
+from stage_profile import StageProfiler, add_profile_arguments
+from live_metrics import LiveMetrics, add_metrics_arguments
+
+
+# Maximum number of frames a single task may sample (0 = unlimited), set per worker process
+_frame_budget = 0
+
+
+class FrameBudgetExceeded(Exception):
+    """Raised when a task samples more frames than the per-task frame budget."""
+
+
+def probe_video(cap):
     """
-    Sample frames from a video at regular intervals.
+    Read basic stream properties from an opened capture.
     
     Args:
-        video_info (tuple): Tuple containing (video_path, output_dir, sampling_interval, min_duration)
+        cap (cv2.VideoCapture): Opened video capture
         
     Returns:
-        tuple: (video_metadata, failure_info) - One of them will be None
+        tuple: (fps, frame_count, duration_sec)
     """
-    video_path, output_dir, sampling_interval, min_duration = video_info
-    # Open video file
-    cap = cv2.VideoCapture(video_path)
-    
-    if not cap.isOpened():
-        return None, {"video_name": Path(video_path).stem, 
-                      "path": video_path, 
-                      "reason": "Cannot open video"}
-    
-    # Get video properties
     fps = cap.get(cv2.CAP_PROP_FPS)
     frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     duration = frame_count / fps if fps > 0 else 0
+    return fps, frame_count, duration
+
+
+def parse_resize_spec(spec):
+    """
+    Parse a resolution spec.
     
-    # Check if video meets minimum duration requirement
-    if duration < min_duration:
-        cap.release()
-        return None, {"video_name": Path(video_path).stem, 
-                      "path": video_path, 
-                      "reason": f"Video duration ({duration:.2f}s) is less than minimum ({min_duration}s)"}
+    Args:
+        spec (str): "full" for source resolution, "<N>" to cap the longer side at N
+            pixels (aspect preserved, never upscaled) or "<W>x<H>" for a fixed size
+        
+    Returns:
+        tuple or None: None, ("max_side", N) or ("fixed", (W, H))
+        
+    Raises:
+        ValueError: If the spec is not "full", a positive integer or "<W>x<H>" with positive integers
+    """
+    text = str(spec).strip().lower()
+    if text == "full":
+        return None
+    try:
+        if "x" in text:
+            width, height = text.split("x", 1)
+            size = (int(width), int(height))
+            if min(size) > 0:
+                return ("fixed", size)
+        elif int(text) > 0:
+            return ("max_side", int(text))
+    except ValueError:
+        pass
+    raise ValueError(f"invalid resolution '{spec}': expected 'full', a positive max side like '448' "
+                     f"or a size like '640x360'")
+
+
+def resize_frame(frame, resize):
+    """
+    Resize a frame before encoding, using area interpolation when downscaling.
     
-    # Create output directory for frames using absolute path
-    os.makedirs(os.path.abspath(output_dir), exist_ok=True)
+    Args:
+        frame (numpy.ndarray): Decoded BGR frame
+        resize (tuple or None): Parsed resolution spec from parse_resize_spec
+        
+    Returns:
+        numpy.ndarray: Resized frame (the input frame if no resize applies)
+    """
+    if resize is None:
+        return frame
     
-    # Calculate number of frames to sample
-    expected_frames = int(duration / sampling_interval) + 1
+    height, width = frame.shape[:2]
+    if resize[0] == "max_side":
+        scale = resize[1] / max(height, width)
+        if scale >= 1:
+            return frame
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    else:
+        size = resize[1]
     
-    frames_metadata = []
-    frame_index = 0
-    timestamp = 0.0
+    interpolation = cv2.INTER_AREA if size[0] * size[1] < width * height else cv2.INTER_LINEAR
+    return cv2.resize(frame, size, interpolation=interpolation)
+
+
+def parallel_frame_dir(output_dir, suffix):
+    """
+    Frame directory in a tree parallel to the primary one.
+    
+    For a primary frame directory <root>/<video_name>, returns
+    <root>_<suffix>/<video_name>.
+    """
+    output_dir = os.path.abspath(output_dir)
+    root, video_name = os.path.split(output_dir)
+    return os.path.join(f"{root}_{str(suffix).lower()}", video_name)
+
+
+def interval_suffix(sampling_interval):
+    """Directory and file name suffix of a sampling interval, e.g. "0.5s"."""
+    return f"{sampling_interval:g}s"
+
+
+def build_outputs(output_dir, resolutions):
+    """
+    List the frame outputs of a video, primary resolution first.
+    
+    Args:
+        output_dir (str): Primary frame directory of the video
+        resolutions (list): Resolution specs; the first one is written to output_dir
+        
+    Returns:
+        list: (spec, frame_dir, resize) tuples
+    """
+    outputs = []
+    for i, spec in enumerate(resolutions or ["full"]):
+        frame_dir = os.path.abspath(output_dir) if i == 0 else parallel_frame_dir(output_dir, spec)
+        outputs.append((spec, frame_dir, parse_resize_spec(spec)))
+    return outputs
+
+
+def build_interval_outputs(output_dir, intervals, resolutions):
+    """
+    List the frame outputs of every sampling interval, primary interval first.
+    
+    The primary interval is written to output_dir; every further interval goes to
+    a parallel tree <root>_<interval>s/<video_name>.
+    
+    Returns:
+        list: One build_outputs list per interval
+    """
+    interval_outputs = []
+    for i, interval in enumerate(intervals):
+        frame_dir = output_dir if i == 0 else parallel_frame_dir(output_dir, interval_suffix(interval))
+        interval_outputs.append(build_outputs(frame_dir, resolutions))
+    return interval_outputs
+
+
+def sampling_intervals(sampling_interval, options):
+    """All sampling intervals of a task: the primary one followed by the extra ones."""
+    return [sampling_interval] + list(options.get("extra_intervals", []))
+
+
+def write_frame(frame_path, image, source_path=None):
+    """
+    Write a frame, hard-linking an already written identical frame when possible.
+    
+    Args:
+        frame_path (str): Destination path
+        image (numpy.ndarray): Encoded-ready image, used if linking is not possible
+        source_path (str): Previously written file with the same content, or None
+    """
+    if source_path is not None:
+        try:
+            if os.path.exists(frame_path):
+                os.remove(frame_path)
+            os.link(source_path, frame_path)
+            return
+        except OSError:
+            pass
+    cv2.imwrite(frame_path, image)
+
+
+def sample_frame_range(cap, interval_outputs, intervals, duration, start_time=0.0, end_time=None):
+    """
+    Sample the regular grids of all sampling intervals within [start_time, end_time).
+    
+    Frame files and timestamps use the global grid index of each interval, so
+    ranges sampled by different workers can be concatenated into ordered frame
+    lists. Timestamps shared by several intervals are decoded once; the frame is
+    resized and encoded once per output resolution and hard-linked into the
+    directories of the other intervals.
+    
+    Args:
+        cap (cv2.VideoCapture): Opened video capture
+        interval_outputs (list): Per-interval outputs from build_interval_outputs
+        intervals (list): Sampling intervals in seconds, primary first
+        duration (float): Video duration in seconds
+        start_time (float): Start of the time range in seconds
+        end_time (float): End of the time range (exclusive, None samples to the end)
+        
+    Returns:
+        tuple: (frames_by_interval, complete) - one frame metadata list per interval;
+            complete is False if decoding stopped early
+        
+    Raises:
+        FrameBudgetExceeded: If more than the per-task frame budget would be decoded
+    """
+    # Collect the grid points of every interval, keyed by timestamp in milliseconds
+    grid_points = defaultdict(list)
+    for position, interval in enumerate(intervals):
+        frame_index = max(0, int(start_time / interval) - 1)
+        timestamp = frame_index * interval
+        while timestamp <= duration and (end_time is None or timestamp < end_time):
+            if timestamp >= start_time:
+                grid_points[round(timestamp * 1000)].append((position, frame_index, timestamp))
+            frame_index += 1
+            timestamp = frame_index * interval
+    
+    frames_by_interval = [[] for _ in intervals]
+    decoded_frames = 0
     
-    while timestamp <= duration:
+    for timestamp_ms in sorted(grid_points):
+        if _frame_budget and decoded_frames >= _frame_budget:
+            raise FrameBudgetExceeded(f"Frame budget exceeded ({_frame_budget} frames)")
+        
+        points = grid_points[timestamp_ms]
+        
         # Set video to the correct timestamp
-        cap.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+        cap.set(cv2.CAP_PROP_POS_MSEC, points[0][2] * 1000)
         
         # Read frame
         ret, frame = cap.read()
+        if not ret:
+            return frames_by_interval, False
+        decoded_frames += 1
+        
+        # Save frame at every output resolution, once per timestamp
+        for resolution_index, (_, _, resize) in enumerate(interval_outputs[0]):
+            image = resize_frame(frame, resize)
+            written_path = None
+            for position, frame_index, _ in points:
+                frame_dir = interval_outputs[position][resolution_index][1]
+                frame_path = os.path.join(frame_dir, f"frame_{frame_index:05d}.jpg")
+                write_frame(frame_path, image, written_path)
+                written_path = frame_path
+        
+        # Record frame metadata with the primary-resolution path
+        for position, frame_index, timestamp in points:
+            frame_dir = interval_outputs[position][0][1]
+            frames_by_interval[position].append({
+                "frame_index": frame_index,
+                "timestamp_sec": timestamp,
+                "path": os.path.join(frame_dir, f"frame_{frame_index:05d}.jpg")
+            })
+    
+    return frames_by_interval, True
+
+
+def frame_signature(frame):
+    """
+    Cheap content signature of a frame: normalized histogram of a downscaled grayscale copy.
+    
+    Args:
+        frame (numpy.ndarray): Decoded BGR frame
+        
+    Returns:
+        numpy.ndarray: 32-bin float32 histogram
+    """
+    small = cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    hist = cv2.calcHist([gray], [0], None, [32], [0, 256])
+    return cv2.normalize(hist, hist)
+
+
+def sample_adaptive(cap, outputs, fps, duration, min_interval, max_interval, scene_threshold):
+    """
+    Sample frames when the content changes, decoding the stream sequentially.
+    
+    Every frame is decoded, but only frames at least min_interval after the last
+    kept frame are retrieved and compared with it. A frame is kept when the
+    Bhattacharyya distance between the histogram signatures reaches
+    scene_threshold, or when max_interval has passed since the last kept frame.
+    
+    Args:
+        cap (cv2.VideoCapture): Opened video capture
+        outputs (list): (spec, frame_dir, resize) tuples from build_outputs
+        fps (float): Video frame rate
+        duration (float): Video duration in seconds
+        min_interval (float): Minimum time between kept frames in seconds
+        max_interval (float): Maximum time between kept frames in seconds
+        scene_threshold (float): Histogram distance (0-1) that counts as a content change
+        
+    Returns:
+        list: Frame metadata with the true timestamp of every kept frame
+        
+    Raises:
+        FrameBudgetExceeded: If more than the per-task frame budget would be sampled
+    """
+    frames_metadata = []
+    last_signature = None
+    last_timestamp = None
+    frame_number = 0
+    
+    while cap.grab():
+        timestamp = frame_number / fps if fps > 0 else 0.0
+        frame_number += 1
+        if timestamp > duration:
+            break
+        if last_timestamp is not None and timestamp - last_timestamp < min_interval:
+            continue
+        
+        ret, frame = cap.retrieve()
         if not ret:
             break
-            
-        # Save frame using absolute path
+        
+        signature = frame_signature(frame)
+        if (last_timestamp is not None and timestamp - last_timestamp < max_interval
+                and cv2.compareHist(last_signature, signature, cv2.HISTCMP_BHATTACHARYYA) < scene_threshold):
+            continue
+        
+        if _frame_budget and len(frames_metadata) >= _frame_budget:
+            raise FrameBudgetExceeded(f"Frame budget exceeded ({_frame_budget} frames)")
+        
+        # Save frame at every output resolution; metadata records the primary path
+        frame_index = len(frames_metadata)
         frame_filename = f"frame_{frame_index:05d}.jpg"
-        frame_path = os.path.join(os.path.abspath(output_dir), frame_filename)
-        cv2.imwrite(frame_path, frame)
+        for _, frame_dir, resize in outputs:
+            cv2.imwrite(os.path.join(frame_dir, frame_filename), resize_frame(frame, resize))
         
-        # Record frame metadata
         frames_metadata.append({
             "frame_index": frame_index,
             "timestamp_sec": timestamp,
-            "path": os.path.abspath(frame_path)
+            "path": os.path.join(outputs[0][1], frame_filename)
         })
-        
-        frame_index += 1
-        timestamp += sampling_interval
+        last_signature = signature
+        last_timestamp = timestamp
     
-    cap.release()
+    return frames_metadata
+
+
+def make_output_dirs(interval_outputs):
+    """Create the frame directories of all intervals and output resolutions."""
+    for outputs in interval_outputs:
+        for _, frame_dir, _ in outputs:
+            os.makedirs(frame_dir, exist_ok=True)
+
+
+def build_video_metadata(video_path, outputs, fps, duration, sampling_interval, frames_metadata):
+    """
+    Compile the metadata record of a sampled video.
     
-    # Compile video metadata
-    video_metadata = {
+    Returns:
+        dict: Video metadata entry for video_metadata.json
+    """
+    output_dir = outputs[0][1]
+    return {
         "video_name": Path(video_path).stem,
         "video_path": os.path.abspath(video_path),
         "fps": fps,
         "duration_sec": duration,
+        "sampling_mode": "fixed",
         "sampling_interval": sampling_interval,
-        "expected_frames": expected_frames,
+        "expected_frames": int(duration / sampling_interval) + 1,
         "sampled_frames": len(frames_metadata),
         "frame_dir": os.path.abspath(output_dir),
+        "resolutions": [{"resolution": spec, "frame_dir": frame_dir} for spec, frame_dir, _ in outputs],
         "frames": frames_metadata
     }
+
+
+def build_interval_metadata(video_path, interval_outputs, intervals, fps, duration, frames_by_interval):
+    """
+    Compile the metadata of the primary interval, with the other intervals attached.
+    
+    Records of extra intervals are stored under "interval_variants"; main() moves
+    them into one metadata file per interval.
+    
+    Returns:
+        dict: Video metadata entry of the primary interval
+    """
+    records = [
+        build_video_metadata(video_path, outputs, fps, duration, interval, frames)
+        for outputs, interval, frames in zip(interval_outputs, intervals, frames_by_interval)
+    ]
+    video_metadata = records[0]
+    if len(records) > 1:
+        video_metadata["interval_variants"] = records[1:]
+    return video_metadata
+
+
+def probe_stream(video_path):
+    """
+    Read stream properties with ffprobe, without decoding any frames.
+    
+    The frame size is not taken from here: the stream's width and height ignore
+    rotation metadata, so sample_keyframes reads it from the decoded frames.
+    
+    Args:
+        video_path (str): Path to the video file
+        
+    Returns:
+        tuple: (fps, duration_sec), or None if the video cannot be probed
+    """
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=avg_frame_rate,duration:format=duration",
+           "-of", "json", video_path]
+    try:
+        probe = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+        stream = probe["streams"][0]
+        num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+        fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+        duration = float(stream.get("duration") or probe.get("format", {}).get("duration") or 0)
+        return fps, duration
+    except (subprocess.CalledProcessError, ValueError, KeyError, IndexError, OSError):
+        return None
+
+
+def sample_keyframes(video_path, outputs):
+    """
+    Sample only the keyframes (I-frames) of a video with ffmpeg.
+    
+    ffmpeg is run with -skip_frame nokey, so the decoder skips every non-key
+    frame; keyframes are piped back as raw BGR images. The showinfo filter logs
+    each frame before it reaches the pipe, with its presentation timestamp and
+    decoded size (after autorotation), which is used to read the frame back.
+    Frames without a presentation timestamp are skipped.
+    
+    Args:
+        video_path (str): Path to the video file
+        outputs (list): (spec, frame_dir, resize) tuples from build_outputs
+        
+    Returns:
+        list: Frame metadata with the presentation timestamp of every keyframe
+        
+    Raises:
+        FrameBudgetExceeded: If more than the per-task frame budget would be sampled
+    """
+    cmd = ["ffmpeg", "-v", "info", "-nostats", "-skip_frame", "nokey", "-i", video_path,
+           "-map", "0:v:0", "-vsync", "0", "-vf", "showinfo",
+           "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    
+    # showinfo writes one line per frame to stderr; read it concurrently and
+    # hand (timestamp, width, height) to the loop below, None at the end
+    frame_infos = queue.Queue()
+    
+    def read_frame_infos():
+        for line in process.stderr:
+            size = re.search(rb"\bn:\s*\d+\b.*\bs:(\d+)x(\d+)", line)
+            if size:
+                pts_time = re.search(rb"pts_time:\s*(-?[\d.]+)", line)
+                timestamp = float(pts_time.group(1)) if pts_time else None
+                frame_infos.put((timestamp, int(size.group(1)), int(size.group(2))))
+        frame_infos.put(None)
+    
+    reader = threading.Thread(target=read_frame_infos, daemon=True)
+    reader.start()
+    
+    frames_metadata = []
+    try:
+        while True:
+            frame_info = frame_infos.get()
+            if frame_info is None:
+                break
+            timestamp, width, height = frame_info
+            frame_size = width * height * 3
+            data = process.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            if timestamp is None:
+                continue
+            if _frame_budget and len(frames_metadata) >= _frame_budget:
+                raise FrameBudgetExceeded(f"Frame budget exceeded ({_frame_budget} frames)")
+            
+            frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            frame_filename = f"frame_{len(frames_metadata):05d}.jpg"
+            for _, frame_dir, resize in outputs:
+                cv2.imwrite(os.path.join(frame_dir, frame_filename), resize_frame(frame, resize))
+            frames_metadata.append({
+                "frame_index": len(frames_metadata),
+                "timestamp_sec": timestamp,
+                "path": os.path.join(outputs[0][1], frame_filename)
+            })
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        reader.join()
+    
+    return frames_metadata
+
+
+def sample_keyframe_video(video_info):
+    """
+    Sample the keyframes of a video, with the same layout and schema as sample_video_frames.
+    
+    Args:
+        video_info (tuple): Tuple containing (video_path, output_dir, sampling_interval, min_duration, options)
+        
+    Returns:
+        tuple: (video_metadata, failure_info) - One of them will be None
+    """
+    video_path, output_dir, sampling_interval, min_duration, options = video_info
+    outputs = build_outputs(output_dir, options.get("resolutions"))
+    
+    stream = probe_stream(video_path)
+    if stream is None:
+        return None, {"video_name": Path(video_path).stem,
+                      "path": video_path,
+                      "reason": "Cannot open video"}
+    fps, duration = stream
+    
+    if duration < min_duration:
+        return None, {"video_name": Path(video_path).stem,
+                      "path": video_path,
+                      "reason": f"Video duration ({duration:.2f}s) is less than minimum ({min_duration}s)"}
+    
+    make_output_dirs([outputs])
+    try:
+        frames_metadata = sample_keyframes(video_path, outputs)
+    except FrameBudgetExceeded as e:
+        return None, {"video_name": Path(video_path).stem,
+                      "path": video_path,
+                      "reason": str(e)}
     
+    # Record the mean keyframe spacing as the sampling interval
+    gop_interval = duration / len(frames_metadata) if frames_metadata else duration
+    video_metadata = build_video_metadata(video_path, outputs, fps, duration,
+                                          gop_interval or sampling_interval, frames_metadata)
+    video_metadata["sampling_mode"] = "keyframe"
+    video_metadata["keyframe_sampled"] = True
     return video_metadata, None
 
 
+def sample_video_frames(video_info):
+    """
+    Sample frames from a video at regular intervals.
+    
+    Args:
+        video_info (tuple): Tuple containing (video_path, output_dir, sampling_interval, min_duration, options)
+        
+    Returns:
+        tuple: (video_metadata, failure_info) - One of them will be None
+    """
+    video_path, output_dir, sampling_interval, min_duration, options = video_info
+    if options.get("sampling_mode") == "keyframe":
+        return sample_keyframe_video(video_info)
+    
+    intervals = sampling_intervals(sampling_interval, options)
+    interval_outputs = build_interval_outputs(output_dir, intervals, options.get("resolutions"))
+    # Open video file
+    cap = cv2.VideoCapture(video_path)
+    
+    if not cap.isOpened():
+        return None, {"video_name": Path(video_path).stem, 
+                      "path": video_path, 
+                      "reason": "Cannot open video"}
+    
+    # Get video properties
+    fps, frame_count, duration = probe_video(cap)
+    
+    # Check if video meets minimum duration requirement
+    if duration < min_duration:
+        cap.release()
+        return None, {"video_name": Path(video_path).stem, 
+                      "path": video_path, 
+                      "reason": f"Video duration ({duration:.2f}s) is less than minimum ({min_duration}s)"}
+    
+    # Create output directories for frames using absolute paths
+    make_output_dirs(interval_outputs)
+    
+    if options.get("sampling_mode") == "adaptive":
+        return sample_adaptive_video(cap, video_path, interval_outputs[0], fps, duration, options)
+    
+    try:
+        frames_by_interval, _ = sample_frame_range(cap, interval_outputs, intervals, duration)
+    except FrameBudgetExceeded as e:
+        return None, {"video_name": Path(video_path).stem,
+                      "path": video_path,
+                      "reason": str(e)}
+    finally:
+        cap.release()
+    
+    return build_interval_metadata(video_path, interval_outputs, intervals, fps, duration,
+                                   frames_by_interval), None
+
+
+def sample_adaptive_video(cap, video_path, outputs, fps, duration, options):
+    """
+    Run scene-change-adaptive sampling on an opened capture and build its metadata.
+    
+    Returns:
+        tuple: (video_metadata, failure_info) - One of them will be None
+    """
+    try:
+        frames_metadata = sample_adaptive(cap, outputs, fps, duration,
+                                          options["min_interval"], options["max_interval"],
+                                          options["scene_threshold"])
+    except FrameBudgetExceeded as e:
+        return None, {"video_name": Path(video_path).stem,
+                      "path": video_path,
+                      "reason": str(e)}
+    finally:
+        cap.release()
+    
+    video_metadata = build_video_metadata(video_path, outputs, fps, duration,
+                                          options["max_interval"], frames_metadata)
+    video_metadata["sampling_mode"] = "adaptive"
+    video_metadata["min_interval"] = options["min_interval"]
+    video_metadata["scene_threshold"] = options["scene_threshold"]
+    return video_metadata, None
+
+
+def sample_video_range(range_info):
+    """
+    Sample one time range of a long video split across workers.
+    
+    Args:
+        range_info (tuple): Tuple containing (video_path, output_dir, sampling_interval, start_time, end_time, options)
+        
+    Returns:
+        dict: Range result with fps, duration, per-interval frames and completion
+            status, or a "reason" key if the range failed
+    """
+    video_path, output_dir, sampling_interval, start_time, end_time, options = range_info
+    intervals = sampling_intervals(sampling_interval, options)
+    interval_outputs = build_interval_outputs(output_dir, intervals, options.get("resolutions"))
+    cap = cv2.VideoCapture(video_path)
+    
+    if not cap.isOpened():
+        return {"start_time": start_time, "reason": "Cannot open video"}
+    
+    fps, frame_count, duration = probe_video(cap)
+    make_output_dirs(interval_outputs)
+    try:
+        frames_by_interval, complete = sample_frame_range(
+            cap, interval_outputs, intervals, duration, start_time, end_time)
+    except FrameBudgetExceeded as e:
+        return {"start_time": start_time, "reason": str(e)}
+    finally:
+        cap.release()
+    
+    return {
+        "start_time": start_time,
+        "fps": fps,
+        "duration_sec": duration,
+        "frames_by_interval": frames_by_interval,
+        "complete": complete
+    }
+
+
+def merge_range_results(video_info, range_results):
+    """
+    Merge the range results of a split video into a single metadata record.
+    
+    Ranges after the first one that stopped early are discarded (and their frame
+    files removed for every interval and resolution), matching the single-task
+    behaviour of stopping at the first failed read.
+    
+    Args:
+        video_info (tuple): Tuple containing (video_path, output_dir, sampling_interval, min_duration, options)
+        range_results (list): Results returned by sample_video_range
+        
+    Returns:
+        tuple: (video_metadata, failure_info) - One of them will be None
+    """
+    video_path, output_dir, sampling_interval, min_duration, options = video_info
+    intervals = sampling_intervals(sampling_interval, options)
+    interval_outputs = build_interval_outputs(output_dir, intervals, options.get("resolutions"))
+    range_results = sorted(range_results, key=lambda r: r["start_time"])
+    
+    for result in range_results:
+        if "reason" in result:
+            return None, {"video_name": Path(video_path).stem,
+                          "path": video_path,
+                          "reason": result["reason"]}
+    
+    frames_by_interval = [[] for _ in intervals]
+    stopped = False
+    for result in range_results:
+        for position, frames in enumerate(result["frames_by_interval"]):
+            if not stopped:
+                frames_by_interval[position].extend(frames)
+                continue
+            for frame in frames:
+                frame_filename = os.path.basename(frame["path"])
+                for _, frame_dir, _ in interval_outputs[position]:
+                    frame_path = os.path.join(frame_dir, frame_filename)
+                    if os.path.exists(frame_path):
+                        os.remove(frame_path)
+        stopped = stopped or not result["complete"]
+    
+    first = range_results[0]
+    return build_interval_metadata(video_path, interval_outputs, intervals, first["fps"],
+                                   first["duration_sec"], frames_by_interval), None
+
+
+def estimate_video_cost(video_path, cost_estimate="size"):
+    """
+    Estimate the relative processing cost of a video for scheduling.
+    
+    Args:
+        video_path (str): Path to the video file
+        cost_estimate (str): "size" uses the file size in bytes, "duration" probes
+            the container for its duration in seconds
+        
+    Returns:
+        float: Relative cost; only comparable between videos of the same estimate type
+    """
+    if cost_estimate == "duration":
+        cap = cv2.VideoCapture(video_path)
+        duration = probe_video(cap)[2] if cap.isOpened() else 0.0
+        cap.release()
+        return duration
+    
+    try:
+        return float(os.path.getsize(video_path))
+    except OSError:
+        return 0.0
+
+
+def interval_metadata_path(metadata_path, sampling_interval):
+    """Metadata file of an extra sampling interval, e.g. video_metadata_0.5s.json."""
+    root, ext = os.path.splitext(os.path.abspath(metadata_path))
+    return f"{root}_{interval_suffix(sampling_interval)}{ext or '.json'}"
+
+
+def build_tasks(video_info_list, cost_estimate="size", split_threshold=0, segment_duration=120.0):
+    """
+    Turn videos into scheduler tasks, splitting long videos into time ranges.
+    
+    When splitting is enabled every video is probed for its duration, which is then
+    also used as the scheduling cost. Range boundaries sit on the grid of the
+    primary sampling interval; each range seeks to its first timestamp, so decoding
+    restarts from the nearest preceding keyframe and ranges can be sampled
+    independently. Adaptive sampling depends on the previously kept frame and
+    keyframe sampling is already cheap, so splitting is skipped in those modes.
+    
+    Args:
+        video_info_list (list): Tuples of (video_path, output_dir, sampling_interval, min_duration, options)
+        cost_estimate (str): Cost estimate used when splitting is disabled ("size" or "duration")
+        split_threshold (float): Videos at least this long (seconds) are split; 0 disables splitting
+        segment_duration (float): Length of each time range in seconds
+        
+    Returns:
+        tuple: (tasks, task_owners, costs) - tasks are ("video", video_info) or
+            ("range", range_info), task_owners maps each task to its video index
+    """
+    tasks = []
+    task_owners = []
+    costs = []
+    
+    for video_index, video_info in enumerate(video_info_list):
+        video_path, output_dir, sampling_interval, min_duration, options = video_info
+        
+        if split_threshold <= 0 or options.get("sampling_mode") in ("adaptive", "keyframe"):
+            tasks.append(("video", video_info))
+            task_owners.append(video_index)
+            costs.append(estimate_video_cost(video_path, cost_estimate))
+            continue
+        
+        duration = estimate_video_cost(video_path, "duration")
+        if duration < max(split_threshold, min_duration):
+            tasks.append(("video", video_info))
+            task_owners.append(video_index)
+            costs.append(duration)
+            continue
+        
+        frames_per_range = max(1, int(segment_duration / sampling_interval))
+        total_frames = int(duration / sampling_interval) + 1
+        for start_index in range(0, total_frames, frames_per_range):
+            end_index = start_index + frames_per_range
+            start_time = start_index * sampling_interval
+            end_time = end_index * sampling_interval if end_index < total_frames else None
+            tasks.append(("range", (video_path, output_dir, sampling_interval,
+                                    start_time, end_time, options)))
+            task_owners.append(video_index)
+            costs.append((min(end_index, total_frames) - start_index) * sampling_interval)
+    
+    return tasks, task_owners, costs
+
+
+def build_schedule(tasks, costs, num_workers, chunks_per_worker=4, max_chunk_size=64):
+    """
+    Order videos longest-first and pack the short tail into adaptive chunks.
+    
+    Chunk cost targets follow guided self-scheduling: each chunk aims for the
+    remaining cost divided by (num_workers * chunks_per_worker), so long videos are
+    dispatched alone at the start and chunks shrink as the run drains.
+    
+    Args:
+        tasks (list): Tasks produced by build_tasks
+        costs (list): Estimated cost of each task, same order as tasks
+        num_workers (int): Number of worker processes
+        chunks_per_worker (int): Scheduling granularity factor
+        max_chunk_size (int): Maximum number of videos in a single chunk
+        
+    Returns:
+        list: Chunks, each a list of (task_index, task) tuples
+    """
+    order = sorted(range(len(tasks)), key=lambda i: costs[i], reverse=True)
+    remaining_cost = float(sum(costs))
+    divisor = max(1, num_workers * chunks_per_worker)
+    
+    chunks = []
+    current_chunk = []
+    current_cost = 0.0
+    target_cost = remaining_cost / divisor
+    
+    for index in order:
+        current_chunk.append((index, tasks[index]))
+        current_cost += costs[index]
+        
+        if current_cost >= target_cost or len(current_chunk) >= max_chunk_size:
+            chunks.append(current_chunk)
+            remaining_cost -= current_cost
+            target_cost = remaining_cost / divisor
+            current_chunk = []
+            current_cost = 0.0
+    
+    if current_chunk:
+        chunks.append(current_chunk)
+    
+    return chunks
+
+
+def run_task(task):
+    """
+    Run a single scheduler task.
+    
+    Args:
+        task (tuple): ("video", video_info) or ("range", range_info)
+        
+    Returns:
+        The result of process_single_video or sample_video_range
+    """
+    kind, payload = task
+    if kind == "range":
+        return sample_video_range(payload)
+    return process_single_video(payload)
+
+
+def task_failure(task, reason):
+    """
+    Build the failure result of a task that did not finish in a worker.
+    
+    Args:
+        task (tuple): ("video", video_info) or ("range", range_info)
+        reason (str): Failure reason recorded in failed_videos.json
+        
+    Returns:
+        The failure result in the format run_task would have returned
+    """
+    kind, payload = task
+    if kind == "range":
+        return {"start_time": payload[3], "reason": reason}
+    return None, {"video_name": Path(payload[0]).stem,
+                  "path": payload[0],
+                  "reason": reason}
+
+
+def watchdog_worker(conn, frame_budget):
+    """
+    Worker loop of WatchdogPool: run chunks received over conn and report each task.
+    
+    Args:
+        conn (Connection): Worker end of the pipe to the supervisor
+        frame_budget (int): Maximum number of frames per task (0 = unlimited)
+    """
+    global _frame_budget
+    _frame_budget = frame_budget
+    
+    while True:
+        chunk = conn.recv()
+        if chunk is None:
+            break
+        for index, task in chunk:
+            conn.send(("start", index))
+            start = time.perf_counter()
+            try:
+                result = run_task(task)
+            except Exception as e:
+                # Report the error for this task and keep the worker alive for the rest of the chunk
+                reason = f"{type(e).__name__}: {e}"
+                print(f"Error processing {task[1][0]}: {reason}", file=sys.stderr)
+                result = task_failure(task, reason)
+            conn.send(("done", index, result, time.perf_counter() - start))
+        conn.send(("chunk_done",))
+    
+    conn.close()
+
+
+class WatchdogPool:
+    """
+    Process pool that enforces a per-task wall-clock timeout.
+    
+    Each worker has a private pipe and receives one chunk at a time, so the
+    supervisor always knows which task a worker is running. A worker that exceeds
+    the timeout or dies is terminated and replaced; the task it was running is
+    reported as failed and the rest of its chunk is requeued.
+    """
+    
+    def __init__(self, num_workers, task_timeout=0, frame_budget=0, poll_interval=1.0):
+        """
+        Args:
+            num_workers (int): Number of worker processes
+            task_timeout (float): Per-task wall-clock limit in seconds (0 = unlimited)
+            frame_budget (int): Per-task frame limit passed to the workers (0 = unlimited)
+            poll_interval (float): How often (seconds) worker deadlines are checked
+        """
+        self.num_workers = num_workers
+        self.task_timeout = task_timeout
+        self.frame_budget = frame_budget
+        self.poll_interval = poll_interval
+        self.workers = [self._start_worker() for _ in range(num_workers)]
+        self.restarted_workers = 0
+        self.pending = deque()
+    
+    @property
+    def busy_workers(self):
+        """Number of workers currently holding a chunk."""
+        return sum(worker["chunk"] is not None for worker in self.workers)
+    
+    @property
+    def queued_tasks(self):
+        """Number of tasks in chunks not yet handed to a worker."""
+        return sum(len(chunk) for chunk in self.pending)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _start_worker(self):
+        parent_conn, child_conn = Pipe()
+        process = Process(target=watchdog_worker, args=(child_conn, self.frame_budget), daemon=True)
+        process.start()
+        child_conn.close()
+        return {"process": process, "conn": parent_conn, "chunk": None,
+                "done": set(), "current": None, "started": 0.0}
+    
+    def _replace_worker(self, slot, reason, pending):
+        """
+        Kill the worker in slot, requeue its unfinished tasks and start a new worker.
+        
+        Returns:
+            list: Failure results for the task the worker was running
+        """
+        worker = self.workers[slot]
+        worker["process"].terminate()
+        worker["process"].join()
+        worker["conn"].close()
+        
+        failures = []
+        remaining = []
+        for index, task in worker["chunk"] or []:
+            if index in worker["done"]:
+                continue
+            if index == worker["current"]:
+                failures.append((index, task_failure(task, reason), time.monotonic() - worker["started"]))
+            else:
+                remaining.append((index, task))
+        if remaining:
+            pending.appendleft(remaining)
+        
+        self.workers[slot] = self._start_worker()
+        self.restarted_workers += 1
+        return failures
+    
+    def run(self, chunks):
+        """
+        Run all chunks, yielding results as tasks finish.
+        
+        Args:
+            chunks (list): Chunks produced by build_schedule
+            
+        Yields:
+            list: (task_index, result, elapsed_sec) tuples
+        """
+        pending = self.pending = deque(chunks)
+        
+        while True:
+            # Hand out chunks to idle workers
+            for worker in self.workers:
+                if worker["chunk"] is None and pending:
+                    worker["chunk"] = pending.popleft()
+                    worker["done"] = set()
+                    worker["current"] = None
+                    worker["started"] = time.monotonic()
+                    worker["conn"].send(worker["chunk"])
+            
+            busy = [slot for slot, worker in enumerate(self.workers) if worker["chunk"] is not None]
+            if not busy:
+                break
+            
+            conn_to_slot = {self.workers[slot]["conn"]: slot for slot in busy}
+            for conn in wait(list(conn_to_slot), timeout=self.poll_interval):
+                slot = conn_to_slot[conn]
+                worker = self.workers[slot]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    # Worker died; the liveness check below replaces it
+                    continue
+                
+                if message[0] == "start":
+                    worker["current"] = message[1]
+                    worker["started"] = time.monotonic()
+                elif message[0] == "done":
+                    _, index, result, elapsed = message
+                    worker["done"].add(index)
+                    worker["current"] = None
+                    yield [(index, result, elapsed)]
+                else:
+                    worker["chunk"] = None
+            
+            # Replace workers that died or ran past the task deadline
+            now = time.monotonic()
+            for slot in busy:
+                worker = self.workers[slot]
+                if worker["chunk"] is None:
+                    continue
+                if not worker["process"].is_alive():
+                    failures = self._replace_worker(slot, "Worker exited unexpectedly", pending)
+                elif (self.task_timeout and worker["current"] is not None
+                        and now - worker["started"] > self.task_timeout):
+                    failures = self._replace_worker(
+                        slot, f"Timed out after {self.task_timeout:g}s", pending)
+                else:
+                    continue
+                if failures:
+                    yield failures
+    
+    def close(self):
+        """Stop all worker processes."""
+        for worker in self.workers:
+            try:
+                worker["conn"].send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker["process"].join(timeout=self.poll_interval)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+                worker["process"].join()
+            worker["conn"].close()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Sample video frames and generate metadata")
     parser.add_argument("--input_dir", required=True, help="Input directory containing video files")
     parser.add_argument("--output_dir", required=True, help="Output directory for sampled frames")
     parser.add_argument("--metadata_path", required=True, help="Path to output metadata JSON file")
-    parser.add_argument("--sampling_interval", type=float, default=1.0, 
-                        help="Sampling interval in seconds (default: 1.0)")
+    parser.add_argument("--sampling_interval", type=float, nargs="+", default=[1.0], 
+                        help="Sampling interval(s) in seconds; several intervals share one decode pass. "
+                             "The first is written to --output_dir/--metadata_path, the others to "
+                             "<output_dir>_<interval>s and <metadata>_<interval>s.json (default: 1.0)")
+    parser.add_argument("--resolutions", nargs="+", default=["full"],
+                        help="Output resolutions written from a single decode pass: 'full', a max side "
+                             "in pixels (e.g. 448) or WIDTHxHEIGHT. The first goes to --output_dir, the "
+                             "others to parallel trees <output_dir>_<resolution> (default: full)")
+    parser.add_argument("--sampling_mode", choices=["fixed", "adaptive", "keyframe"], default="fixed",
+                        help="fixed: one frame per sampling interval; adaptive: keep frames only when "
+                             "the content changes; keyframe: decode only I-frames with ffmpeg, for fast "
+                             "previews (default: fixed)")
+    parser.add_argument("--min_interval", type=float, default=0.5,
+                        help="Adaptive mode: minimum time between kept frames in seconds (default: 0.5)")
+    parser.add_argument("--max_interval", type=float, default=4.0,
+                        help="Adaptive mode: maximum time between kept frames in seconds (default: 4.0)")
+    parser.add_argument("--scene_threshold", type=float, default=0.3,
+                        help="Adaptive mode: histogram distance (0-1) that counts as a content change "
+                             "(default: 0.3)")
+    parser.add_argument("--metadata_format", choices=["full", "compact"], default="full",
+                        help="full: list every frame with its path and timestamp; compact: store only "
+                             "per-video parameters plus timestamps that differ from the sampling grid "
+                             "(read with frame_metadata.py) (default: full)")
     parser.add_argument("--min_duration", type=float, default=0, 
                         help="Minimum video duration in seconds (default: 0)")
     parser.add_argument("--num_workers", type=int, default=None,
                         help="Number of worker processes (default: number of CPU cores)")
+    parser.add_argument("--cost_estimate", choices=["size", "duration"], default="size",
+                        help="How to estimate per-video cost for longest-first scheduling: "
+                             "file size or probed duration (default: size)")
+    parser.add_argument("--split_threshold", type=float, default=0,
+                        help="Split videos at least this long (seconds) into time ranges sampled "
+                             "in parallel; 0 disables splitting (default: 0)")
+    parser.add_argument("--segment_duration", type=float, default=120.0,
+                        help="Length in seconds of each time range of a split video (default: 120)")
+    parser.add_argument("--task_timeout", type=float, default=3600,
+                        help="Wall-clock limit in seconds per video (or time range); stuck workers are "
+                             "killed and replaced, 0 disables the limit (default: 3600)")
+    parser.add_argument("--frame_budget", type=int, default=0,
+                        help="Maximum number of frames sampled per video (or time range), "
+                             "0 for unlimited (default: 0)")
+    parser.add_argument("--metadata_stream", default=None,
+                        help="Optional JSONL file that receives each video's metadata entry as soon as "
+                             "the video finishes, so downstream stages can start before the run ends")
+    add_profile_arguments(parser)
+    add_metrics_arguments(parser)
     
     args = parser.parse_args()
     
+    # Reject malformed resolution specs before any worker starts
+    for spec in args.resolutions:
+        try:
+            parse_resize_spec(spec)
+        except ValueError as e:
+            parser.error(f"--resolutions: {e}")
+    
+    # Drop repeated intervals while keeping the primary one first
+    intervals = list(dict.fromkeys(args.sampling_interval))
+    if args.sampling_mode != "fixed" and len(intervals) > 1:
+        parser.error(f"--sampling_mode {args.sampling_mode} does not take multiple --sampling_interval values")
+    if args.sampling_mode == "keyframe" and not (shutil.which("ffmpeg") and shutil.which("ffprobe")):
+        parser.error("--sampling_mode keyframe requires ffmpeg and ffprobe on PATH")
+    metadata_paths = [os.path.abspath(args.metadata_path)] + [
+        interval_metadata_path(args.metadata_path, interval) for interval in intervals[1:]
+    ]
+    
+    with StageProfiler.from_args("sample", args) as profiler, LiveMetrics.from_args("sample", args) as metrics, \
+            open_metadata_stream(args.metadata_stream) as stream:
+        sample_all_videos(args, intervals, metadata_paths, profiler, metrics, stream)
+
+
+def sample_all_videos(args, intervals, metadata_paths, profiler, metrics, stream):
+    """
+    Sample every video in --input_dir and write the metadata files.
+    
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+        intervals (list): Sampling intervals, primary interval first
+        metadata_paths (list): Metadata file path for each sampling interval
+        profiler (StageProfiler): Profiler of the running stage
+        metrics (LiveMetrics): Live metrics of the running stage
+        stream (JsonlAppender): Appender for --metadata_stream, or None
+    """
     # Check if input directory exists using absolute path
     if not os.path.exists(os.path.abspath(args.input_dir)):
         print(f"Error: Input directory '{args.input_dir}' does not exist")
@@ -127,9 +1161,10 @@ def main():
     
     if not video_files:
         print(f"Warning: No MP4 files found in '{args.input_dir}'")
-        # Create empty metadata file using absolute path
-        with open(os.path.abspath(args.metadata_path), 'w') as f:
-            json.dump([], f, indent=2)
+        # Create empty metadata files using absolute paths
+        for metadata_path in metadata_paths:
+            with open(metadata_path, 'w') as f:
+                json.dump([], f, indent=2)
         return
     
     print(f"Found {len(video_files)} video files to process")
@@ -137,40 +1172,100 @@ def main():
     all_metadata = []
     failed_videos = []
     
+    # Options shared by every video
+    sampling_options = {
+        "resolutions": args.resolutions,
+        "extra_intervals": intervals[1:],
+        "sampling_mode": args.sampling_mode,
+        "min_interval": args.min_interval,
+        "max_interval": args.max_interval,
+        "scene_threshold": args.scene_threshold
+    }
+    
     # Prepare video info for processing
     video_info_list = []
     for video_file in video_files:
         video_path = os.path.join(os.path.abspath(args.input_dir), video_file)
         video_name = Path(video_file).stem
         frame_output_dir = os.path.join(os.path.abspath(args.output_dir), video_name)
-        video_info_list.append((video_path, frame_output_dir, args.sampling_interval, args.min_duration))
+        video_info_list.append((video_path, frame_output_dir, intervals[0], args.min_duration,
+                                sampling_options))
     
     # Determine number of worker processes
     num_workers = args.num_workers if args.num_workers else cpu_count()
     print(f"Using {num_workers} worker processes")
     
+    # Schedule longest tasks first so they do not end up in the tail of the run
+    with profiler.phase("schedule"):
+        tasks, task_owners, costs = build_tasks(video_info_list, args.cost_estimate,
+                                                args.split_threshold, args.segment_duration)
+        chunks = build_schedule(tasks, costs, num_workers)
+    print(f"Scheduled {len(video_info_list)} videos as {len(tasks)} tasks "
+          f"in {len(chunks)} chunks (longest first)")
+    
     all_metadata = []
     failed_videos = []
+    results = [None] * len(video_info_list)
+    range_results = defaultdict(list)
+    range_counts = defaultdict(int)
+    for index, task in enumerate(tasks):
+        if task[0] == "range":
+            range_counts[task_owners[index]] += 1
+    busy_time = 0.0
     
     # Process videos with progress bar
-    with Pool(processes=num_workers) as pool:
-        # Use functools.partial to pass the progress bar to the map function
-        results = list(tqdm(
-            pool.imap(process_single_video, video_info_list),
-            total=len(video_info_list),
-            desc="Processing videos"
-        ))
-    
-    # Collect results
+    start_time = time.perf_counter()
+    with profiler.phase("sample"), WatchdogPool(num_workers, args.task_timeout, args.frame_budget) as pool:
+        register_sampler_metrics(metrics, pool, len(tasks))
+        if metrics.port is not None:
+            print(f"Live metrics: http://localhost:{metrics.port}/metrics")
+        with tqdm(total=len(tasks), desc="Processing videos") as progress:
+            for chunk_results in pool.run(chunks):
+                for index, result, elapsed in chunk_results:
+                    owner = task_owners[index]
+                    busy_time += elapsed
+                    if tasks[index][0] == "range":
+                        range_results[owner].append(result)
+                        if len(range_results[owner]) < range_counts[owner]:
+                            continue
+                        # Merge the time ranges of a split video once its last range is in
+                        result = merge_range_results(video_info_list[owner], range_results.pop(owner))
+                    results[owner] = result
+                    if result[0]:
+                        metrics.increment("videos_completed_total")
+                        metrics.increment("sampled_frames_total", result[0].get("sampled_frames", 0))
+                    else:
+                        metrics.increment("videos_failed_total")
+                    if stream and result[0]:
+                        stream.write(stream_metadata_entry(result[0], args.metadata_format))
+                progress.update(len(chunk_results))
+                metrics.complete(len(chunk_results))
+        restarted_workers = pool.restarted_workers
+    wall_time = time.perf_counter() - start_time
+    utilization = busy_time / (num_workers * wall_time) if wall_time > 0 else 0.0
+    if stream:
+        # Let followers finish before the metadata JSON files are written
+        stream.close()
+    
+    # Collect results, one metadata list per sampling interval
+    interval_metadata = [[] for _ in intervals[1:]]
     for video_metadata, failure_info in results:
         if video_metadata:
+            variants = video_metadata.pop("interval_variants", [])
+            if args.metadata_format == "compact":
+                video_metadata = compact_video_metadata(video_metadata)
+                variants = [compact_video_metadata(variant) for variant in variants]
+            for i, variant in enumerate(variants):
+                interval_metadata[i].append(variant)
             all_metadata.append(video_metadata)
         else:
             failed_videos.append(failure_info)
     
-    # Write metadata to JSON file using absolute path
-    with open(os.path.abspath(args.metadata_path), 'w') as f:
-        json.dump(all_metadata, f, indent=2)
+    # Write metadata to JSON files using absolute paths
+    with profiler.phase("write_metadata"):
+        for metadata_path, metadata in zip(metadata_paths, [all_metadata] + interval_metadata):
+            with open(metadata_path, 'w') as f:
+                json.dump(metadata, f, indent=2)
     
     # Write failed videos to JSON file
     failed_metadata_path = os.path.join(os.path.dirname(os.path.abspath(args.metadata_path)), "failed_videos.json")
@@ -180,8 +1275,74 @@ def main():
     print(f"\nProcessing complete!")
     print(f"  Successfully processed: {len(all_metadata)} videos")
     print(f"  Failed to process: {len(failed_videos)} videos")
-    print(f"  Metadata saved to: {os.path.abspath(args.metadata_path)}")
+    for interval, metadata_path in zip(intervals, metadata_paths):
+        print(f"  Metadata ({interval:g}s interval) saved to: {metadata_path}")
     print(f"  Failed videos logged to: {os.path.abspath(failed_metadata_path)}")
+    print(f"  Wall time: {wall_time:.1f}s, pool utilization: {utilization * 100:.1f}%")
+    print(f"  Workers restarted by watchdog: {restarted_workers}")
+    
+    profiler.add_items(len(video_info_list), "videos")
+    profiler.set_extra("sampled_frames", sum(video.get("sampled_frames", 0) for video in all_metadata))
+    profiler.set_extra("failed_videos", len(failed_videos))
+    profiler.set_extra("pool_utilization", round(utilization, 3))
+    profiler.set_extra("restarted_workers", restarted_workers)
+
+
+def register_sampler_metrics(metrics, pool, total_tasks):
+    """
+    Define the sampler's live metrics; items are tasks (whole videos or time ranges).
+    
+    Args:
+        metrics (LiveMetrics): Metrics of the running stage
+        pool (WatchdogPool): Pool whose queue and workers are reported
+        total_tasks (int): Number of scheduled tasks
+    """
+    metrics.set_total(total_tasks)
+    metrics.gauge("queue_depth", "Tasks not yet handed to a worker", lambda: pool.queued_tasks)
+    metrics.gauge("workers", "Worker processes", lambda: pool.num_workers)
+    metrics.gauge("busy_workers", "Workers currently running a chunk", lambda: pool.busy_workers)
+    metrics.counter("worker_restarts_total", "Workers replaced by the watchdog", lambda: pool.restarted_workers)
+    metrics.counter("videos_completed_total", "Videos sampled successfully")
+    metrics.counter("videos_failed_total", "Videos that failed or timed out")
+    metrics.counter("sampled_frames_total", "Frames written for successfully sampled videos")
+    metrics.gauge("failure_ratio", "Share of finished videos that failed",
+                  lambda: metrics.value("videos_failed_total") / max(
+                      metrics.value("videos_completed_total") + metrics.value("videos_failed_total"), 1))
+
+
+def open_metadata_stream(path):
+    """
+    Open the --metadata_stream appender, or a no-op context when streaming is off.
+    
+    The appender is used as a context manager for the whole run: a normal exit
+    (including an empty input directory) writes the .done marker, and a crash writes
+    the .failed marker so --follow consumers stop waiting instead of polling forever.
+    
+    Args:
+        path (str or None): Stream path from --metadata_stream
+        
+    Returns:
+        JsonlAppender, or a context yielding None
+    """
+    return JsonlAppender(os.path.abspath(path)) if path else nullcontext()
+
+
+def stream_metadata_entry(video_metadata, metadata_format="full"):
+    """
+    Build the entry written to --metadata_stream for a finished video.
+    
+    Only the primary sampling interval is streamed; the extra interval variants are
+    left in place for the final metadata files.
+    
+    Args:
+        video_metadata (dict): Metadata returned for a successfully sampled video
+        metadata_format (str): "full" or "compact"
+        
+    Returns:
+        dict: Metadata entry in the same layout as video_metadata.json
+    """
+    entry = {key: value for key, value in video_metadata.items() if key != "interval_variants"}
+    return compact_video_metadata(entry) if metadata_format == "compact" else entry
 
 
 def process_single_video(video_info):
@@ -189,7 +1350,7 @@ def process_single_video(video_info):
     Process a single video file - wrapper function for multiprocessing
     
     Args:
-        video_info (tuple): Tuple containing (video_path, output_dir, sampling_interval, min_duration)
+        video_info (tuple): Tuple containing (video_path, output_dir, sampling_interval, min_duration, options)
         
     Returns:
         tuple: (video_metadata, failure_info)